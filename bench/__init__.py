@@ -0,0 +1,3 @@
+"""
+效能基準測試腳本（不屬於監控程式本身）；於專案根目錄以 python -m bench.<模組> 執行
+"""
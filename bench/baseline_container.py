@@ -0,0 +1,55 @@
+"""
+分段基準線容器基準測試：整份 JSON 壓縮檔完整載入 vs 分段容器只解碼一張工作表
+執行：python -m bench.baseline_container
+"""
+import os
+import shutil
+import tempfile
+import time
+
+from utils.baseline_container import SEG_EXT, load_container, save_container
+from utils.cell_store import compact_cells
+from utils.compression import load_compressed_file, save_compressed_file
+
+
+def benchmark_container(n_sheets=20, n_rows=3000, n_cols=8):
+    """比較整份 JSON 壓縮檔與分段容器：完整載入 vs 只解碼一張工作表；返回統計 dict"""
+    def col(n):
+        s = ''
+        while n:
+            n, r = divmod(n - 1, 26)
+            s = chr(65 + r) + s
+        return s
+
+    cells = {}
+    for si in range(n_sheets):
+        cells[f"S{si + 1}"] = {
+            f"{col(c)}{r}": {"formula": f"=A{r}*{c}" if c % 3 == 0 else None, "value": r * c + si,
+                             "cached_value": r * c + si, "external_ref": False}
+            for r in range(1, n_rows + 1) for c in range(1, n_cols + 1)}
+    data = {'last_author': 'bench', 'content_hash': 'x', 'cells': cells}
+    d = tempfile.mkdtemp(prefix='seg_bench_')
+    try:
+        legacy = os.path.join(d, 'b.baseline.json')
+        seg = os.path.join(d, 'b.baseline' + SEG_EXT)
+        legacy_file = save_compressed_file(legacy, data)
+        save_container(seg, data)
+        t0 = time.perf_counter()
+        full = load_compressed_file(legacy)
+        compact_cells(full['cells'])['S3']
+        t_legacy = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        lazy = load_container(seg)
+        lazy['cells']['S3']
+        t_one = time.perf_counter() - t0
+        ok = dict(lazy['cells']['S3']) == cells['S3']
+        return {'legacy_load_sec': round(t_legacy, 4), 'segmented_one_sheet_sec': round(t_one, 4),
+                'legacy_size': os.path.getsize(legacy_file), 'segmented_size': os.path.getsize(seg),
+                'speedup': round(t_legacy / max(t_one, 1e-9), 1), 'identical': ok}
+    finally:
+        shutil.rmtree(d, ignore_errors=True)
+
+
+
+if __name__ == "__main__":
+    print(benchmark_container())
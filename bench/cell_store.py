@@ -0,0 +1,76 @@
+"""
+CompactSheet 記憶體基準測試：以 tracemalloc 比較「每格一個 dict」與 utils.cell_store.CompactSheet
+執行：python -m bench.cell_store
+"""
+import json
+
+from utils.cell_store import compact_cells, json_default
+
+
+def benchmark_cell_store(n_sheets=3, n_rows=20000, n_cols=10):
+    """
+    以 tracemalloc 比較「每格一個 dict」與 CompactSheet 的記憶體占用，返回統計 dict。
+    測試資料模擬典型工作表：數字、重複文字、整欄相同結構的公式。
+    """
+    import gc
+    import time
+    import tracemalloc
+
+    def _col(n):
+        s = ''
+        while n > 0:
+            n, r = divmod(n - 1, 26)
+            s = chr(65 + r) + s
+        return s
+
+    def build():
+        data = {}
+        for si in range(n_sheets):
+            ws = {}
+            for r in range(1, n_rows + 1):
+                for c in range(1, n_cols + 1):
+                    addr = f"{_col(c)}{r}"
+                    if c == n_cols:
+                        f = f"=SUM(A{r}:{_col(c - 1)}{r})"
+                        v = str(r * c)
+                        ws[addr] = {"formula": f, "value": v, "cached_value": v, "external_ref": False}
+                    elif c % 3 == 0:
+                        v = ("North", "South", "East", "West")[r % 4]
+                        ws[addr] = {"formula": None, "value": "" + v, "cached_value": "" + v, "external_ref": False}
+                    else:
+                        v = str(r * 1.5 + c)
+                        ws[addr] = {"formula": None, "value": v, "cached_value": v, "external_ref": False}
+            data[f"Sheet{si + 1}"] = ws
+        return data
+
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    data = build()
+    dict_bytes = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+
+    t0 = time.time()
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    compact = compact_cells(build())
+    compact_bytes = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    elapsed = time.time() - t0
+
+    same = all(compact[k] == data[k] for k in data)
+    stats = {
+        "cells": n_sheets * n_rows * n_cols,
+        "dict_mb": round(dict_bytes / 1024 / 1024, 1),
+        "compact_mb": round(compact_bytes / 1024 / 1024, 1),
+        "ratio": round(dict_bytes / compact_bytes, 1) if compact_bytes else None,
+        "build_and_compact_sec": round(elapsed, 2),
+        "equal": same,
+        "json_equal": json.dumps(data, sort_keys=True) == json.dumps(compact, sort_keys=True, default=json_default),
+    }
+    return stats
+
+
+if __name__ == "__main__":
+    print(benchmark_cell_store())
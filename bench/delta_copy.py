@@ -0,0 +1,51 @@
+"""
+增量複製基準測試：修改一張工作表後比較完整複製與 delta_copy 的傳輸位元組與時間
+執行：python -m bench.delta_copy
+"""
+import filecmp
+import os
+import shutil
+import tempfile
+import time
+from typing import Optional
+
+from openpyxl import Workbook, load_workbook
+
+from utils.delta_copy import delta_copy
+
+
+def benchmark_delta_copy(n_sheets=20, n_rows=3000, workdir: Optional[str] = None):
+    """修改一張工作表後比較完整複製與增量複製的傳輸位元組與時間；返回統計 dict"""
+    own = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='delta_bench_')
+    src = os.path.join(workdir, 'src.xlsx')
+    dst = os.path.join(workdir, 'cache.xlsx')
+    wb = Workbook()
+    wb.remove(wb.active)
+    for si in range(n_sheets):
+        ws = wb.create_sheet(f"S{si + 1}")
+        for r in range(1, n_rows + 1):
+            ws.append([r * si, f"row{r}-{si}", r / 7.0, f"=A{r}*2"])
+    wb.save(src)
+    shutil.copy2(src, dst)
+
+    wb = load_workbook(src)
+    wb['S3']['B2'] = 'changed'
+    wb.save(src)
+
+    t0 = time.perf_counter()
+    stats = delta_copy(src, dst)
+    stats['delta_sec'] = round(time.perf_counter() - t0, 3)
+    stats['identical'] = filecmp.cmp(src, dst, shallow=False)
+    t0 = time.perf_counter()
+    shutil.copyfile(src, dst + '.full')
+    stats['full_sec'] = round(time.perf_counter() - t0, 3)
+    stats['transfer_ratio'] = round(stats['bytes_transferred'] / max(1, stats['bytes_total']), 3)
+    if own:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return stats
+
+
+
+if __name__ == "__main__":
+    print(benchmark_delta_copy())
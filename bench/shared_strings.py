@@ -0,0 +1,85 @@
+"""
+shared strings 基準測試：全部解碼成 list 與索引表（SharedStringTable，記憶體 / mmap）的時間與記憶體
+執行：python -m bench.shared_strings
+"""
+import io
+import os
+import tempfile
+import time
+import tracemalloc
+import zipfile
+import xml.etree.ElementTree as ET
+from typing import Optional
+
+from utils.value_engines.shared_strings import SST_PART, SharedStringTable
+
+
+def benchmark_shared_strings(n_strings=2000000, referenced=2000, workdir: Optional[str] = None):
+    """
+    以 n_strings 個字串的 sharedStrings.xml 比較「全部解碼成 list」與索引表：
+    首次掃描時間、tracemalloc 峰值 / 常駐，以及只讀取 referenced 個字串的成本；返回統計 dict
+    """
+    ns = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+    own = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='sst_bench_')
+    path = os.path.join(workdir, 'sst.zip')
+    body = io.BytesIO()
+    body.write(f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n<sst xmlns="{ns}" count="{n_strings}" uniqueCount="{n_strings}">'.encode())
+    for i in range(n_strings):
+        if i % 97 == 0:
+            body.write(f'<si><r><rPr><b/></rPr><t xml:space="preserve">rich {i} &amp; </t></r><r><t>tail</t></r></si>'.encode())
+        else:
+            body.write(f'<si><t>value-{i}-中文</t></si>'.encode())
+    body.write(b'</sst>')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zw:
+        zw.writestr(SST_PART, body.getvalue())
+    del body
+
+    def eager(z):
+        out = []
+        with z.open(SST_PART) as fp:
+            for _, el in ET.iterparse(fp):
+                if el.tag == f'{{{ns}}}si':
+                    out.append(''.join((t.text or '') for t in el.iter(f'{{{ns}}}t')))
+                    el.clear()
+        return out
+
+    step = max(1, n_strings // max(1, referenced))
+    wanted = list(range(0, n_strings, step))[:referenced]
+    stats = {'strings': n_strings, 'referenced': len(wanted)}
+    with zipfile.ZipFile(path) as z:
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        lst = eager(z)
+        picked_a = [lst[i] for i in wanted]
+        stats['eager_sec'] = round(time.perf_counter() - t0, 2)
+        cur, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats['eager_resident_mb'] = round(cur / 1024 / 1024, 1)
+        stats['eager_peak_mb'] = round(peak / 1024 / 1024, 1)
+        del lst
+
+        for label, spill in (('indexed', 0), ('indexed_mmap', 1e-6)):
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            table = SharedStringTable.from_zip(z, spill_mb=spill)
+            picked_b = [table[i] for i in wanted]
+            stats[f'{label}_sec'] = round(time.perf_counter() - t0, 2)
+            cur, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            stats[f'{label}_resident_mb'] = round(cur / 1024 / 1024, 1)
+            stats[f'{label}_peak_mb'] = round(peak / 1024 / 1024, 1)
+            stats[f'{label}_equal'] = picked_a == picked_b
+            table.close()
+    if own:
+        try:
+            os.remove(path)
+            os.rmdir(workdir)
+        except OSError:
+            pass
+    return stats
+
+
+
+if __name__ == "__main__":
+    print(benchmark_shared_strings())
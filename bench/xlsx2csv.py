@@ -0,0 +1,67 @@
+"""
+xlsx2csv 基準測試：以 1 / 10 / 50 張工作表比較進程內（單一 zip session）與舊有子進程模式
+執行：python -m bench.xlsx2csv
+"""
+import os
+import time
+from typing import Optional
+
+from utils.value_engines.xlsx2csv_inproc import xlsx_to_csv_bytes_inproc, xlsx_to_csv_bytes_subprocess
+
+
+def benchmark_xlsx2csv(sheet_counts=(1, 10, 50), n_rows=200, n_cols=10, workdir: Optional[str] = None):
+    """
+    以 1 / 10 / 50 張工作表的測試工作簿比較進程內與子進程模式的轉換時間，返回 [stats, ...]。
+    子進程模式以 --list-sheets 失敗後的逐張 -s i 流程計時（與實際回退路徑一致），輸出逐格比對。
+    """
+    import tempfile
+    from openpyxl import Workbook
+
+    own_dir = workdir is None
+    workdir = workdir or tempfile.mkdtemp(prefix='xlsx2csv_bench_')
+    results = []
+    for n in sheet_counts:
+        path = os.path.join(workdir, f"bench_{n}.xlsx")
+        wb = Workbook()
+        wb.remove(wb.active)
+        for si in range(n):
+            ws = wb.create_sheet(f"S{si + 1}")
+            for r in range(1, n_rows + 1):
+                ws.append([r * c if c % 3 else f"t{r % 7}" for c in range(1, n_cols + 1)])
+        wb.save(path)
+
+        t0 = time.perf_counter()
+        a = xlsx_to_csv_bytes_inproc(path, tag='bench')
+        t_inproc = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        b = xlsx_to_csv_bytes_subprocess(path, sheet_count=n, tag='bench')
+        t_sub = time.perf_counter() - t0
+
+        # 子進程模式在 --list-sheets 不可用時以 sheetN 命名，故依順序比對內容
+        same = [v.replace(b'\r\n', b'\n') for v in a.values()] == [v.replace(b'\r\n', b'\n') for v in b.values()]
+        results.append({
+            "sheets": n,
+            "cells": n * n_rows * n_cols,
+            "inproc_sec": round(t_inproc, 3),
+            "subprocess_sec": round(t_sub, 3),
+            "speedup": round(t_sub / t_inproc, 1) if t_inproc else None,
+            "equal": same,
+        })
+        if own_dir:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    if own_dir:
+        try:
+            os.rmdir(workdir)
+        except OSError:
+            pass
+    return results
+
+
+
+if __name__ == "__main__":
+    for row in benchmark_xlsx2csv():
+        print(row)
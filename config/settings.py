@@ -28,6 +28,10 @@ SCAN_TARGET_FOLDERS = []
 MAX_CHANGES_TO_DISPLAY = 20 # 限制顯示的變更數量，0 表示不限制
 USE_LOCAL_CACHE = True
 CACHE_FOLDER = r"C:\Users\user\Desktop\watchdog\cache_folder"
+# 本地快取容量管理：總大小上限（MB）與最久未使用存活期（日），0 表示不限；啟動時對帳並清理已改名 / 移走檔案的副本
+CACHE_MAX_SIZE_MB = 4096
+CACHE_MAX_AGE_DAYS = 14
+CACHE_RECONCILE_ON_START = True
 # 嚴格模式：永不開原檔（copy 失敗則跳過處理）
 STRICT_NO_ORIGINAL_READ = True
 # 複製重試次數與退避（秒）
@@ -41,15 +45,27 @@ COPY_POST_SLEEP_SEC = 0.2
 COPY_STABILITY_CHECKS = 5
 COPY_STABILITY_INTERVAL_SEC = 1.0
 COPY_STABILITY_MAX_WAIT_SEC = 12.0
+# 穩定性追蹤器：只對正在等待的檔案取樣 stat 的間隔（秒）；watchdog 事件會即時推後安靜期限，安靜窗口一到即開始複製
+STABILITY_SAMPLE_SEC = 0.5
+# 記憶體副本：來源不大於此大小（MB）時只讀一次到記憶體供各解析步驟共用，不寫快取檔；0 表示停用
+IN_MEMORY_COPY_MAX_MB = 16
+IN_MEMORY_COPY_TOTAL_MB = 256       # 記憶體副本總量上限（MB），超出時釋放最久未使用者
 ENABLE_FAST_MODE = True
 # Phase 1 new controls
 QUICK_SKIP_BY_STAT = True           # 若 mtime/size 與基準線一致則直接跳過讀取
 MTIME_TOLERANCE_SEC = 2.0           # mtime 容差（秒）
+ENABLE_PART_FINGERPRINTS = True     # 以 zip 內各工作表 part 的 CRC/大小比對基準線，只重讀有變更的工作表
 POLLING_STABLE_CHECKS = 3           # 輪巡：連續多少次「無變化」才算穩定
 POLLING_COOLDOWN_SEC = 20           # 每檔案成功比較後的冷靜期（秒）
 SKIP_WHEN_TEMP_LOCK_PRESENT = True  # 偵測到 ~$ 鎖檔時延後觸碰
 # Phase 2: 複製引擎選擇
-COPY_ENGINE = 'python'              # 'python' | 'powershell' | 'robocopy'
+COPY_ENGINE = 'python'              # 'python' | 'powershell' | 'robocopy' | 'delta' | 'kernel'（Linux：copy_file_range / sendfile）
+DELTA_COPY_MIN_SIZE_MB = 4          # delta：來源小於此大小時直接完整複製（zip member 級增量只對大檔有利）
+# 複製排程：所有 copy_to_cache 對同一共享（UNC \\server\share / 磁碟機 / 掛載點）的並行複製數與頻寬
+COPY_MAX_WORKERS = 4                # 背景複製（基準線預取等）工作執行緒數
+COPY_MAX_PER_SHARE = 2              # 每個共享同時進行的複製數上限
+COPY_SHARE_BANDWIDTH_MBPS = 0       # 每個共享的讀取頻寬上限（MB/s），0 = 不限
+BASELINE_COPY_PREFETCH = 2          # 建立基準線時預先在背景複製之後 N 個檔案（0 = 停用）
 PREFER_SUBPROCESS_FOR_XLSM = True   # 對 .xlsm 檔優先使用子程序複製
 SUBPROCESS_ENGINE_FOR_XLSM = 'robocopy'  # 'powershell' | 'robocopy'
 # Robocopy 附加選項
@@ -65,6 +81,8 @@ DEBOUNCE_INTERVAL_SEC = 4
 # =========== Compression Config ============
 # 預設壓縮格式：'lz4' 用於頻繁讀寫, 'zstd' 用於長期存儲, 'gzip' 用於兼容性
 DEFAULT_COMPRESSION_FORMAT = 'lz4'  # 'lz4', 'zstd', 'gzip'
+BASELINE_CONTAINER = 'segmented'    # 'segmented'：<key>.baseline.seg，各工作表獨立壓縮、按需解碼；'json'：整份 JSON 壓縮（舊格式）
+BASELINE_CACHE_MB = 256    # 行程內基準線快取上限（MB，0 = 停用）；檔案 mtime / 大小改變時自動失效
 
 # 壓縮級別設定
 LZ4_COMPRESSION_LEVEL = 1       # LZ4: 0-16, 越高壓縮率越好但越慢
@@ -115,7 +133,8 @@ MONITOR_ONLY_EXCLUDE_FOLDERS = []
 # 忽略 CACHE_FOLDER 下的所有事件
 IGNORE_CACHE_FOLDER = True
 IGNORE_LOG_FOLDER = True            # 忽略 LOG_FOLDER 內的所有事件（避免自我觸發）
-ENABLE_OPS_LOG = True               # 啟用 ops 複製成功/失敗 CSV 記錄
+ENABLE_OPS_LOG = True               # 啟用 ops 複製成功/失敗 CSV 記錄與 copy_metrics 摘要（ops_log/）
+COPY_METRICS_FLUSH_SEC = 60         # 複製統計於記憶體累計，每 N 秒由背景執行緒批次寫出
 MAX_RETRY = 10
 RETRY_INTERVAL_SEC = 2
 USE_TEMP_COPY = True
@@ -161,14 +180,39 @@ DEDUP_PENDING_EVENTS = True
 IMMEDIATE_COMPARE_ON_FIRST_EVENT = True
 
 # =========== 值/公式讀取引擎（高效） ============
-# 值讀取引擎：'polars'（預設，需安裝 polars/xlsx2csv）或 'xml'（純 XML 直讀）
+# 值讀取引擎：'polars'（需安裝 polars/xlsx2csv）、'polars_xml'、'xml'（純 XML 直讀）、'pandas'，
+# 或 'auto'（每本工作簿首次試跑各引擎，固定最快且有效者；統計見 LOG_FOLDER/value_engine_stats.json）
+# 注意：只在 FORMULA_ENGINE='openpyxl' 時生效；FORMULA_ENGINE='xml' 由串流引擎自行讀取 cached value（含 auto 在內的設定都不使用）
 VALUE_ENGINE = 'polars_xml'
-# CSV 是否落地保存（polars 模式下除錯用；預設 False，使用 BytesIO in-memory）
+# auto 模式：未見過的工作簿是否逐一試跑可用引擎（False = 依同大小級距檔案的歷史統計直接選擇）
+VALUE_ENGINE_AUTO_TRIAL = True
+# auto 模式：固定的引擎連續失敗此次數後改選次佳引擎
+VALUE_ENGINE_MAX_FAILURES = 2
+# CSV 是否落地保存（polars 模式下除錯用；預設 False，使用 BytesIO in-memory；值的重用改由 VALUE_CACHE_ENABLED 負責）
 CSV_PERSIST = True  # 預設開啟（合併 CSV：<CACHE_FOLDER>/values/<baseline_key>.values.csv）
-# 公式讀取引擎：暫保留 openpyxl；之後可提供 'xml'
+# 值引擎結果以 Arrow IPC 快取（<CACHE_FOLDER>/values/<baseline_key>.<engine>.<指紋>.arrow）；內容未變時直接 mmap 載入
+VALUE_CACHE_ENABLED = True
+# polars / pandas 值引擎在本進程內呼叫 xlsx2csv（單一 zip session 轉換所有工作表）；False = 舊有每張表一個子進程
+XLSX2CSV_INPROCESS = True
+# xml / polars_xml 值引擎以 iterparse 串流讀取 worksheet 與 sharedStrings（逐列清除，峰值記憶體與單列大小成正比）
+XML_VALUE_STREAMING = True
+# shared strings 索引表：被引用時才解碼，最多快取此數量的已解碼字串（0 = 不快取）
+SHARED_STRINGS_LRU_SIZE = 100000
+# 解壓後 sharedStrings.xml 達此大小（MB）時寫入暫存檔並以 mmap 讀取，不佔常駐記憶體（0 = 一律放記憶體）
+SHARED_STRINGS_SPILL_MB = 32
+# 公式讀取引擎：'openpyxl'（公式由 openpyxl 讀取，值由 VALUE_ENGINE 提供）或
+# 'xml'（串流單次讀取公式 + cached value，失敗自動回退 openpyxl；此模式不使用 VALUE_ENGINE，值的表示方式同 polars_xml）
 FORMULA_ENGINE = 'openpyxl'
-# 允許的最大並發 sheet 讀取數
+# 允許的最大並發 sheet 讀取數（FORMULA_ENGINE='xml' 時以進程池每個 worker 解析一張工作表；上限為 CPU 核心數）
 MAX_SHEET_WORKERS = 4
+# 檔案小於此大小（MB）時不啟用多進程 sheet 解析（進程池啟動/回傳成本高於收益）
+PARALLEL_SHEET_MIN_SIZE_MB = 5
+# 儲存格以緊湊格式保存於記憶體（整數位址 + 平行陣列 + 公式去重），基準線/快照檔案格式不變
+COMPACT_CELL_STORE = True
+# 工作表儲存格數達此數量時，以 Polars 欄式 join 找出差異位址（0 = 停用，一律逐格比較）
+COLUMNAR_DIFF_MIN_CELLS = 20000
+# 每本工作簿的公式美化 memo 容量（相同公式文字只美化一次；0 = 停用）
+FORMULA_MEMO_SIZE = 50000
 
 # =========== 歷史快照與時間線（Git/SQLite） ============
 # 可一鍵關閉 Git 整合（包括快照同步與自動提交、時間線伺服器）
@@ -21,6 +21,7 @@ from utils.compression import (
     migrate_baseline_format
 )
 from core.excel_parser import dump_excel_cells_with_timeout, hash_excel_content, get_excel_last_author
+from utils.content_tree import build_content_tree, tree_root
 
 def baseline_file_path(base_name):
     """
@@ -33,6 +34,11 @@ def get_baseline_file_with_extension(base_name):
     獲取實際存在的基準線檔案路徑（包含副檔名）
     """
     base_path = baseline_file_path(base_name)
+
+    # 分段容器（<base_key>.baseline.seg）
+    seg_path = _container_path(base_path)
+    if os.path.exists(seg_path):
+        return seg_path
     
     # 按優先順序檢查不同格式的檔案
     for format_type in [settings.DEFAULT_COMPRESSION_FORMAT, 'lz4', 'zstd', 'gzip']:
@@ -43,9 +49,31 @@ def get_baseline_file_with_extension(base_name):
     
     return None
 
+def _container_path(base_path):
+    """<...>.baseline.json -> <...>.baseline.seg"""
+    from utils.baseline_container import SEG_EXT
+    root = base_path[:-len('.json')] if base_path.endswith('.json') else base_path
+    return root + SEG_EXT
+
+
+def _use_container():
+    return str(getattr(settings, 'BASELINE_CONTAINER', 'segmented')).lower() == 'segmented'
+
+
+def _legacy_actual_file(base_path):
+    """與 load_compressed_file 相同的選檔規則：首選格式優先，否則取最新的檔案"""
+    preferred = base_path + CompressionFormat.get_extension(settings.DEFAULT_COMPRESSION_FORMAT)
+    if os.path.exists(preferred):
+        return preferred
+    found = [base_path + CompressionFormat.get_extension(f) for f in CompressionFormat.get_available_formats()]
+    found = [p for p in found if os.path.exists(p)]
+    return max(found, key=os.path.getmtime) if found else None
+
+
 def load_baseline(baseline_file_or_base_name):
     """
-    載入基準線檔案，支援多種壓縮格式
+    載入基準線檔案，支援多種壓縮格式；分段容器（.seg）返回的 cells 為延遲映射（LazyCells），
+    只在存取某工作表時才解碼該工作表
     """
     try:
         # 如果是基準名稱，轉換為檔案路徑
@@ -55,16 +83,37 @@ def load_baseline(baseline_file_or_base_name):
             base_path = baseline_file_or_base_name
             if base_path.endswith('.gz') or base_path.endswith('.lz4') or base_path.endswith('.zst'):
                 base_path = base_path.rsplit('.', 1)[0]
-        
-        # 使用壓縮工具載入
-        from utils.compression import load_compressed_file
-        data = load_compressed_file(base_path)
+
+        from utils.baseline_container import load_container, is_container, SEG_EXT
+        if is_container(base_path):
+            base_path = base_path[:-len(SEG_EXT)] + '.json'
+        seg_path = _container_path(base_path)
+        actual_file = seg_path if os.path.exists(seg_path) else _legacy_actual_file(base_path)
+
+        # 行程內快取：檔案未變（mtime / 大小相同）時不需重新讀取、解壓
+        from utils.baseline_cache import get_baseline_cache
+        bcache = get_baseline_cache()
+        cached = bcache.get(base_path, actual_file)
+        if cached is not None:
+            return cached
+
+        if actual_file == seg_path:
+            data = load_container(seg_path)
+        else:
+            # 使用壓縮工具載入
+            from utils.compression import load_compressed_file
+            data = load_compressed_file(base_path)
+            if data and getattr(settings, 'COMPACT_CELL_STORE', True) and isinstance(data.get('cells'), dict):
+                from utils.cell_store import compact_cells
+                data['cells'] = compact_cells(data['cells'])
         
         # 移除所有 [DEBUG] 載入基準線的訊息
+        if data:
+            bcache.put(base_path, actual_file, data)
         
         return data
         
-    except (FileNotFoundError, PermissionError, OSError, json.JSONDecodeError, gzip.BadGzipFile) as e:
+    except (FileNotFoundError, PermissionError, OSError, ValueError, gzip.BadGzipFile) as e:
         logging.error(f"載入基準線失敗 {baseline_file_or_base_name}: {e}")
         return None
 
@@ -93,10 +142,11 @@ def save_baseline(baseline_file_or_base_name, data):
         # 選擇壓縮格式
         compression_format = settings.DEFAULT_COMPRESSION_FORMAT
         # 移除： print(f"[DEBUG] 使用格式: {compression_format}")
+        use_container = _use_container()
         
-        # 檢查是否需要清理舊格式的檔案
+        # 檢查是否需要清理舊格式的檔案（改用分段容器時，整份 JSON 壓縮檔一律清除，反之亦然）
         for old_format in ['gzip', 'lz4', 'zstd']:
-            if old_format != compression_format:
+            if use_container or old_format != compression_format:
                 old_ext = CompressionFormat.get_extension(old_format)
                 old_file = base_path + old_ext
                 if os.path.exists(old_file):
@@ -107,7 +157,32 @@ def save_baseline(baseline_file_or_base_name, data):
         
         # 保存新檔案
         # 移除： print(f"[DEBUG] 開始保存壓縮檔案...")
-        actual_file = save_compressed_file(base_path, data, compression_format)
+        from utils.baseline_container import save_container, detach_readers, load_container
+        from utils.baseline_cache import get_baseline_cache
+        bcache = get_baseline_cache()
+        seg_path = _container_path(base_path)
+        try:
+            if use_container:
+                actual_file = save_container(seg_path, data, compression_format)
+                # write-through：重讀索引與 meta（與檔案一致），已解碼的工作表直接沿用
+                bcache.put(base_path, actual_file, load_container(actual_file, preload=data.get('cells')))
+            else:
+                actual_file = save_compressed_file(base_path, data, compression_format)
+                if os.path.exists(seg_path):
+                    detach_readers(seg_path)
+                    try:
+                        os.remove(seg_path)
+                    except OSError as e:
+                        logging.warning(f"清理舊檔案失敗: {e}")
+                cached = dict(data, timestamp=datetime.now().isoformat(),
+                              compression_format=CompressionFormat.validate_format(compression_format))
+                if getattr(settings, 'COMPACT_CELL_STORE', True) and isinstance(cached.get('cells'), dict):
+                    from utils.cell_store import compact_cells
+                    cached['cells'] = compact_cells(cached['cells'])
+                bcache.put(base_path, actual_file, cached)
+        except Exception:
+            bcache.invalidate(base_path)
+            raise
         # 移除： print(f"[DEBUG] 保存完成: {actual_file}")
         
         # 簡化壓縮統計顯示
@@ -118,10 +193,31 @@ def save_baseline(baseline_file_or_base_name, data):
         
         return True
         
-    except (FileNotFoundError, PermissionError, OSError) as e:
+    except (FileNotFoundError, PermissionError, OSError, ValueError) as e:
         logging.error(f"保存基準線檔案失敗: {e}")
         return False
 
+def upgrade_legacy_baseline(base_key, old_baseline, cells, content_tree, part_fingerprints, file_path=None):
+    """
+    舊基準線（MD5 content_hash，無內容樹 / part 指紋）內容比對相同時，補寫內容樹與指紋一次，
+    之後的比較即可走內容樹與增量讀取的快速路徑；內容相同但 part 指紋（含解析設定）已變時亦以此更新指紋。
+    返回是否保存成功。
+    """
+    data = dict(old_baseline or {})
+    data.update({
+        "content_hash": tree_root(content_tree),
+        "content_tree": content_tree,
+        "part_fingerprints": part_fingerprints,
+        "cells": cells,
+    })
+    if file_path:
+        try:
+            data["source_mtime"] = os.path.getmtime(file_path)
+            data["source_size"] = os.path.getsize(file_path)
+        except OSError:
+            pass
+    return save_baseline(base_key, data)
+
 def archive_old_baselines():
     """
     歸檔舊的基準線檔案，轉換為高壓縮率格式
@@ -133,14 +229,27 @@ def archive_old_baselines():
         archive_threshold = datetime.now() - timedelta(days=settings.ARCHIVE_AFTER_DAYS)
         archive_count = 0
         
+        from utils.baseline_container import SEG_EXT, recompress_container
         for filename in os.listdir(settings.LOG_FOLDER):
-            if not filename.endswith('.baseline.json.lz4'):
+            is_seg = filename.endswith('.baseline' + SEG_EXT)
+            if not filename.endswith('.baseline.json.lz4') and not is_seg:
                 continue
             
             filepath = os.path.join(settings.LOG_FOLDER, filename)
             file_mtime = datetime.fromtimestamp(os.path.getmtime(filepath))
             
             if file_mtime < archive_threshold:
+                if is_seg:
+                    # 分段容器：以歸檔格式重寫各區段（已是歸檔格式者不動作）
+                    try:
+                        new_filepath = recompress_container(filepath, settings.ARCHIVE_COMPRESSION_FORMAT)
+                    except ValueError as e:
+                        logging.error(f"歸檔分段基準線失敗 {filename}: {e}")
+                        new_filepath = None
+                    if new_filepath:
+                        archive_count += 1
+                        print(f"[ARCHIVE] 重新壓縮分段基準線: {filename}")
+                    continue
                 print(f"[ARCHIVE] 歸檔舊基準線: {filename}")
                 new_filepath = migrate_baseline_format(filepath, settings.ARCHIVE_COMPRESSION_FORMAT)
                 if new_filepath:
@@ -153,6 +262,18 @@ def archive_old_baselines():
     except (OSError, shutil.Error) as e:
         logging.error(f"歸檔過程出錯: {e}")
 
+def _prefetch_copies(xlsx_files, start, count):
+    """在背景預先複製之後 count 個檔案到快取；處理到該檔時 copy_to_cache 直接沿用或等待同一個複製"""
+    if count <= 0 or not settings.USE_LOCAL_CACHE:
+        return
+    try:
+        from utils.copy_scheduler import submit_copy
+        for path in xlsx_files[start:start + count]:
+            submit_copy(path, silent=True)
+    except Exception as e:
+        logging.warning(f"預取複製失敗: {e}")
+
+
 def create_baseline_for_files_robust(xlsx_files, skip_force_baseline=True):
     """
     為多個檔案建立基準線
@@ -206,6 +327,7 @@ def create_baseline_for_files_robust(xlsx_files, skip_force_baseline=True):
         os.makedirs(settings.CACHE_FOLDER, exist_ok=True)
     
     success_count, skip_count, error_count = 0, 0, 0
+    prefetch = max(0, int(getattr(settings, 'BASELINE_COPY_PREFETCH', 0) or 0))
     start_time = time.time()
     total_original_size = 0
     total_compressed_size = 0
@@ -215,6 +337,8 @@ def create_baseline_for_files_robust(xlsx_files, skip_force_baseline=True):
             print("\n🛑 收到停止信號，正在安全退出...")
             save_progress(i, total)
             break
+
+        _prefetch_copies(xlsx_files, i + 1, prefetch)
         
         file_path = xlsx_files[i]
         # 使用包含路徑哈希的 key，避免同名不同路徑覆蓋
@@ -238,7 +362,11 @@ def create_baseline_for_files_robust(xlsx_files, skip_force_baseline=True):
             old_baseline = load_baseline(base_key)
             old_hash = old_baseline['content_hash'] if old_baseline and 'content_hash' in old_baseline else None
             
-            cell_data = dump_excel_cells_with_timeout(file_path)
+            # 傳入舊基準線：只重讀 part 指紋有變的工作表（強制重建時完整讀取）
+            force_rebuild = getattr(settings, 'FORCE_REBUILD_BASELINE_ON_SCAN', False)
+            dump_info = {}
+            cell_data = dump_excel_cells_with_timeout(file_path, baseline=None if force_rebuild else old_baseline, dump_info=dump_info)
+            part_fp = dump_info.get('part_fingerprints')
             
             if cell_data is None:
                 if settings.current_processing_file is None and (time.time() - file_start_time) > settings.FILE_TIMEOUT_SECONDS:
@@ -247,10 +375,23 @@ def create_baseline_for_files_robust(xlsx_files, skip_force_baseline=True):
                      print(f"  結果: [READ_ERROR]")
                 error_count += 1
             else:
-                curr_hash = hash_excel_content(cell_data)
-                if (not getattr(settings, 'FORCE_REBUILD_BASELINE_ON_SCAN', False)) and old_hash == curr_hash and old_hash is not None:
+                # 內容樹 root 即 content_hash；舊基準線（無內容樹，MD5）才需整本序列化比對
+                curr_tree = build_content_tree(cell_data,
+                                               prev_tree=(old_baseline or {}).get('content_tree'),
+                                               reuse_sheets=dump_info.get('reused_sheets') or ())
+                curr_hash = tree_root(curr_tree)
+                if old_baseline and old_baseline.get('content_tree'):
+                    unchanged = (old_hash is not None and old_hash == curr_hash)
+                else:
+                    unchanged = (old_hash is not None and old_hash == hash_excel_content(cell_data))
+                if (not force_rebuild) and unchanged:
                     print(f"  結果: [SKIP] (Hash unchanged)")
                     skip_count += 1
+                    if not old_baseline.get('content_tree') or (part_fp and part_fp != old_baseline.get('part_fingerprints')):
+                        # 舊格式基準線：補寫內容樹與 part 指紋一次，之後不再走整本 MD5 慢路徑；
+                        # 指紋 / 解析設定已變而內容相同時亦更新指紋，否則之後每次都要完整重讀
+                        if upgrade_legacy_baseline(base_key, old_baseline, cell_data, curr_tree, part_fp, file_path):
+                            print(f"  基準線已升級（內容樹 + part 指紋）")
                 else:
                     curr_author = get_excel_last_author(file_path)
                     baseline_data = {
@@ -258,6 +399,8 @@ def create_baseline_for_files_robust(xlsx_files, skip_force_baseline=True):
                         "source_size": os.path.getsize(file_path),
                         "last_author": curr_author, 
                         "content_hash": curr_hash, 
+                        "content_tree": curr_tree,
+                        "part_fingerprints": part_fp,
                         "cells": cell_data
                     }
                     
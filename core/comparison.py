@@ -7,17 +7,20 @@ import gzip
 import json
 import time
 import re
+import functools
 from datetime import datetime
 from wcwidth import wcwidth
 import config.settings as settings
 from utils.logging import _get_display_width
 from utils.helpers import get_file_mtime
 from core.excel_parser import pretty_formula, extract_external_refs, get_excel_last_author
+from core.excel_parser import _RE_EXT_INDEX_SHEET, _RE_EXT_QUOTED_PATH, _RE_EXT_BOOK_SHEET
 from core.baseline import load_baseline, baseline_file_path
 import logging
 import hashlib
 import json as _json
 import core.baseline as baseline
+from utils.content_tree import build_content_tree, diff_trees, restrict_to_blocks, tree_root
 
 # 全局累積器：每次事件（file_path,event_number）收集所有工作表的顯示資料
 _per_event_accum = {}
@@ -291,17 +294,35 @@ def compare_excel_changes(file_path, silent=False, event_number=None, is_polling
         if old_baseline is None:
             old_baseline = {}
 
-        current_data = dump_excel_cells_with_timeout(file_path, show_sheet_detail=False, silent=True)
+        # 傳入基準線：只重讀 part 指紋有變的工作表，其餘沿用基準線 cells（全部未變時不需解析任何工作表）
+        dump_info = {}
+        current_data = dump_excel_cells_with_timeout(file_path, show_sheet_detail=False, silent=True,
+                                                     baseline=old_baseline, dump_info=dump_info)
         if current_data is None:
             time.sleep(1)
-            current_data = dump_excel_cells_with_timeout(file_path, show_sheet_detail=False, silent=True)
+            dump_info = {}
+            current_data = dump_excel_cells_with_timeout(file_path, show_sheet_detail=False, silent=True,
+                                                         baseline=old_baseline, dump_info=dump_info)
             if current_data is None:
                 if not silent:
                     print(f"❌ 重試後仍無法讀取檔案: {os.path.basename(file_path)}")
                 return False
+        current_fp = dump_info.get('part_fingerprints')
+        reused_sheets = dump_info.get('reused_sheets') or set()
         
         baseline_cells = old_baseline.get('cells', {})
-        if baseline_cells == current_data:
+        # 內容樹：root 相同即無變更；否則只進入雜湊不同的工作表 / 列區塊（舊基準線無內容樹時回退整體比較）
+        current_tree = build_content_tree(current_data, prev_tree=old_baseline.get('content_tree'), reuse_sheets=reused_sheets)
+        tree_changes = diff_trees(old_baseline.get('content_tree'), current_tree)
+        if tree_changes is not None:
+            unchanged = not tree_changes
+        else:
+            unchanged = (baseline_cells == current_data)
+        if unchanged:
+            if old_baseline and (tree_changes is None or (current_fp and current_fp != old_baseline.get('part_fingerprints'))):
+                # 舊格式基準線（無內容樹）：補寫內容樹與 part 指紋，之後即走快速路徑；
+                # 內容相同但指紋 / 解析設定已變（例如重新存檔、改了 VALUE_ENGINE）時同樣更新指紋，下次才可增量讀取
+                baseline.upgrade_legacy_baseline(base_key, old_baseline, current_data, current_tree, current_fp, file_path)
             # 如果是輪詢且無變化，則不顯示任何內容
             if is_polling:
                 print(f"    [輪詢檢查] {os.path.basename(file_path)} 內容無變化。")
@@ -315,12 +336,18 @@ def compare_excel_changes(file_path, silent=False, event_number=None, is_polling
         except Exception:
             new_author = 'Unknown'
 
-        for worksheet_name in set(baseline_cells.keys()) | set(current_data.keys()):
+        if tree_changes is not None:
+            sheets_to_check = set(tree_changes.keys())
+        else:
+            sheets_to_check = set(baseline_cells.keys()) | set(current_data.keys())
+        for worksheet_name in sheets_to_check:
             old_ws = baseline_cells.get(worksheet_name, {})
             new_ws = current_data.get(worksheet_name, {})
             
-            if old_ws == new_ws:
+            if tree_changes is None and old_ws == new_ws:
                 continue
+            # 只比較雜湊不同的列區塊（交由 analyze_meaningful_changes 限定範圍，大型表可走欄式比較）
+            blocks = tree_changes.get(worksheet_name) if tree_changes is not None else None
 
             any_sheet_has_changes = True
             
@@ -331,7 +358,7 @@ def compare_excel_changes(file_path, silent=False, event_number=None, is_polling
                 
                 # 只顯示「有意義變更」（隱藏間接變更/無意義變更）
                 # 即時比較（is_polling=False）不抑制純值變更，確保有表出來；輪詢比較才允許抑制
-                meaningful_changes = analyze_meaningful_changes(old_ws, new_ws, allow_suppress=is_polling)
+                meaningful_changes = analyze_meaningful_changes(old_ws, new_ws, allow_suppress=is_polling, blocks=blocks)
                 if not meaningful_changes:
                     # 為了可視性：即時比較若沒有有意義變更，仍至少輸出表頭與 (No cell changes)
                     if not is_polling:
@@ -417,7 +444,7 @@ def compare_excel_changes(file_path, silent=False, event_number=None, is_polling
                 
                 # 分析並記錄有意義的變更
                         # 分析並記錄有意義的變更（帶入設定控制）
-                meaningful_changes = analyze_meaningful_changes(old_ws, new_ws)
+                meaningful_changes = analyze_meaningful_changes(old_ws, new_ws, blocks=blocks)
                 if meaningful_changes:
                     # 只在非輪詢的第一次檢查時記錄日誌，避免重複
                     if not is_polling:
@@ -455,8 +482,10 @@ def compare_excel_changes(file_path, silent=False, event_number=None, is_polling
             try:
                 from utils.history import save_history_snapshot, sync_history_to_git_repo, insert_event_index
                 mc_count = 0
+                # 有內容樹時只看雜湊不同的工作表（其餘工作表內容相同，分段基準線也不必解碼）
+                ws_all = sheets_to_check if tree_changes is not None else set(baseline_cells.keys()) | set(current_data.keys())
                 try:
-                    mc_count = sum(len(analyze_meaningful_changes(baseline_cells.get(ws, {}), current_data.get(ws, {}))) for ws in set(baseline_cells.keys()) | set(current_data.keys()))
+                    mc_count = sum(len(analyze_meaningful_changes(baseline_cells.get(ws, {}), current_data.get(ws, {}))) for ws in ws_all)
                 except Exception:
                     mc_count = 0
                 # 準備 Timeline diffs（限量）
@@ -466,7 +495,6 @@ def compare_excel_changes(file_path, silent=False, event_number=None, is_polling
                 except Exception:
                     _limit = 200
                 try:
-                    ws_all = set(baseline_cells.keys()) | set(current_data.keys())
                     for _ws in ws_all:
                         diffs = analyze_meaningful_changes(baseline_cells.get(_ws, {}), current_data.get(_ws, {}))
                         for ch in diffs:
@@ -543,11 +571,13 @@ def compare_excel_changes(file_path, silent=False, event_number=None, is_polling
                 cur_size  = os.path.getsize(file_path)
                 updated_baseline = {
                     "last_author": new_author,
-                    "content_hash": f"updated_{int(time.time())}",
+                    "content_hash": tree_root(current_tree) or f"updated_{int(time.time())}",
+                    "content_tree": current_tree,
                     "cells": current_data,
                     "timestamp": datetime.now().isoformat(),
                      "source_mtime": cur_mtime,
-                     "source_size": cur_size
+                     "source_size": cur_size,
+                     "part_fingerprints": current_fp
                 }
                 if not baseline.save_baseline(base_key, updated_baseline):
                     print(f"[WARNING] 基準線更新失敗: {os.path.basename(file_path)}")
@@ -670,12 +700,27 @@ def _write_full_event_console_file(file_path, event_number, worksheet_name, disp
         logging.error(f"寫入完整 Console 檔失敗: {e}")
 
 
-def analyze_meaningful_changes(old_ws, new_ws, *, allow_suppress=True):
+def analyze_meaningful_changes(old_ws, new_ws, *, allow_suppress=True, blocks=None):
     """
     🧠 分析有意義的變更
+    blocks：內容樹找出的變更列區塊編號；給定時只比較這些區塊內的儲存格（None 表示整張表）
     """
     meaningful_changes = []
-    all_addresses = set(old_ws.keys()) | set(new_ws.keys())
+    all_addresses = None
+    # 大型工作表：以欄式 full join 先找出可能有差異的位址，只對這些位址做逐格分類
+    # （以整張表建立並快取 DataFrame，再依列區塊過濾，基準線一方的 DataFrame 可跨次比較重用）
+    try:
+        min_cells = int(getattr(settings, 'COLUMNAR_DIFF_MIN_CELLS', 20000) or 0)
+        if min_cells > 0 and max(len(old_ws), len(new_ws)) >= min_cells:
+            from utils.columnar import changed_addresses
+            all_addresses = changed_addresses(old_ws, new_ws, blocks=blocks)
+    except Exception:
+        all_addresses = None
+    if all_addresses is None:
+        if blocks is not None:
+            old_ws = restrict_to_blocks(old_ws, blocks)
+            new_ws = restrict_to_blocks(new_ws, blocks)
+        all_addresses = set(old_ws.keys()) | set(new_ws.keys())
     
     for addr in all_addresses:
         old_cell = old_ws.get(addr, {})
@@ -763,21 +808,24 @@ def has_external_reference(formula):
     if not formula:
         return False
     try:
-        import re
-        s = str(formula)
-        # 命中 [n]Sheet!A1
-        if re.search(r"\[(\d+)\][^!\]]+!", s):
-            return True
-        # 命中 '...\\[Book.xlsx]Sheet'!
-        if re.search(r"'[^']*\\\[[^\\\]]+\][^']*'!", s):
-            return True
-        # 命中 [Book.xlsx]Sheet!A1（無引號）
-        if re.search(r"\[[^\]]+\][^!]+!", s):
-            return True
-        return False
+        return _has_external_reference_text(str(formula))
     except Exception:
         return False
 
+@functools.lru_cache(maxsize=65536)
+def _has_external_reference_text(s):
+    """已編譯正則 + LRU：同一公式文字在每次比較中重覆出現（命中率見 cache_info()）"""
+    # 命中 [n]Sheet!A1
+    if _RE_EXT_INDEX_SHEET.search(s):
+        return True
+    # 命中 '...\\[Book.xlsx]Sheet'!
+    if _RE_EXT_QUOTED_PATH.search(s):
+        return True
+    # 命中 [Book.xlsx]Sheet!A1（無引號）
+    if _RE_EXT_BOOK_SHEET.search(s):
+        return True
+    return False
+
 _recent_log_signatures = {}
 
 def log_meaningful_changes_to_csv(file_path, worksheet_name, changes, current_author):
@@ -13,8 +13,19 @@ from openpyxl import load_workbook
 from openpyxl.worksheet.formula import ArrayFormula
 import config.settings as settings
 from utils.cache import copy_to_cache
+from utils import mem_cache
+from utils.cell_store import compact_cells, json_default
 import logging
 import urllib.parse
+from collections import OrderedDict
+
+# 公式美化 / 外部參照判斷用正則（預先編譯；core.comparison.has_external_reference 共用）
+_RE_EXT_INDEX_SHEET_SUB = re.compile(r"\[(\d+)\]([^!\]]+)!")
+_RE_EXT_INDEX = re.compile(r"\[(\d+)\]")
+_RE_EQ_DOUBLE_QUOTE = re.compile(r"=\s*''(?=(?:[A-Za-z]:\\|\\\\))")
+_RE_EXT_INDEX_SHEET = re.compile(r"\[(\d+)\][^!\]]+!")
+_RE_EXT_QUOTED_PATH = re.compile(r"'[^']*\\\[[^\\\]]+\][^']*'!")
+_RE_EXT_BOOK_SHEET = re.compile(r"\[[^\]]+\][^!]+!")
 
 def extract_external_refs(xlsx_path):
     """
@@ -25,7 +36,7 @@ def extract_external_refs(xlsx_path):
     """
     ref_map = {}
     try:
-        with zipfile.ZipFile(xlsx_path, 'r') as z:
+        with zipfile.ZipFile(mem_cache.local_source(xlsx_path), 'r') as z:
             rels = ET.fromstring(z.read('xl/_rels/workbook.xml.rels'))
             for rel in rels.findall('{http://schemas.openxmlformats.org/package/2006/relationships}Relationship'):
                 if rel.attrib.get('Type','').endswith('/externalLink'):
@@ -151,7 +162,7 @@ def pretty_formula(formula, ref_map=None):
                 out = out.replace("''!", "'!")
                 return out
             return m.group(0)
-        s = re.sub(r"\[(\d+)\]([^!\]]+)!", repl_path_with_sheet, formula_str)
+        s = _RE_EXT_INDEX_SHEET_SUB.sub(repl_path_with_sheet, formula_str)
         
         # 2) 對其餘殘留的 [n] 標記（未帶 sheet 名）插入可讀提示
         def repl_annotate(m):
@@ -161,16 +172,82 @@ def pretty_formula(formula, ref_map=None):
             if norm_path:
                 return f"[外部檔案{n}: {norm_path}]"
             return m.group(0)
-        s = re.sub(r"\[(\d+)\]", repl_annotate, s)
+        s = _RE_EXT_INDEX.sub(repl_annotate, s)
         # 邊界清理：避免在等號後緊接本機/UNC 路徑時出現兩個單引號（="'"'C:\... → ='C:\...）
         try:
-            s = re.sub(r"=\s*''(?=(?:[A-Za-z]:\\|\\\\))", "='", s)
+            s = _RE_EQ_DOUBLE_QUOTE.sub("='", s)
         except Exception:
             pass
         return s
     else:
         return formula_str
 
+def prettify_formula_with_external_flag(fstr, ref_map=None):
+    """
+    美化公式並判斷是否含外部參照，返回 (pretty_formula, external_ref)。
+    openpyxl 路徑與串流引擎共用，確保兩者輸出一致。
+    """
+    s_before = str(fstr)
+    try:
+        fstr = pretty_formula(fstr, ref_map=ref_map)
+    except Exception:
+        pass
+    external_ref = False
+    if _RE_EXT_INDEX_SHEET.search(s_before):
+        external_ref = True
+    elif isinstance(fstr, str) and _RE_EXT_QUOTED_PATH.search(fstr):
+        external_ref = True
+    elif isinstance(fstr, str) and _RE_EXT_BOOK_SHEET.search(fstr):
+        external_ref = True
+    return fstr, external_ref
+
+class FormulaMemo:
+    """
+    每本工作簿一個的公式美化 LRU memo：(raw 公式, ref_map 簽名) -> (pretty_formula, external_ref)
+    - 下拉填充 / 絕對參照的公式文字大量重覆，命中時毋須再跑 pretty_formula 與外部參照正則
+    - 可直接作為串流引擎的 formula_fn（可 pickle；多進程時每個 worker 各自累積）
+    - hits / misses 供診斷輸出命中率
+    """
+    def __init__(self, ref_map=None, maxsize=None):
+        self.ref_map = ref_map or {}
+        self.signature = tuple(sorted(self.ref_map.items()))
+        if maxsize is None:
+            maxsize = getattr(settings, 'FORMULA_MEMO_SIZE', 50000)
+        self.maxsize = int(maxsize or 0)
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __call__(self, fstr):
+        if self.maxsize <= 0 or not isinstance(fstr, str):
+            self.misses += 1
+            return prettify_formula_with_external_flag(fstr, self.ref_map)
+        key = (fstr, self.signature)
+        res = self._cache.get(key)
+        if res is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return res
+        self.misses += 1
+        res = prettify_formula_with_external_flag(fstr, self.ref_map)
+        self._cache[key] = res
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return res
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._cache),
+            'hit_rate': (self.hits / total) if total else 0.0,
+        }
+
+    def describe(self):
+        st = self.stats()
+        return f"hits={st['hits']} misses={st['misses']} size={st['size']} hit_rate={st['hit_rate']:.1%}"
+
 def get_cell_formula(cell):
     """
     取得 cell 公式（不論係普通 formula or array formula），一律回傳公式字串
@@ -205,10 +282,10 @@ def get_excel_last_author(path):
     try:
         # 先複製到本地快取，避免直接打開原始檔案
         local_path = copy_to_cache(path, silent=True)
-        if not local_path or not os.path.exists(local_path):
+        if not local_path or not mem_cache.exists(local_path):
             return None
         try:
-            with zipfile.ZipFile(local_path, 'r') as z:
+            with zipfile.ZipFile(mem_cache.local_source(local_path), 'r') as z:
                 core_xml = z.read('docProps/core.xml')
                 root = ET.fromstring(core_xml)
                 ns = {
@@ -226,7 +303,7 @@ def get_excel_last_author(path):
 
         # Fallback：對快取檔使用 openpyxl（不會鎖定原檔）
         try:
-            wb = load_workbook(local_path, read_only=True)
+            wb = load_workbook(mem_cache.local_source(local_path), read_only=True)
             author = wb.properties.lastModifiedBy
             wb.close()
             del wb
@@ -252,6 +329,11 @@ def safe_load_workbook(path, max_retry=3, delay=0.5, **kwargs):
     last_err = None
     for i in range(max_retry):
         try:
+            # 記憶體副本（utils.mem_cache）：直接由 BytesIO 載入，毋須檔案檢查
+            src = mem_cache.local_source(path)
+            if not isinstance(src, str):
+                return load_workbook(src, **kwargs)
+
             # 檢查文件是否可讀
             if not os.path.exists(path):
                 raise FileNotFoundError(f"檔案不存在: {path}")
@@ -294,10 +376,197 @@ def safe_load_workbook(path, max_retry=3, delay=0.5, **kwargs):
     
     raise last_err
 
-def dump_excel_cells_with_timeout(path, show_sheet_detail=True, silent=False):  # noqa: C901
+def _dump_cells_via_stream(local_path, show_sheet_detail=True, silent=False, sheets=None):
+    """
+    FORMULA_ENGINE='xml'：以串流引擎單次讀取公式與 cached value。
+    失敗時返回 None，由呼叫方回退到 openpyxl 路徑。
+    """
+    try:
+        from utils.value_engines.stream_reader import read_cells_from_xlsx_via_stream
+        t0 = time.time()
+        ref_map = extract_external_refs(local_path)
+        # 大檔才啟用多進程（進程池啟動與結果回傳有固定成本，小檔單進程更快）
+        workers = max(1, int(getattr(settings, 'MAX_SHEET_WORKERS', 1) or 1))
+        try:
+            min_mb = float(getattr(settings, 'PARALLEL_SHEET_MIN_SIZE_MB', 5))
+            if mem_cache.getsize(local_path) < min_mb * 1024 * 1024:
+                workers = 1
+        except (OSError, TypeError, ValueError):
+            workers = 1
+        workers = min(workers, os.cpu_count() or 1)
+        # 多進程需實體檔案：記憶體副本此時才落地；單進程直接解析記憶體中的 zip
+        source = mem_cache.materialize(local_path) if workers > 1 else mem_cache.local_source(local_path)
+        formula_memo = FormulaMemo(ref_map)
+        # 進程池只可用本檔剩餘的逾時預算，worker 卡住時不會令整個讀取永遠等待
+        timeout = None
+        if getattr(settings, 'ENABLE_TIMEOUT', False) and settings.processing_start_time:
+            budget = float(getattr(settings, 'FILE_TIMEOUT_SECONDS', 120))
+            timeout = max(0.0, budget - (time.time() - settings.processing_start_time))
+        result = read_cells_from_xlsx_via_stream(
+            source,
+            formula_fn=formula_memo,
+            sheets=sheets,
+            max_workers=workers,
+            timeout=timeout,
+        )
+        if not silent:
+            print(f"   [formula-engine] XML stream (single pass) sheets={len(result)} workers={workers} elapsed={time.time() - t0:.2f}s")
+            if getattr(settings, 'VALUE_ENGINE', 'polars_xml') != 'polars_xml':
+                print(f"   [formula-engine] VALUE_ENGINE={settings.VALUE_ENGINE} not used: cached values read by the stream engine (polars_xml rules)")
+            if workers == 1:
+                print(f"   [formula-memo] {formula_memo.describe()}")
+        if show_sheet_detail and not silent:
+            for idx, (name, ws_data) in enumerate(result.items(), 1):
+                print(f"      處理工作表 {idx}/{len(result)}: {name}（{len(ws_data)} 有資料 cell）")
+        return result
+    except Exception as e:
+        if not silent:
+            print(f"   [formula-engine] XML stream failed, fallback to openpyxl: {e}")
+        logging.warning(f"串流讀取失敗，回退 openpyxl: {local_path}, {e}")
+        return None
+
+def iter_sheet_rows_sparse(ws):
+    """
+    稀疏逐列讀取 read_only 工作表：產出 (row_idx, [(col_idx, cell), ...])，只含 XML 中實際存在的 <c>。
+    - 不依賴 <dimension>（max_row × max_column 矩形），零散格式不會造成大量空白位置
+    - 單次串流整張表，不需分批重掃
+    - 若 openpyxl 內部介面不可用，退回 reset_dimensions() 後的 iter_rows（以實際列寬為準）
+    """
+    try:
+        from openpyxl.worksheet._reader import WorkSheetParser
+        from openpyxl.cell.read_only import ReadOnlyCell
+        wb = ws.parent
+        src = ws._get_source()
+        parser = WorkSheetParser(src, ws._shared_strings,
+                                 data_only=wb.data_only,
+                                 epoch=wb.epoch,
+                                 date_formats=wb._date_formats,
+                                 timedelta_formats=wb._timedelta_formats)
+    except (ImportError, AttributeError, TypeError) as e:
+        logging.warning(f"稀疏讀取不可用，改用 iter_rows: sheet={getattr(ws, 'title', '?')}, {e}")
+        ws.reset_dimensions()
+        for r_idx, row in enumerate(ws.iter_rows(values_only=False), start=1):
+            yield r_idx, [(c_idx, cell) for c_idx, cell in enumerate(row, start=1)
+                          if getattr(cell, 'value', None) is not None]
+        return
+    with src:
+        for r_idx, cells in parser.parse():
+            if cells:
+                yield r_idx, [(c['column'], ReadOnlyCell(ws, **c)) for c in cells]
+
+def read_cached_values_batched(wb_values, wanted_by_sheet):
+    """
+    以單次串流讀取各工作表中指定位址的 cached value（data_only 工作簿）。
+    - wanted_by_sheet：{sheet_name: [addr, ...]}
+    - 每張表只走一次，範圍限於要求位址的外框（min/max row、col），讀到最後一列即停
+    返回 ({sheet_name: {addr: value}}, stats)；stats 含 sheets / requested / found / rows_scanned / elapsed
+    """
+    from utils.value_engines.stream_reader import _split_addr
+    t0 = time.time()
+    out = {}
+    stats = {'sheets': 0, 'requested': 0, 'found': 0, 'rows_scanned': 0, 'elapsed': 0.0}
+    for sheet_name, addrs in wanted_by_sheet.items():
+        if not addrs or sheet_name not in wb_values.sheetnames:
+            continue
+        want = {}
+        for addr in addrs:
+            r, c = _split_addr(addr)
+            if r > 0 and c > 0:
+                want.setdefault(r, {})[c] = addr
+        if not want:
+            continue
+        stats['sheets'] += 1
+        stats['requested'] += len(addrs)
+        min_row, max_row = min(want), max(want)
+        min_col = min(min(cols) for cols in want.values())
+        max_col = max(max(cols) for cols in want.values())
+        ws2 = wb_values[sheet_name]
+        vals = {}
+        try:
+            for r_idx, row in enumerate(ws2.iter_rows(min_row=min_row, max_row=max_row,
+                                                     min_col=min_col, max_col=max_col, values_only=True),
+                                        start=min_row):
+                stats['rows_scanned'] += 1
+                cols = want.get(r_idx)
+                if not cols:
+                    continue
+                for c, addr in cols.items():
+                    i = c - min_col
+                    vals[addr] = row[i] if i < len(row) else None
+        except Exception as e:
+            logging.warning(f"批次讀取 cached value 失敗: sheet={sheet_name}, {e}")
+        # 未出現在串流中的位址（空白列）視為 None，與逐格讀取結果一致
+        for cols in want.values():
+            for addr in cols.values():
+                vals.setdefault(addr, None)
+        stats['found'] += sum(1 for v in vals.values() if v is not None)
+        out[sheet_name] = vals
+    stats['elapsed'] = time.time() - t0
+    return out, stats
+
+def _finalize_cells(result):
+    """COMPACT_CELL_STORE 啟用時把結果轉為緊湊儲存（CompactSheet，唯讀 Mapping）"""
+    if getattr(settings, 'COMPACT_CELL_STORE', True):
+        try:
+            return compact_cells(result)
+        except Exception as e:
+            logging.warning(f"緊湊儲存轉換失敗，沿用 dict 格式: {e}")
+    return result
+
+def dump_excel_cells_with_timeout(path, show_sheet_detail=True, silent=False, sheets=None, baseline=None, dump_info=None):
     """
     提取 Excel 檔案中的所有儲存格數據（含公式）
+    - sheets：只讀取指定名稱的工作表（None 表示全部）
+    - baseline：上一份基準線（含 cells 與 part_fingerprints）。提供時只重讀 part 指紋有變的工作表
+      （sharedStrings / externalLinks 有變時，只重讀實際引用它們的工作表），其餘工作表直接沿用基準線 cells
+    - dump_info：如提供 dict，會填入 part_fingerprints / reparsed_sheets / reused_sheets 供呼叫方保存基準線
+    """
+    # 讀取期間釘住本地快取副本，避免被快取容量管理逐出
+    from utils.cache_manager import pinned_source
+    with pinned_source(path):
+        if sheets is None and getattr(settings, 'ENABLE_PART_FINGERPRINTS', True):
+            prev_fp = (baseline or {}).get('part_fingerprints')
+            part_fp = get_part_fingerprints(path, prev_fp=prev_fp, silent=silent)
+            if dump_info is not None:
+                dump_info['part_fingerprints'] = part_fp
+            reuse_cells = (baseline or {}).get('cells')
+            changed = changed_sheets_by_fingerprint(prev_fp, part_fp) if reuse_cells is not None else None
+            if changed is not None:
+                partial = _dump_excel_cells(path, show_sheet_detail, silent, sheets=changed) if changed else {}
+                if partial is not None:
+                    from utils.baseline_container import LazyCells
+                    if isinstance(reuse_cells, LazyCells):
+                        # 分段基準線：沿用的工作表保持未解碼（儲存格數取自索引），寫回時直接搬移原壓縮區段
+                        fresh = _finalize_cells({n: ws for n, ws in partial.items() if n in changed and ws})
+                        order = [n for n in part_fp['sheets']
+                                 if (n in fresh if n in changed else reuse_cells.cell_count(n) > 0)]
+                        result = reuse_cells.overlay(fresh, order)
+                    else:
+                        result = {}
+                        for name in part_fp['sheets']:
+                            ws_cells = partial.get(name) if name in changed else reuse_cells.get(name)
+                            if ws_cells:
+                                result[name] = ws_cells
+                    reused = {name for name in result if name not in changed}
+                    if dump_info is not None:
+                        dump_info['reparsed_sheets'] = set(changed)
+                        dump_info['reused_sheets'] = reused
+                    if not silent or getattr(settings, 'SHOW_DEBUG_MESSAGES', False):
+                        print(f"   [incremental] {os.path.basename(path)} reparsed={sorted(changed)} reused={len(reused)} sheets")
+                    return result if isinstance(result, LazyCells) else _finalize_cells(result)
+
+        result = _dump_excel_cells(path, show_sheet_detail, silent, sheets)
+        if dump_info is not None:
+            dump_info['reparsed_sheets'] = set(result or {})
+            dump_info['reused_sheets'] = set()
+        return result
+
+def _dump_excel_cells(path, show_sheet_detail=True, silent=False, sheets=None):  # noqa: C901
+    """
+    實際讀取（dump_excel_cells_with_timeout 的完整 / 指定工作表讀取部分）
     - 會先將來源檔複製到本地快取，再以 openpyxl 讀取（絕不直接讀原檔，視設定而定）
+    - FORMULA_ENGINE='xml' 時改用串流引擎單次讀取公式與 cached value（失敗才回退 openpyxl）
+    - sheets：只讀取指定名稱的工作表（None 表示全部）
     - 值引擎優先用 polars（如不可用則自動回退到 XML）
     - 修正：external_ref 先安全初始化為 False，避免 UnboundLocalError
     """
@@ -315,24 +584,32 @@ def dump_excel_cells_with_timeout(path, show_sheet_detail=True, silent=False):
 
         # 只處理快取副本
         local_path = copy_to_cache(path, silent=silent)
-        if not local_path or not os.path.exists(local_path):
+        if not local_path or not mem_cache.exists(local_path):
             if not silent:
                 print("   ❌ 無法使用快取副本（嚴格模式下不會讀取原檔），略過此檔案。")
             return None
 
+        if getattr(settings, 'FORMULA_ENGINE', 'openpyxl') == 'xml':
+            stream_result = _dump_cells_via_stream(local_path, show_sheet_detail=show_sheet_detail, silent=silent, sheets=sheets)
+            if stream_result is not None:
+                if not silent and show_sheet_detail:
+                    print(f"   ✅ Excel 讀取完成")
+                return _finalize_cells(stream_result)
+
         read_only_mode = True
         if not silent:
             print(f"   🚀 讀取模式: read_only={read_only_mode}, data_only=False")
 
         if getattr(settings, 'SHOW_DEBUG_MESSAGES', False):
             try:
-                _sz = os.path.getsize(local_path)
+                _sz = mem_cache.getsize(local_path)
                 _kb = f"{_sz/1024:.1f} KB"
                 _mb = f"{_sz/1024/1024:.2f} MB"
                 _sz_str = f"bytes={_sz} ({_kb}, {_mb})"
             except Exception:
                 _sz_str = 'bytes=N/A'
-            print(f"   [xlsx-open] local_path={local_path} size={_sz_str}")
+            _where = ' (in-memory)' if mem_cache.is_in_memory(local_path) else ''
+            print(f"   [xlsx-open] local_path={local_path}{_where} size={_sz_str}")
         # 多重保護機制：嘗試不同嘅載入方式
         wb = None
         load_attempts = [
@@ -372,8 +649,9 @@ def dump_excel_cells_with_timeout(path, show_sheet_detail=True, silent=False):
         if not silent and show_sheet_detail:
             print(f"   工作表數量: {worksheet_count}")
 
-        # 解析外部參照映射，供 prettify 使用
+        # 解析外部參照映射，供 prettify 使用（同一本工作簿內以 memo 重用美化結果）
         ref_map = extract_external_refs(local_path)
+        formula_memo = FormulaMemo(ref_map)
 
         formula_cells_global = 0
         formula_coords_by_sheet = {}
@@ -384,10 +662,57 @@ def dump_excel_cells_with_timeout(path, show_sheet_detail=True, silent=False):
         persist_dir = getattr(settings, 'CACHE_FOLDER', None)
         values_by_sheet = {}
 
+        # auto：依登記表選擇此工作簿最快且有效的引擎（首次遇到時試跑各引擎後固定）
+        auto_trial = False
+        if value_engine == 'auto':
+            try:
+                from utils.value_engines.registry import resolve_auto_engine
+                # 增量重新解析只讀部分工作表：不試跑（子集耗時不能用來固定整本工作簿的引擎）
+                chosen, reason = resolve_auto_engine(local_path, allow_trial=sheets is None)
+                if chosen:
+                    value_engine = chosen
+                else:
+                    auto_trial = True
+                if not silent or getattr(settings, 'SHOW_DEBUG_MESSAGES', False):
+                    print(f"   [value-engine] auto -> {chosen or 'trial'} | {reason}")
+            except Exception as e:
+                value_engine = 'polars_xml'
+                if not silent:
+                    print(f"   [value-engine] auto selection failed, use polars_xml: {e}")
+
+        # 值快取：快取副本內容（zip 指紋）未變時直接 mmap 載入上次的值，毋須再跑值引擎
+        requested_engine = value_engine
+        value_fp = None
+        value_cache_hit = False
+        try:
+            from utils.value_cache import load_value_cache, workbook_fingerprint
+            if getattr(settings, 'VALUE_CACHE_ENABLED', True) and not auto_trial:
+                value_fp = workbook_fingerprint(local_path)
+                cached_values = load_value_cache(local_path, requested_engine, fingerprint=value_fp)
+                if cached_values is not None:
+                    values_by_sheet = cached_values
+                    value_cache_hit = True
+                    if not silent:
+                        print(f"   [value-cache] hit engine={requested_engine} fp={value_fp} sheets={len(cached_values)}")
+        except Exception as e:
+            if not silent:
+                print(f"   [value-cache] lookup failed: {e}")
+
+        engine_t0 = time.perf_counter()
         try:
             if getattr(settings, 'SHOW_DEBUG_MESSAGES', False):
                 print(f"   [value-engine] selecting… pref={value_engine}")
-            if value_engine == 'polars':
+            if value_cache_hit:
+                pass
+            elif auto_trial:
+                from utils.value_engines.registry import trial_engines
+                value_engine, values_by_sheet = trial_engines(local_path, sheet_count=len(wb.worksheets),
+                                                              persist_csv=persist_csv, persist_dir=persist_dir, silent=silent,
+                                                              sheets=sheets)
+                requested_engine = value_engine
+                if not silent:
+                    print(f"   [value-engine] auto pinned -> {value_engine}")
+            elif value_engine == 'polars':
                 from utils.value_engines.polars_reader import read_values_from_xlsx_via_polars
                 if not silent:
                     try:
@@ -398,7 +723,7 @@ def dump_excel_cells_with_timeout(path, show_sheet_detail=True, silent=False):
                     except Exception:
                         print("   [value-engine] POLARS (version info unavailable)")
                 try:
-                    values_by_sheet = read_values_from_xlsx_via_polars(local_path, persist_csv=persist_csv, persist_dir=persist_dir, sheet_count=len(wb.worksheets))
+                    values_by_sheet = read_values_from_xlsx_via_polars(local_path, persist_csv=persist_csv, persist_dir=persist_dir, sheet_count=len(wb.worksheets), sheets=sheets)
                 except TypeError:
                     values_by_sheet = read_values_from_xlsx_via_polars(local_path, persist_csv=persist_csv, persist_dir=persist_dir)
                 # 若 polars 提供非空值為 0，回退 polars_xml
@@ -410,30 +735,30 @@ def dump_excel_cells_with_timeout(path, show_sheet_detail=True, silent=False):
                     if not silent:
                         print("   [fallback->polars_xml] reason=polars_nonempty=0")
                     from utils.value_engines.polars_xml_reader import read_values_from_xlsx_via_polars_xml
-                    values_by_sheet = read_values_from_xlsx_via_polars_xml(local_path)
+                    values_by_sheet = read_values_from_xlsx_via_polars_xml(local_path, sheets=sheets)
                     value_engine = 'polars_xml'
             elif value_engine == 'polars_xml':
                 from utils.value_engines.polars_xml_reader import read_values_from_xlsx_via_polars_xml
                 if not silent:
                     print("   [value-engine] POLARS_XML (internal XML parser -> values)")
-                values_by_sheet = read_values_from_xlsx_via_polars_xml(local_path)
+                values_by_sheet = read_values_from_xlsx_via_polars_xml(local_path, sheets=sheets)
             elif value_engine == 'pandas':
                 if not silent:
                     print("   [value-engine] PANDAS (via xlsx2csv -> pandas.read_csv)")
                 try:
                     from utils.value_engines.pandas_reader import read_values_from_xlsx_via_pandas
-                    values_by_sheet = read_values_from_xlsx_via_pandas(local_path, persist_csv=persist_csv, persist_dir=persist_dir, sheet_count=len(wb.worksheets))
+                    values_by_sheet = read_values_from_xlsx_via_pandas(local_path, persist_csv=persist_csv, persist_dir=persist_dir, sheet_count=len(wb.worksheets), sheets=sheets)
                 except Exception as e:
                     if not silent:
                         print(f"   [fallback->polars_xml] pandas path failed: {e}")
                     from utils.value_engines.polars_xml_reader import read_values_from_xlsx_via_polars_xml
-                    values_by_sheet = read_values_from_xlsx_via_polars_xml(local_path)
+                    values_by_sheet = read_values_from_xlsx_via_polars_xml(local_path, sheets=sheets)
                     value_engine = 'polars_xml'
             else:
                 from utils.value_engines.xml_reader import read_values_from_xlsx_via_xml
                 if not silent:
                     print("   [value-engine] XML parser for values")
-                values_by_sheet = read_values_from_xlsx_via_xml(local_path)
+                values_by_sheet = read_values_from_xlsx_via_xml(local_path, sheets=sheets)
         except Exception as e:
             # 回退 XML 值引擎並輸出診斷
             try:
@@ -446,10 +771,22 @@ def dump_excel_cells_with_timeout(path, show_sheet_detail=True, silent=False):
                 pass
             try:
                 from utils.value_engines.xml_reader import read_values_from_xlsx_via_xml
-                values_by_sheet = read_values_from_xlsx_via_xml(local_path)
+                values_by_sheet = read_values_from_xlsx_via_xml(local_path, sheets=sheets)
             except Exception:
                 values_by_sheet = {}
 
+        # 記錄本次引擎耗時 / 失敗（供 auto 模式選擇）；回退時記為原引擎失敗。只讀部分工作表時耗時不具代表性，不記錄
+        if not value_cache_hit and not auto_trial and sheets is None:
+            try:
+                from utils.value_engines.registry import record_run
+                elapsed = time.perf_counter() - engine_t0
+                if value_engine != requested_engine:
+                    record_run(local_path, requested_engine, elapsed, ok=False)
+                record_run(local_path, value_engine, elapsed,
+                           ok=any(len(v or {}) for v in (values_by_sheet or {}).values()))
+            except Exception:
+                pass
+
         # 值引擎返回的工作表 key（供對齊/診斷）
         try:
             sheet_order = list(values_by_sheet.keys())
@@ -480,7 +817,7 @@ def dump_excel_cells_with_timeout(path, show_sheet_detail=True, silent=False):
                 if not silent:
                     print("   [value-engine] no sheets from POLARS, fallback to XML value engine")
                 from utils.value_engines.xml_reader import read_values_from_xlsx_via_xml
-                values_by_sheet = read_values_from_xlsx_via_xml(local_path)
+                values_by_sheet = read_values_from_xlsx_via_xml(local_path, sheets=sheets)
                 sheet_order = list(values_by_sheet.keys()) if isinstance(values_by_sheet, dict) else []
                 if not silent:
                     print(f"   [value-engine] XML sheet keys: {sheet_order}")
@@ -490,30 +827,32 @@ def dump_excel_cells_with_timeout(path, show_sheet_detail=True, silent=False):
                 values_by_sheet = {}
                 sheet_order = []
 
+        if values_by_sheet and not value_cache_hit and value_fp and sheets is None:
+            try:
+                from utils.value_cache import save_value_cache
+                saved = save_value_cache(local_path, requested_engine, values_by_sheet, fingerprint=value_fp)
+                if saved and not silent:
+                    print(f"   [value-cache] saved {os.path.basename(saved)}")
+            except Exception as e:
+                if not silent:
+                    print(f"   [value-cache] save failed: {e}")
+
         per_sheet_formula_provided = {}
 
         # 大文件保護設定
         LARGE_FILE_THRESHOLD = getattr(settings, 'LARGE_FILE_CELL_THRESHOLD', 1000000)  # 100萬個儲存格
         BATCH_SIZE = getattr(settings, 'EXCEL_BATCH_SIZE', 10000)  # 每批處理1萬行
 
-        def process_cell_range(ws, ws_data, formula_addrs, min_row, max_row, min_col, max_col, 
+        def process_cell_range(ws, ws_data, formula_addrs, rows,
                               sheet_vals, ref_map, value_engine, selected_key, per_sheet_formula_provided, silent):
-            """處理指定範圍的儲存格"""
-            def _col_to_letters(n: int) -> str:
-                s = ''
-                while n > 0:
-                    n, r = divmod(n - 1, 26)
-                    s = chr(65 + r) + s
-                return s
+            """處理 rows（[(row_idx, [(col_idx, cell), ...]), ...]）中的儲存格"""
+            from utils.value_engines.stream_reader import _col_to_letters
             
             cell_count = 0
             formula_cells_count = 0
             
-            for r_idx, row in enumerate(
-                ws.iter_rows(min_row=min_row, max_row=max_row, min_col=min_col, max_col=max_col, values_only=False),
-                start=min_row
-            ):
-                for c_idx, cell in enumerate(row, start=1):
+            for r_idx, row in rows:
+                for c_idx, cell in row:
                     addr = f"{_col_to_letters(c_idx)}{r_idx}"
                     external_ref = False
                     
@@ -527,18 +866,7 @@ def dump_excel_cells_with_timeout(path, show_sheet_detail=True, silent=False):
                     
                     if fstr:
                         try:
-                            s_before = str(fstr)
-                            try:
-                                fstr = pretty_formula(fstr, ref_map=ref_map)
-                            except Exception:
-                                pass
-                            import re as _re
-                            if _re.search(r"\[(\d+)\][^!\]]+!", s_before):
-                                external_ref = True
-                            elif isinstance(fstr, str) and _re.search(r"'[^']*\\\[[^\\\]]+\][^']*'!", fstr):
-                                external_ref = True
-                            elif isinstance(fstr, str) and _re.search(r"\[[^\]]+\][^!]+!", fstr):
-                                external_ref = True
+                            fstr, external_ref = formula_memo(fstr)
                             formula_addrs.append(addr)
                             formula_cells_count += 1
                         except Exception:
@@ -569,13 +897,15 @@ def dump_excel_cells_with_timeout(path, show_sheet_detail=True, silent=False):
             return cell_count, formula_cells_count
 
         for idx, ws in enumerate(wb.worksheets, 1):
+            if sheets is not None and ws.title not in sheets:
+                continue
             cell_count = 0
             ws_data = {}
             formula_addrs = []
 
             # 決定值引擎對應的 key
             selected_key = ws.title if ws.title in (values_by_sheet or {}) else None
-            if selected_key is None and sheet_order:
+            if selected_key is None and sheet_order and sheets is None:
                 selected_key = list(values_by_sheet.keys())[idx - 1] if idx - 1 < len(values_by_sheet) else None
                 if not silent and selected_key:
                     print(f"   [value-engine] sheet name mismatch: ws.title='{ws.title}' -> fallback to index key='{selected_key}'")
@@ -602,52 +932,30 @@ def dump_excel_cells_with_timeout(path, show_sheet_detail=True, silent=False):
                 except Exception:
                     print(f"   [map] ws_index={idx} ws_title='{ws.title}' -> key='{selected_key or ''}' provided={p_count} keys={show_keys}")
 
-            if ws.max_row >= 1 and ws.max_column >= 1:
-                try:
-                    # 大文件保護：檢查總儲存格數量
-                    max_rows = ws.max_row
-                    max_cols = ws.max_column
-                    total_cells = max_rows * max_cols
-                    
-                    if not silent and total_cells > LARGE_FILE_THRESHOLD:
-                        print(f"   ⚠️  大文件檢測: {total_cells:,} 個儲存格，啟用分批處理模式")
-                    
-                    if total_cells > LARGE_FILE_THRESHOLD:
-                        # 分批處理大文件
-                        for batch_start in range(1, max_rows + 1, BATCH_SIZE):
-                            batch_end = min(batch_start + BATCH_SIZE - 1, max_rows)
-                            if not silent:
-                                print(f"   📦 處理批次: 行 {batch_start}-{batch_end} ({batch_end-batch_start+1:,} 行)")
-                            
-                            try:
-                                batch_cells, batch_formulas = process_cell_range(
-                                    ws, ws_data, formula_addrs, batch_start, batch_end, 1, max_cols,
-                                    sheet_vals, ref_map, value_engine, selected_key, per_sheet_formula_provided, silent
-                                )
-                                cell_count += batch_cells
-                                formula_cells_global += batch_formulas
-                                
-                                # 強制垃圾回收，釋放記憶體
-                                import gc
-                                gc.collect()
-                                
-                            except Exception as batch_e:
-                                if not silent:
-                                    print(f"   ❌ 批次處理失敗 (行 {batch_start}-{batch_end}): {batch_e}")
-                                # 繼續處理下一批次
-                                continue
-                    else:
-                        # 小文件：使用原有邏輯
-                        batch_cells, batch_formulas = process_cell_range(
-                            ws, ws_data, formula_addrs, 1, max_rows, 1, max_cols,
-                            sheet_vals, ref_map, value_engine, selected_key, per_sheet_formula_provided, silent
-                        )
-                        cell_count += batch_cells
-                        formula_cells_global += batch_formulas
-                        
-                except Exception as _e:
-                    if not silent:
-                        print(f"   [read_error] sheet='{ws.title}' op='process_sheet' err={_e}")
+            try:
+                # 只走 XML 中實際存在的儲存格；<dimension> 僅作提示（可能被零散格式撐到 XFD1048576，也可能偏小）
+                dim_cells = (ws.max_row or 0) * (ws.max_column or 0)
+                if not silent and dim_cells > LARGE_FILE_THRESHOLD:
+                    print(f"   ⚠️  大文件檢測: dimension 宣告 {dim_cells:,} 個儲存格，改以稀疏串流逐列處理")
+                progress_every = BATCH_SIZE if (not silent and dim_cells > LARGE_FILE_THRESHOLD) else 0
+
+                def _rows_with_progress():
+                    n = 0
+                    for item in iter_sheet_rows_sparse(ws):
+                        yield item
+                        n += 1
+                        if progress_every and n % progress_every == 0:
+                            print(f"   📦 已處理 {n:,} 列（目前第 {item[0]:,} 列）")
+
+                batch_cells, batch_formulas = process_cell_range(
+                    ws, ws_data, formula_addrs, _rows_with_progress(),
+                    sheet_vals, ref_map, value_engine, selected_key, per_sheet_formula_provided, silent
+                )
+                cell_count += batch_cells
+                formula_cells_global += batch_formulas
+            except Exception as _e:
+                if not silent:
+                    print(f"   [read_error] sheet='{ws.title}' op='process_sheet' err={_e}")
 
             if show_sheet_detail and not silent:
                 print(f"      處理工作表 {idx}/{worksheet_count}: {ws.title}（{cell_count} 有資料 cell）")
@@ -690,49 +998,22 @@ def dump_excel_cells_with_timeout(path, show_sheet_detail=True, silent=False):
                             print(f"   讀取公式儲存格的 cached value（共 {formula_cells_global} 格）…")
                         wb_values = safe_load_workbook(local_path, read_only=True, data_only=True)
                         try:
-                            # 先針對外部參照且缺值者補齊
-                            external_missing = {}
-                            if getattr(settings, 'ALWAYS_FETCH_VALUE_FOR_EXTERNAL_REFS', True):
-                                cap2 = int(getattr(settings, 'EXTERNAL_REF_VALUE_FETCH_CAP', 0) or 0)
-                                for sheet_name, coords in formula_coords_by_sheet.items():
-                                    for addr in coords:
-                                        try:
-                                            meta = result.get(sheet_name, {}).get(addr, {})
-                                            if meta and meta.get('external_ref') and (meta.get('cached_value') is None):
-                                                if sheet_name not in external_missing:
-                                                    external_missing[sheet_name] = []
-                                                external_missing[sheet_name].append(addr)
-                                        except Exception:
-                                            pass
-                                for sheet_name, addrs in external_missing.items():
-                                    if cap2 > 0:
-                                        addrs = addrs[:cap2]
-                                    if sheet_name not in wb_values.sheetnames:
-                                        continue
-                                    ws2 = wb_values[sheet_name]
-                                    for addr in addrs:
-                                        try:
-                                            val = ws2[addr].value
-                                        except Exception:
-                                            val = None
-                                        sval = serialize_cell_value(val)
-                                        if sheet_name in result and addr in result[sheet_name]:
-                                            result[sheet_name][addr]['cached_value'] = sval
-                            # 其餘地址再補值
+                            # 每張表只串流一次（read_only 模式下 ws[addr] 每次都會重新掃描整張表）
+                            wanted_by_sheet = {}
                             for sheet_name, coords in formula_coords_by_sheet.items():
-                                if sheet_name not in wb_values.sheetnames:
-                                    continue
-                                ws2 = wb_values[sheet_name]
-                                for addr in coords:
-                                    try:
-                                        if result.get(sheet_name, {}).get(addr, {}).get('cached_value') is not None:
-                                            continue
-                                        val = ws2[addr].value
-                                    except Exception:
-                                        val = None
-                                    sval = serialize_cell_value(val)
-                                    if sheet_name in result and addr in result[sheet_name]:
-                                        result[sheet_name][addr]['cached_value'] = sval
+                                ws_res = result.get(sheet_name, {})
+                                wanted = [addr for addr in coords
+                                          if addr in ws_res and ws_res[addr].get('cached_value') is None]
+                                if wanted:
+                                    wanted_by_sheet[sheet_name] = wanted
+                            fetched, stats = read_cached_values_batched(wb_values, wanted_by_sheet)
+                            for sheet_name, vals in fetched.items():
+                                ws_res = result[sheet_name]
+                                for addr, val in vals.items():
+                                    ws_res[addr]['cached_value'] = serialize_cell_value(val)
+                            if not silent:
+                                print(f"   [phase2] batched sheets={stats['sheets']} requested={stats['requested']} "
+                                      f"found={stats['found']} rows_scanned={stats['rows_scanned']} elapsed={stats['elapsed']:.2f}s")
                         finally:
                             try:
                                 wb_values.close()
@@ -750,7 +1031,7 @@ def dump_excel_cells_with_timeout(path, show_sheet_detail=True, silent=False):
         if not silent and show_sheet_detail:
             print(f"   ✅ Excel 讀取完成")
 
-        return result
+        return _finalize_cells(result)
 
     except Exception as e:
         if not silent:
@@ -768,6 +1049,129 @@ def dump_excel_cells_with_timeout(path, show_sheet_detail=True, silent=False):
         settings.current_processing_file = None
         settings.processing_start_time = None
 
+_RE_DEP_SST = re.compile(rb"""\st=["']s["']""")
+# 工作簿層級 part：樣式、工作表對應關係、定義名稱等；任何一個有變都無法判斷哪些工作表受影響，需完整重讀
+_WORKBOOK_PARTS = ('xl/workbook.xml', 'xl/_rels/workbook.xml.rels', 'xl/styles.xml')
+_RE_DEP_EXT = re.compile(rb"\[\d+\]")
+
+def _engine_signature():
+    """影響儲存格值表示方式的解析設定；與 part 指紋一併保存，不同時沿用的工作表會與重讀的工作表格式不一致"""
+    return {
+        'formula_engine': str(getattr(settings, 'FORMULA_ENGINE', 'openpyxl')),
+        'value_engine': str(getattr(settings, 'VALUE_ENGINE', 'polars')),
+        'formula_value_check': bool(getattr(settings, 'ENABLE_FORMULA_VALUE_CHECK', False)),
+    }
+
+def _scan_sheet_deps(z, part):
+    """
+    以位元組掃描 worksheet XML（不解析）判斷該表是否引用 sharedStrings（t="s"）及外部連結（[n]）；
+    兩者都找到即提早結束。判斷偏保守：誤判為「有引用」只會多重讀一張表。
+    """
+    uses_sst = False
+    uses_ext = False
+    tail = b''
+    with z.open(part) as fp:
+        while True:
+            chunk = fp.read(1 << 20)
+            if not chunk:
+                break
+            buf = tail + chunk
+            if not uses_sst and _RE_DEP_SST.search(buf):
+                uses_sst = True
+            if not uses_ext and _RE_DEP_EXT.search(buf):
+                uses_ext = True
+            if uses_sst and uses_ext:
+                break
+            tail = buf[-16:]
+    return {'sst': uses_sst, 'ext': uses_ext}
+
+def get_part_fingerprints(path, prev_fp=None, silent=True):
+    """
+    讀取 xlsx zip 中央目錄內各 part 的 CRC32 與大小（不解析 XML），返回：
+      {'sheets': {sheet_name: [crc, size], ...},
+       'parts': {'xl/sharedStrings.xml': [crc, size], 'xl/externalLinks/...': [crc, size], ...},
+       'deps': {sheet_name: {'sst': bool, 'ext': bool}, ...},
+       'engine': {'formula_engine': ..., 'value_engine': ..., 'formula_value_check': ...}}
+    - sheets 依 workbook 順序記錄每張工作表對應的 worksheet part
+    - parts 記錄共用 part（sharedStrings、externalLinks）及工作簿層級 part（workbook.xml、其 rels、styles.xml）
+    - deps 記錄每張表是否引用共用 part；指紋未變的工作表沿用 prev_fp 的 deps，毋須重新掃描
+    - engine 記錄解析當時的 FORMULA_ENGINE / VALUE_ENGINE / ENABLE_FORMULA_VALUE_CHECK
+    - 一律讀取快取副本；失敗返回 None
+    """
+    try:
+        local_path = copy_to_cache(path, silent=silent)
+        if not local_path or not mem_cache.exists(local_path):
+            return None
+        from utils.value_engines.stream_reader import resolve_sheet_parts
+        prev_sheets = (prev_fp or {}).get('sheets') or {}
+        prev_deps = (prev_fp or {}).get('deps') or {}
+        with zipfile.ZipFile(mem_cache.local_source(local_path), 'r') as z:
+            infos = {zi.filename: [zi.CRC, zi.file_size] for zi in z.infolist()}
+            sheets = {}
+            deps = {}
+            for name, part in resolve_sheet_parts(z):
+                if part not in infos:
+                    continue
+                sheets[name] = infos[part]
+                if name in prev_deps and list(prev_sheets.get(name) or []) == infos[part]:
+                    deps[name] = prev_deps[name]
+                else:
+                    deps[name] = _scan_sheet_deps(z, part)
+        parts = {}
+        for name, fp in infos.items():
+            if name == 'xl/sharedStrings.xml' or name.startswith('xl/externalLinks/') or name in _WORKBOOK_PARTS:
+                parts[name] = fp
+        return {'sheets': sheets, 'parts': parts, 'deps': deps, 'engine': _engine_signature()}
+    except (zipfile.BadZipFile, KeyError, ET.ParseError, OSError) as e:
+        logging.warning(f"讀取 part 指紋失敗: {path}, {e}")
+        return None
+
+def changed_sheets_by_fingerprint(old_fp, new_fp):
+    """
+    比對兩份 part 指紋，返回需要重新解析的工作表名稱集合：
+    - 工作表 part 的 CRC / 大小有變 → 重讀
+    - sharedStrings 有變 → 另加所有引用 sharedStrings 的工作表；externalLinks 有變 → 另加引用外部連結的工作表
+      （deps 不明的工作表一律視為有引用）
+    - workbook.xml / workbook.xml.rels / styles.xml 有變（定義名稱、工作表對應、數字格式等）→ 返回 None
+      （舊指紋未記錄這些 part 時同樣視為有變，完整重讀一次）
+    - 解析設定（engine）與舊指紋不同或舊指紋未記錄 → 返回 None，避免沿用與重讀的工作表值表示方式不一致
+    - 返回空集合：沒有任何工作表需要重讀；返回 None：無法判斷，需完整重讀
+    - 已刪除的工作表不在集合中（由呼叫方直接略過）
+    """
+    if not old_fp or not new_fp:
+        return None
+    try:
+        old_parts = old_fp.get('parts') or {}
+        new_parts = new_fp.get('parts') or {}
+        if _WORKBOOK_PARTS[0] not in old_parts:
+            return None
+        if old_fp.get('engine') != new_fp.get('engine'):
+            return None
+        for key in _WORKBOOK_PARTS:
+            if list(old_parts.get(key) or []) != list(new_parts.get(key) or []):
+                return None
+        sst_key = 'xl/sharedStrings.xml'
+        sst_changed = list(old_parts.get(sst_key) or []) != list(new_parts.get(sst_key) or [])
+        old_ext = {k: list(v) for k, v in old_parts.items() if k != sst_key and k not in _WORKBOOK_PARTS}
+        new_ext = {k: list(v) for k, v in new_parts.items() if k != sst_key and k not in _WORKBOOK_PARTS}
+        ext_changed = old_ext != new_ext
+
+        old_sheets = old_fp.get('sheets') or {}
+        new_sheets = new_fp.get('sheets') or {}
+        deps = new_fp.get('deps') or {}
+        changed = set()
+        for name, fp in new_sheets.items():
+            if list(old_sheets.get(name) or []) != list(fp):
+                changed.add(name)
+                continue
+            if sst_changed or ext_changed:
+                d = deps.get(name)
+                if d is None or (sst_changed and d.get('sst', True)) or (ext_changed and d.get('ext', True)):
+                    changed.add(name)
+        return changed
+    except (AttributeError, TypeError):
+        return None
+
 def hash_excel_content(cells_dict):
     """
     計算 Excel 內容的雜湊值
@@ -776,7 +1180,7 @@ def hash_excel_content(cells_dict):
         return None
     
     try:
-        content_str = json.dumps(cells_dict, sort_keys=True, ensure_ascii=False)
+        content_str = json.dumps(cells_dict, sort_keys=True, ensure_ascii=False, default=json_default)
         return hashlib.md5(content_str.encode('utf-8')).hexdigest()
     except (TypeError, json.JSONEncodeError) as e:
         logging.error(f"計算 Excel 內容雜湊值失敗: {e}")
@@ -10,13 +10,17 @@ from datetime import datetime
 class ActivePollingHandler:
     """
     主動輪詢處理器，採用新的智慧輪詢邏輯 + 穩定窗口/冷靜期
+    - 穩定判斷交由 utils.stability 的共用追蹤器（watchdog 事件 + 單一 stat 取樣執行緒），
+      檔案安靜滿「輪詢間隔 × POLLING_STABLE_CHECKS」秒即回呼比較，不再每檔案各自以 Timer 反覆 stat
     """
+    _OWNER = 'polling'
+
     def __init__(self):
         self.polling_tasks = {}
         self.lock = threading.Lock()
         self.stop_event = threading.Event()
         # 狀態表（每檔案）
-        # { file_path: {"last_mtime":float, "last_size":int, "stable":int, "cooldown_until":float} }
+        # { file_path: {"stable":int, "cooldown_until":float} }
         self.state = {}
 
     def start_polling(self, file_path, event_number):
@@ -37,59 +41,46 @@ class ActivePollingHandler:
 
         interval = settings.DENSE_POLLING_INTERVAL_SEC if file_size_mb < settings.POLLING_SIZE_THRESHOLD_MB else settings.SPARSE_POLLING_INTERVAL_SEC
         polling_type = "密集" if file_size_mb < settings.POLLING_SIZE_THRESHOLD_MB else "稀疏"
-        
-        print(f"[輪詢] 檔案: {os.path.basename(file_path)}（{polling_type}輪詢，每 {interval}s 檢查一次；首次檢查 {interval}s 後）")
-        # 初始化 last_mtime/size 與狀態
-        try:
-            last_mtime = os.path.getmtime(file_path)
-        except Exception:
-            last_mtime = 0
-        try:
-            last_size = os.path.getsize(file_path)
-        except Exception:
-            last_size = -1
+        quiet = self._quiet_window(interval)
+
+        print(f"[輪詢] 檔案: {os.path.basename(file_path)}（{polling_type}輪詢，安靜 {quiet:g}s 後比較）")
         with self.lock:
-            self.state[file_path] = {"last_mtime": last_mtime, "last_size": last_size, "stable": 0, "cooldown_until": 0.0}
-        self._start_adaptive_polling(file_path, event_number, interval, last_mtime)
+            self.state[file_path] = {"stable": 0, "cooldown_until": 0.0}
+        self._arm(file_path, event_number, interval)
 
-    def _start_adaptive_polling(self, file_path, event_number, interval, last_mtime):
-        """
-        開始自適應輪詢
-        """
-        # 停止中不再排程
+    @staticmethod
+    def _quiet_window(interval):
+        return float(interval) * max(1, int(getattr(settings, 'POLLING_STABLE_CHECKS', 3)))
+
+    def _arm(self, file_path, event_number, interval, delay=0.0):
+        """向追蹤器登記：檔案安靜滿窗口（且至少 delay 秒後）時回呼 _on_stable"""
         if self.stop_event.is_set() or getattr(settings, 'force_stop', False):
             return
+        from utils.stability import get_stability_tracker
         with self.lock:
-            if file_path in self.polling_tasks:
-                self.polling_tasks[file_path]['timer'].cancel()
-
-            def task_wrapper():
-                if self.stop_event.is_set() or getattr(settings, 'force_stop', False):
-                    return
-                self._poll_for_stability(file_path, event_number, interval, last_mtime)
-
-            timer = threading.Timer(interval, task_wrapper)
-            self.polling_tasks[file_path] = {'timer': timer}
-            timer.start()
-
-    def _poll_for_stability(self, file_path, event_number, interval, last_mtime):
+            self.polling_tasks[file_path] = {'event_number': event_number, 'interval': interval}
+        get_stability_tracker().watch(
+            file_path, self._quiet_window(interval),
+            lambda: self._on_stable(file_path, event_number, interval),
+            owner=self._OWNER, delay=delay,
+        )
+
+    def _on_stable(self, file_path, event_number, interval):
         """
-        執行輪詢檢查：使用 mtime/size 的穩定窗口策略，並包含冷靜期與暫存鎖檔判斷
+        檔案已穩定：檢查冷靜期與暫存鎖檔後執行比較；仍有變更則啟動冷靜期並重新登記
         """
         if self.stop_event.is_set():
             return
+        with self.lock:
+            if file_path not in self.polling_tasks:
+                return
+            st = self.state.setdefault(file_path, {"stable": 0, "cooldown_until": 0.0})
 
         # 冷靜期判斷
-        st = self.state.get(file_path, {})
         now = time.time()
-        if st and now < st.get("cooldown_until", 0):
+        if now < st.get("cooldown_until", 0):
             print(f"    [cooldown] {os.path.basename(file_path)} 尚在冷靜期，略過本次。")
-            # 重新排程
-            with self.lock:
-                if file_path in self.polling_tasks:
-                    new_timer = threading.Timer(interval, lambda: self._poll_for_stability(file_path, event_number, interval, last_mtime))
-                    self.polling_tasks[file_path]['timer'] = new_timer
-                    new_timer.start()
+            self._arm(file_path, event_number, interval, delay=st["cooldown_until"] - now)
             return
 
         # 檢測暫存鎖檔 (~$)
@@ -98,85 +89,47 @@ class ActivePollingHandler:
             try:
                 if os.path.exists(tmp_lock):
                     print(f"    [鎖檔] 偵測到 {os.path.basename(tmp_lock)}，延後檢查。")
-                    with self.lock:
-                        if file_path in self.polling_tasks:
-                            new_timer = threading.Timer(interval, lambda: self._poll_for_stability(file_path, event_number, interval, last_mtime))
-                            self.polling_tasks[file_path]['timer'] = new_timer
-                            new_timer.start()
+                    self._arm(file_path, event_number, interval, delay=interval)
                     return
             except Exception:
                 pass
 
-        print(f"    [輪詢檢查] 正在檢查 {os.path.basename(file_path)} 的變更...")
-
-        # 以 mtime/size 穩定判斷
-        try:
-            cur_mtime = os.path.getmtime(file_path)
-        except Exception:
-            cur_mtime = last_mtime
-        try:
-            cur_size = os.path.getsize(file_path)
-        except Exception:
-            cur_size = self.state.get(file_path, {}).get('last_size', -1)
-
-        changed = False
-        st = self.state.get(file_path, {})
-        if st:
-            if cur_mtime != st.get('last_mtime') or cur_size != st.get('last_size'):
-                changed = True
-                st['last_mtime'] = cur_mtime
-                st['last_size'] = cur_size
-                st['stable'] = 0
-                print(f"    [輪詢] 檢測到變動，等待穩定窗口（{getattr(settings,'POLLING_STABLE_CHECKS',3)} 次）…")
-            else:
-                st['stable'] = st.get('stable', 0) + 1
-        
-        has_changes = False
-        if st and st.get('stable', 0) >= getattr(settings, 'POLLING_STABLE_CHECKS', 3):
-            from core.comparison import compare_excel_changes, set_current_event_number
-            set_current_event_number(event_number)
-            print(f"    [輪詢] 已穩定，開始比較…")
-            has_changes = compare_excel_changes(file_path, silent=False, event_number=event_number, is_polling=True)
+        st['stable'] = int(getattr(settings, 'POLLING_STABLE_CHECKS', 3))
+        from core.comparison import compare_excel_changes, set_current_event_number
+        set_current_event_number(event_number)
+        print(f"    [輪詢] {os.path.basename(file_path)} 已穩定，開始比較…")
+        has_changes = compare_excel_changes(file_path, silent=False, event_number=event_number, is_polling=True)
 
         with self.lock:
             if file_path not in self.polling_tasks:
                 return
-
-            if has_changes:
-                try:
-                    _sz_mb = os.path.getsize(file_path)/(1024*1024)
-                    _sz_str = f"{_sz_mb:.2f}MB"
-                except Exception:
-                    _sz_str = "N/A"
-                print(f"    [輪詢] 變更仍持續（事件 #{event_number}，大小 {_sz_str}），啟動冷靜期，{getattr(settings,'POLLING_COOLDOWN_SEC',20)} 秒後再次檢查。")
-                st['cooldown_until'] = time.time() + float(getattr(settings, 'POLLING_COOLDOWN_SEC', 20))
-                st['stable'] = 0
-                new_timer = threading.Timer(interval, lambda: self._poll_for_stability(file_path, event_number, interval, last_mtime))
-                self.polling_tasks[file_path]['timer'] = new_timer
-                new_timer.start()
-            else:
-                # 若尚未達穩定次數，或剛檢測到變動，繼續等待；若已穩定且無變更，結束輪詢
-                if st and st.get('stable', 0) < getattr(settings, 'POLLING_STABLE_CHECKS', 3):
-                    new_timer = threading.Timer(interval, lambda: self._poll_for_stability(file_path, event_number, interval, last_mtime))
-                    self.polling_tasks[file_path]['timer'] = new_timer
-                    new_timer.start()
-                elif changed:
-                    new_timer = threading.Timer(interval, lambda: self._poll_for_stability(file_path, event_number, interval, last_mtime))
-                    self.polling_tasks[file_path]['timer'] = new_timer
-                    new_timer.start()
-                else:
-                    print(f"    [輪詢結束] {os.path.basename(file_path)} 檔案已穩定。")
-                    self.polling_tasks.pop(file_path, None)
-                    self.state.pop(file_path, None)
+            if not has_changes:
+                print(f"    [輪詢結束] {os.path.basename(file_path)} 檔案已穩定。")
+                self.polling_tasks.pop(file_path, None)
+                self.state.pop(file_path, None)
+                return
+        try:
+            _sz_mb = os.path.getsize(file_path)/(1024*1024)
+            _sz_str = f"{_sz_mb:.2f}MB"
+        except Exception:
+            _sz_str = "N/A"
+        cooldown = float(getattr(settings, 'POLLING_COOLDOWN_SEC', 20))
+        print(f"    [輪詢] 變更仍持續（事件 #{event_number}，大小 {_sz_str}），啟動冷靜期，{cooldown:g} 秒後再次檢查。")
+        st['cooldown_until'] = time.time() + cooldown
+        st['stable'] = 0
+        self._arm(file_path, event_number, interval, delay=cooldown)
 
     def stop(self):
         """
         停止所有輪詢任務
         """
         self.stop_event.set()
+        try:
+            from utils.stability import get_stability_tracker
+            get_stability_tracker().unwatch_owner(self._OWNER)
+        except Exception:
+            pass
         with self.lock:
-            for task in self.polling_tasks.values():
-                task['timer'].cancel()
             self.polling_tasks.clear()
 
 class ExcelFileEventHandler(FileSystemEventHandler):
@@ -234,13 +187,13 @@ class ExcelFileEventHandler(FileSystemEventHandler):
         print(f"\n✨ 發現新檔案: {os.path.basename(file_path)}")
         print(f"📊 正在建立基準線...")
 
-        # 等源檔短暫穩定再建 baseline（避免剛複製完即讀取）
+        # 等源檔安靜再建 baseline（避免剛複製完即讀取）；事件驅動，安靜窗口一到即繼續
         try:
-            checks = max(1, int(getattr(settings, 'COPY_STABILITY_CHECKS', 3)))
-            interval = max(0.0, float(getattr(settings, 'COPY_STABILITY_INTERVAL_SEC', 1.0)))
+            from utils.stability import get_stability_tracker, copy_quiet_window
+            tracker = get_stability_tracker()
+            tracker.notify(file_path)
             max_wait = float(getattr(settings, 'COPY_STABILITY_MAX_WAIT_SEC', 5.0))
-            from utils.cache import _wait_for_stable_mtime as _stable
-            _ = _stable(file_path, checks, interval, max_wait)
+            _ = tracker.wait_until_stable(file_path, copy_quiet_window(), max_wait)
         except Exception:
             pass
 
@@ -325,6 +278,13 @@ class ExcelFileEventHandler(FileSystemEventHandler):
         if os.path.basename(file_path).startswith('~$'):
             return
             
+        # 餵給穩定性追蹤器（防抖動之前：每個事件都推後安靜期限）
+        try:
+            from utils.stability import get_stability_tracker
+            get_stability_tracker().notify(file_path)
+        except Exception:
+            pass
+
         # 防抖動處理
         current_time = time.time()
         if file_path in self.last_event_times:
@@ -349,18 +309,24 @@ class ExcelFileEventHandler(FileSystemEventHandler):
         if (not in_watch) and in_mononly:
             try:
                 from core.baseline import get_baseline_file_with_extension, save_baseline
-                from core.excel_parser import dump_excel_cells_with_timeout, hash_excel_content
+                from core.excel_parser import dump_excel_cells_with_timeout
                 from utils.helpers import _baseline_key_for_path, get_file_mtime
                 base_key = _baseline_key_for_path(file_path)
                 baseline_exists = bool(get_baseline_file_with_extension(base_key))
                 if not baseline_exists:
                     mtime = get_file_mtime(file_path)
                     print(f"    [MONITOR-ONLY] {file_path}\n       - 最後修改時間: {mtime}\n       - 最後儲存者: {last_author}")
-                    cur = dump_excel_cells_with_timeout(file_path)
+                    dump_info = {}
+                    cur = dump_excel_cells_with_timeout(file_path, dump_info=dump_info)
+                    part_fp = dump_info.get('part_fingerprints')
                     if cur:
+                        from utils.content_tree import build_content_tree
+                        tree = build_content_tree(cur)
                         bdata = {
                             "last_author": last_author,
-                            "content_hash": hash_excel_content(cur),
+                            "content_hash": tree['root'],
+                            "content_tree": tree,
+                            "part_fingerprints": part_fp,
                             "cells": cur,
                             "timestamp": datetime.now().isoformat()
                         }
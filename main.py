@@ -240,6 +240,13 @@ def main():
     # 🔥 合併手動目標和掃描結果
     total_files = list(set(all_files + manual_files))
     
+    # 本地快取對帳與容量逐出（移除已改名 / 移走檔案的舊副本）
+    try:
+        from utils.cache_manager import reconcile_cache_on_startup
+        reconcile_cache_on_startup()
+    except Exception as e:
+        print(f"   ⚠️ 快取對帳失敗: {e}")
+
     # 建立基準線
     if total_files:
         print(f"\n📊 總共需要處理 {len(total_files)} 個檔案")
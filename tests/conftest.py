@@ -0,0 +1,25 @@
+"""
+測試共用設定：專案根目錄加入 sys.path；每個測試的 LOG_FOLDER / CACHE_FOLDER / 歷史快照路徑指向暫存資料夾，
+避免在專案內（excel_git_repo 等）留下檔案
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import config.settings as settings  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_settings(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'LOG_FOLDER', str(tmp_path / 'log'))
+    monkeypatch.setattr(settings, 'CACHE_FOLDER', str(tmp_path / 'cache'))
+    monkeypatch.setattr(settings, 'HISTORY_GIT_REPO_PATH', str(tmp_path / 'excel_git_repo'))
+    monkeypatch.setattr(settings, 'EVENTS_SQLITE_PATH', str(tmp_path / 'log' / 'events.sqlite'))
+    os.makedirs(settings.LOG_FOLDER, exist_ok=True)
+    os.makedirs(settings.CACHE_FOLDER, exist_ok=True)
+    return tmp_path
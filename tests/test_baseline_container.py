@@ -0,0 +1,58 @@
+import pytest
+
+from utils.baseline_container import BaselineContainerError, LazyCells, load_container, save_container
+from utils.cell_store import CompactSheet
+
+
+def _sheet(seed, rows=50):
+    return {f"{col}{r}": {"formula": f"=A{r}*2" if col == 'C' else None, "value": str(r * seed),
+                          "cached_value": str(r * seed), "external_ref": col == 'D'}
+            for r in range(1, rows + 1) for col in 'ABCD'}
+
+
+@pytest.fixture
+def baseline_data():
+    return {'last_author': 'tester', 'content_hash': 'h', 'source_size': 123,
+            'cells': {'S1': _sheet(1), 'S2': _sheet(2), 'Empty': {}}}
+
+
+def test_round_trip_is_lazy_and_equal(tmp_path, baseline_data):
+    path = save_container(str(tmp_path / 'k.baseline.seg'), baseline_data, codec='gzip')
+    data = load_container(path)
+    assert data['last_author'] == 'tester'
+    assert data['source_size'] == 123
+    cells = data['cells']
+    assert isinstance(cells, LazyCells)
+    assert list(cells) == ['S1', 'S2', 'Empty']
+    assert cells.cell_count('S2') == len(baseline_data['cells']['S2'])
+    assert not cells.is_loaded('S1')
+    assert cells['S1'] == baseline_data['cells']['S1']
+    assert isinstance(cells['S1'], CompactSheet)
+    assert cells.is_loaded('S1') and not cells.is_loaded('S2')
+    assert cells == baseline_data['cells']
+
+
+def test_overlay_rewrite_reuses_segments(tmp_path, baseline_data):
+    path = str(tmp_path / 'k.baseline.seg')
+    save_container(path, baseline_data, codec='gzip')
+    cells = load_container(path)['cells']
+    new_s2 = _sheet(7)
+    merged = cells.overlay({'S2': new_s2}, ['S2', 'S1'])
+    assert list(merged) == ['S2', 'S1']
+    assert merged.reusable_segment('S1', 'gzip') is not None
+    assert merged.reusable_segment('S2', 'gzip') is None
+
+    save_container(path, {'last_author': 'x', 'cells': merged}, codec='gzip')
+    again = load_container(path)['cells']
+    assert again == {'S2': new_s2, 'S1': baseline_data['cells']['S1']}
+    # 仍引用舊檔的讀取方在替換前已載入區段，內容不受影響
+    assert cells['S2'] == baseline_data['cells']['S2']
+
+
+def test_corrupt_file_is_rejected(tmp_path, baseline_data):
+    path = save_container(str(tmp_path / 'k.baseline.seg'), baseline_data, codec='gzip')
+    with open(path, 'r+b') as f:
+        f.seek(-8, 2)
+        f.write(b'XXXXXXXX')
+    with pytest.raises(BaselineContainerError):
+        load_container(path)
@@ -0,0 +1,87 @@
+import os
+
+import config.settings as settings
+import utils.cache as cache
+from utils import mem_cache
+from utils.cache_manager import CacheManager, get_cache_manager
+from utils.helpers import _baseline_key_for_path
+
+
+def _value_cache(cache_file, engine="polars", fp="abc"):
+    values_dir = os.path.join(os.path.dirname(cache_file), "values")
+    os.makedirs(values_dir, exist_ok=True)
+    path = os.path.join(values_dir, f"{_baseline_key_for_path(cache_file)}.{engine}.{fp}.arrow")
+    with open(path, "wb") as f:
+        f.write(b"\0" * 128)
+    return path
+
+
+def test_reconcile_keeps_value_cache_of_memory_copy(tmp_path):
+    src = tmp_path / "share" / "book.xlsx"
+    src.parent.mkdir()
+    src.write_bytes(b"PK")
+    root = settings.CACHE_FOLDER
+    mgr = CacheManager(root)
+    cache_file = os.path.join(root, cache._safe_cache_basename(str(src)))
+    mgr.record_memory(cache_file, str(src), hit=False)
+    kept = _value_cache(cache_file)
+    orphan = _value_cache(os.path.join(root, "0123456789abcdef_gone.xlsx"))
+
+    res = mgr.reconcile()
+    assert res["missing"] == 0 and res["orphan_values"] == 1
+    assert os.path.exists(kept) and not os.path.exists(orphan)
+
+    # 索引重新載入（下次啟動）後仍視為存活
+    CacheManager(root).reconcile()
+    assert os.path.exists(kept)
+
+    # 來源移走後，記憶體副本的值快取一併清除
+    src.unlink()
+    res = CacheManager(root).reconcile()
+    assert res["stale"] == 1
+    assert not os.path.exists(kept)
+
+
+def test_copy_to_cache_registers_memory_copy(monkeypatch, tmp_path):
+    src = tmp_path / "share" / "small.xlsx"
+    src.parent.mkdir()
+    src.write_bytes(b"PK" + b"\0" * 1024)
+    monkeypatch.setattr(settings, "USE_LOCAL_CACHE", True)
+    monkeypatch.setattr(settings, "IN_MEMORY_COPY_MAX_MB", 1)
+    monkeypatch.setattr(settings, "COPY_STABILITY_CHECKS", 1)
+    monkeypatch.setattr(settings, "COPY_POST_SLEEP_SEC", 0)
+
+    cache_file = cache.copy_to_cache(str(src), silent=True)
+    try:
+        assert cache_file and not os.path.exists(cache_file)
+        kept = _value_cache(cache_file)
+        get_cache_manager().reconcile()
+        assert os.path.exists(kept)
+    finally:
+        mem_cache.release(cache_file)
+
+
+def test_value_caches_count_against_size_budget(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "CACHE_MAX_SIZE_MB", 1)
+    monkeypatch.setattr(settings, "CACHE_MAX_AGE_DAYS", 0)
+    root = settings.CACHE_FOLDER
+    mgr = CacheManager(root)
+    files = []
+    for i, name in enumerate(("old.xlsx", "new.xlsx")):
+        src = tmp_path / name
+        src.write_bytes(b"PK")
+        cache_file = os.path.join(root, cache._safe_cache_basename(str(src)))
+        with open(cache_file, "wb") as f:
+            f.write(b"\0" * (100 * 1024))
+        mgr.record_store(cache_file, str(src))
+        mgr._entries[os.path.basename(cache_file)]["last_used"] = 1000 + i
+        path = _value_cache(cache_file)
+        with open(path, "wb") as f:
+            f.write(b"\0" * (600 * 1024))
+        files.append((cache_file, path))
+
+    assert mgr.total_bytes() == 1400 * 1024
+    assert mgr.enforce() == 1
+    assert not any(os.path.exists(p) for p in files[0])
+    assert all(os.path.exists(p) for p in files[1])
+    assert mgr.total_bytes() == 700 * 1024
@@ -0,0 +1,59 @@
+import json
+
+from utils.cell_store import CompactSheet, compact_cells, expand_cells, json_default
+
+
+def _cell(formula=None, value=None, cached=None, ext=False):
+    return {"formula": formula, "value": value, "cached_value": cached, "external_ref": ext}
+
+
+SHEET = {
+    "A1": _cell(value="1", cached="1"),
+    "B1": _cell(formula="=A1+1", value="2", cached="2"),
+    "C1": _cell(formula="=A1+1", value=None, cached=None),
+    "AA10": _cell(formula="='[1]Sheet1'!A1", value="x", cached=None, ext=True),
+    "B2": _cell(value="3", cached=3.0),
+    "Z100": _cell(value=True, cached=True),
+    "XFD1048576": _cell(value="end", cached="end"),
+}
+
+
+def test_compact_sheet_matches_dict():
+    ws = CompactSheet.from_dict(SHEET)
+    assert ws is not None
+    assert len(ws) == len(SHEET)
+    assert set(ws) == set(SHEET)
+    for addr, cell in SHEET.items():
+        assert addr in ws
+        assert ws[addr] == cell
+        assert ws.get(addr) == cell
+    assert ws == SHEET
+    assert ws.to_dict() == SHEET
+    assert "A3" not in ws
+    assert ws.get("A3") is None
+
+
+def test_formula_table_is_deduplicated():
+    ws = CompactSheet.from_dict(SHEET)
+    assert len(ws._ftable) == 2
+
+
+def test_rows_between():
+    ws = CompactSheet.from_dict(SHEET)
+    assert ws.rows_between(1, 2) == {k: SHEET[k] for k in ("A1", "B1", "C1", "B2")}
+
+
+def test_non_standard_sheet_is_kept_as_dict():
+    odd = {"A1": {"formula": None, "value": "1"}}
+    assert CompactSheet.from_dict(odd) is None
+    assert CompactSheet.from_dict({"not-an-address": _cell(value="1", cached="1")}) is None
+    cells = compact_cells({"ok": SHEET, "odd": odd})
+    assert isinstance(cells["ok"], CompactSheet)
+    assert cells["odd"] is odd
+
+
+def test_json_output_matches_dict_format():
+    cells = {"S1": SHEET}
+    compact = compact_cells(cells)
+    assert json.dumps(compact, sort_keys=True, default=json_default) == json.dumps(cells, sort_keys=True)
+    assert expand_cells(compact) == cells
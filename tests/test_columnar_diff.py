@@ -0,0 +1,69 @@
+import pytest
+
+pl = pytest.importorskip("polars")
+
+import config.settings as settings
+import utils.columnar as columnar
+from core.comparison import analyze_meaningful_changes
+from utils.cell_store import CompactSheet
+from utils.content_tree import build_content_tree, diff_trees
+
+
+def _cell(value):
+    return {"formula": None, "value": value, "cached_value": value, "external_ref": False}
+
+
+def _sheet(n_rows, overrides=None):
+    ws = {}
+    for r in range(1, n_rows + 1):
+        for c in "ABCD":
+            ws[f"{c}{r}"] = _cell(f"{c}{r}")
+    ws.update(overrides or {})
+    return ws
+
+
+def test_block_restricted_diff_uses_columnar_join(monkeypatch):
+    monkeypatch.setattr(settings, "COLUMNAR_DIFF_MIN_CELLS", 1000)
+    old_dict = _sheet(2000)
+    new_dict = _sheet(2000, {"B10": _cell("changed"), "C1500": _cell("changed"), "E1999": _cell("new")})
+    old_ws = CompactSheet.from_dict(old_dict)
+    new_ws = CompactSheet.from_dict(new_dict)
+    assert len(old_ws) >= settings.COLUMNAR_DIFF_MIN_CELLS
+
+    old_tree = build_content_tree({"S": old_ws})
+    new_tree = build_content_tree({"S": new_ws})
+    blocks = diff_trees(old_tree, new_tree)["S"]
+    assert blocks and len(blocks) < 2000 // 256 + 1
+
+    calls = []
+    real = columnar.changed_addresses
+
+    def spy(a, b, *args, **kwargs):
+        out = real(a, b, *args, **kwargs)
+        calls.append(out)
+        return out
+
+    monkeypatch.setattr(columnar, "changed_addresses", spy)
+    changes = analyze_meaningful_changes(old_ws, new_ws, blocks=blocks)
+
+    assert calls and calls[0] == ["B10", "C1500", "E1999"]
+    assert sorted(c["address"] for c in changes) == ["B10", "C1500", "E1999"]
+    # 與逐格比較結果一致
+    expected = analyze_meaningful_changes(old_dict, new_dict)
+    assert sorted(c["address"] for c in changes) == sorted(c["address"] for c in expected)
+
+
+def test_changed_addresses_filters_by_block():
+    old_ws = CompactSheet.from_dict(_sheet(600))
+    new_ws = CompactSheet.from_dict(_sheet(600, {"A1": _cell("x"), "A300": _cell("y")}))
+    assert columnar.changed_addresses(old_ws, new_ws) == ["A1", "A300"]
+    assert columnar.changed_addresses(old_ws, new_ws, blocks={1}) == ["A300"]
+    assert columnar.changed_addresses(old_ws, new_ws, blocks=set()) == []
+
+
+def test_dict_sheets_fall_back_to_block_restriction(monkeypatch):
+    monkeypatch.setattr(settings, "COLUMNAR_DIFF_MIN_CELLS", 10)
+    old_dict = _sheet(600)
+    new_dict = _sheet(600, {"A1": _cell("x"), "A300": _cell("y")})
+    changes = analyze_meaningful_changes(old_dict, new_dict, blocks={1})
+    assert [c["address"] for c in changes] == ["A300"]
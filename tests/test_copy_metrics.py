@@ -0,0 +1,65 @@
+import csv
+import os
+import time
+
+import config.settings as settings
+import utils.cache as cache
+import utils.copy_metrics as copy_metrics
+from utils import mem_cache
+from utils.copy_metrics import CopyMetrics, SUCCESS_HEADER
+
+
+def _ops_dir():
+    return os.path.join(settings.LOG_FOLDER, 'ops_log')
+
+
+def test_timer_flushes_without_further_copies(monkeypatch):
+    monkeypatch.setattr(settings, 'ENABLE_OPS_LOG', True)
+    monkeypatch.setattr(settings, 'COPY_METRICS_FLUSH_SEC', 1)
+    m = CopyMetrics()
+    m.record_success(r'\\srv\share\a.xlsx', 0.3, 1, 'python', 0, size_bytes=1024)
+    m.start_timer()
+    path = os.path.join(_ops_dir(), f'copy_success_{m.day}.csv')
+    deadline = time.time() + 5
+    while not os.path.exists(path) and time.time() < deadline:
+        time.sleep(0.05)
+    assert os.path.exists(path)
+    assert os.path.exists(os.path.join(_ops_dir(), f'copy_metrics_{m.day}.json'))
+
+
+def test_success_rows_keep_existing_csv_columns(monkeypatch):
+    monkeypatch.setattr(settings, 'ENABLE_OPS_LOG', True)
+    m = CopyMetrics()
+    os.makedirs(_ops_dir(), exist_ok=True)
+    path = os.path.join(_ops_dir(), f'copy_success_{m.day}.csv')
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        csv.writer(f).writerow(SUCCESS_HEADER)
+    m.record_success(r'\\srv\share\a.xlsx', 0.3, 1, 'delta', 0, size_bytes=4 << 20, bytes_transferred=1 << 20)
+    m.flush()
+    with open(path, encoding='utf-8', newline='') as f:
+        rows = list(csv.reader(f))
+    assert len(rows) == 2 and len(rows[1]) == len(rows[0]) == 11
+    assert m.snapshot()['by_engine']['delta']['transferred'] == 1 << 20
+
+
+def test_failure_is_filed_under_attempted_engine(monkeypatch, tmp_path):
+    src = tmp_path / 'share' / 'small.xlsx'
+    src.parent.mkdir()
+    src.write_bytes(b'PK' + b'\0' * 1024)
+    m = CopyMetrics()
+    monkeypatch.setattr(copy_metrics, '_metrics', m)
+    monkeypatch.setattr(settings, 'USE_LOCAL_CACHE', True)
+    monkeypatch.setattr(settings, 'COPY_ENGINE', 'python')
+    monkeypatch.setattr(settings, 'IN_MEMORY_COPY_MAX_MB', 1)
+    monkeypatch.setattr(settings, 'COPY_STABILITY_CHECKS', 1)
+    monkeypatch.setattr(settings, 'COPY_RETRY_COUNT', 1)
+    monkeypatch.setattr(settings, 'STRICT_NO_ORIGINAL_READ', True)
+
+    def boom(*a, **k):
+        raise OSError('source changed while reading')
+
+    monkeypatch.setattr(mem_cache, 'read_source', boom)
+    assert cache.copy_to_cache(str(src), silent=True) is None
+    by_engine = m.snapshot()['by_engine']
+    assert by_engine['memory']['failures'] == 1
+    assert 'python' not in by_engine
@@ -0,0 +1,38 @@
+import config.settings as settings
+import utils.cache as cache
+
+
+def _setup(monkeypatch, tmp_path, wait_result):
+    src = tmp_path / "src" / "book.xlsx"
+    src.parent.mkdir()
+    src.write_bytes(b"PK" + b"\0" * 64)
+    monkeypatch.setattr(settings, "USE_LOCAL_CACHE", True)
+    monkeypatch.setattr(settings, "COPY_RETRY_COUNT", 3)
+    monkeypatch.setattr(settings, "COPY_RETRY_BACKOFF_SEC", 0.5)
+    monkeypatch.setattr(settings, "COPY_STABILITY_CHECKS", 2)
+    monkeypatch.setattr(settings, "COPY_STABILITY_MAX_WAIT_SEC", 3.0)
+    monkeypatch.setattr(settings, "STRICT_NO_ORIGINAL_READ", True)
+    monkeypatch.setattr(cache, "_wait_for_stable_mtime", wait_result)
+    sleeps = []
+    monkeypatch.setattr(cache.time, "sleep", lambda s: sleeps.append(s))
+    return str(src), sleeps
+
+
+def test_early_stability_failure_keeps_backoff(monkeypatch, tmp_path):
+    # stat 暫時失敗：追蹤器立即返回 False，仍須按次數退避
+    src, sleeps = _setup(monkeypatch, tmp_path, lambda *a: False)
+    assert cache.copy_to_cache(src, silent=True) is None
+    assert sleeps == [0.5, 1.0, 1.5]
+
+
+def test_full_stability_wait_skips_backoff(monkeypatch, tmp_path):
+    clock = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: clock[0])
+
+    def waited_out(*a):
+        clock[0] += settings.COPY_STABILITY_MAX_WAIT_SEC
+        return False
+
+    src, sleeps = _setup(monkeypatch, tmp_path, waited_out)
+    assert cache.copy_to_cache(src, silent=True) is None
+    assert sleeps == []
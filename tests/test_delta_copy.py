@@ -0,0 +1,58 @@
+import os
+import random
+import shutil
+import zipfile
+
+import pytest
+
+import config.settings as settings
+from utils.delta_copy import delta_copy
+
+
+def _payload(seed, size=200 * 1024):
+    # 不可壓縮的內容：member 大於合併讀取門檻，才會被重用
+    return random.Random(seed).randbytes(size)
+
+
+def _write_zip(path, members):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zw:
+        for name, data in members.items():
+            zw.writestr(zipfile.ZipInfo(name, date_time=(2025, 1, 1, 0, 0, 0)), data, zipfile.ZIP_DEFLATED)
+
+
+@pytest.fixture(autouse=True)
+def no_min_size(monkeypatch):
+    monkeypatch.setattr(settings, 'DELTA_COPY_MIN_SIZE_MB', 0)
+
+
+def test_delta_copy_is_byte_identical(tmp_path):
+    src, dst = str(tmp_path / 'src.xlsx'), str(tmp_path / 'cache.xlsx')
+    members = {f'xl/worksheets/sheet{i}.xml': _payload(i) for i in range(1, 6)}
+    members['xl/workbook.xml'] = b'<workbook/>'
+    _write_zip(src, members)
+    shutil.copyfile(src, dst)
+
+    members['xl/worksheets/sheet3.xml'] = _payload(99, size=150 * 1024)
+    members['xl/worksheets/sheet6.xml'] = _payload(6)
+    _write_zip(src, members)
+
+    stats = delta_copy(src, dst)
+    assert stats['mode'] == 'delta'
+    assert stats['reused_members'] >= 4
+    assert stats['bytes_transferred'] < stats['bytes_total']
+    assert (tmp_path / 'src.xlsx').read_bytes() == (tmp_path / 'cache.xlsx').read_bytes()
+    assert not [n for n in os.listdir(tmp_path) if n.endswith('.tmp')]
+
+
+def test_full_copy_without_old_copy_or_zip(tmp_path):
+    src, dst = str(tmp_path / 'src.xlsx'), str(tmp_path / 'cache.xlsx')
+    _write_zip(src, {'a.xml': _payload(1)})
+    assert delta_copy(src, dst)['mode'] == 'full'
+    assert (tmp_path / 'src.xlsx').read_bytes() == (tmp_path / 'cache.xlsx').read_bytes()
+
+    plain = tmp_path / 'plain.bin'
+    plain.write_bytes(_payload(2))
+    with open(dst, 'wb') as f:
+        f.write(b'not a zip')
+    assert delta_copy(str(plain), dst)['mode'] == 'full'
+    assert plain.read_bytes() == (tmp_path / 'cache.xlsx').read_bytes()
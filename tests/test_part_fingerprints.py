@@ -0,0 +1,42 @@
+import openpyxl
+
+import config.settings as settings
+from core.excel_parser import changed_sheets_by_fingerprint, get_part_fingerprints
+
+
+def _local_cache(monkeypatch):
+    monkeypatch.setattr(settings, 'USE_LOCAL_CACHE', True)
+    monkeypatch.setattr(settings, 'COPY_STABILITY_CHECKS', 1)
+    monkeypatch.setattr(settings, 'COPY_POST_SLEEP_SEC', 0)
+
+
+def _book(path, value):
+    wb = openpyxl.Workbook()
+    wb.active.title = 'A'
+    wb['A']['A1'] = 1
+    wb.create_sheet('B')['A1'] = value
+    wb.save(path)
+    return str(path)
+
+
+def test_only_changed_sheet_is_reparsed(tmp_path, monkeypatch):
+    _local_cache(monkeypatch)
+    old = get_part_fingerprints(_book(tmp_path / 'a.xlsx', 2))
+    new = get_part_fingerprints(_book(tmp_path / 'b.xlsx', 3))
+    assert old['engine'] == new['engine']
+    assert changed_sheets_by_fingerprint(old, new) == {'B'}
+
+
+def test_engine_settings_change_forces_full_parse(tmp_path, monkeypatch):
+    _local_cache(monkeypatch)
+    path = _book(tmp_path / 'a.xlsx', 2)
+    old = get_part_fingerprints(path)
+    assert changed_sheets_by_fingerprint(old, get_part_fingerprints(path)) == set()
+    for key, value in (('VALUE_ENGINE', 'pandas'), ('FORMULA_ENGINE', 'xml'),
+                       ('ENABLE_FORMULA_VALUE_CHECK', not settings.ENABLE_FORMULA_VALUE_CHECK)):
+        with monkeypatch.context() as m:
+            m.setattr(settings, key, value)
+            assert changed_sheets_by_fingerprint(old, get_part_fingerprints(path)) is None
+    # 舊指紋未記錄解析設定：完整重讀一次
+    legacy = {k: v for k, v in old.items() if k != 'engine'}
+    assert changed_sheets_by_fingerprint(legacy, get_part_fingerprints(path)) is None
@@ -0,0 +1,56 @@
+import zipfile
+
+import pytest
+
+from utils.value_engines.shared_strings import SST_PART, SharedStringTable
+from utils.value_engines.stream_reader import _load_shared_strings_eager
+
+NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+
+ITEMS = [
+    '<si><t>plain</t></si>',
+    '<si><t xml:space="preserve">  spaced  </t></si>',
+    '<si><t>a &amp; b &lt;c&gt; &#20013;</t></si>',
+    '<si><r><rPr><b/></rPr><t>rich </t></r><r><t>text</t></r></si>',
+    '<si><t/></si>',
+    '<si><t>line1\r\nline2</t></si>',
+    '<si><t><![CDATA[x < y & z]]></t></si>',
+    '<si><t>中文字串</t></si>',
+]
+
+
+@pytest.fixture
+def sst_zip(tmp_path):
+    body = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            f'<sst xmlns="{NS}" count="{len(ITEMS) * 50}">' + ''.join(ITEMS * 50) + '</sst>')
+    path = tmp_path / 'sst.zip'
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zw:
+        zw.writestr(SST_PART, body.encode('utf-8'))
+    return str(path)
+
+
+@pytest.mark.parametrize('spill_mb', [0, 1e-6])
+def test_indexed_table_matches_eager_parse(sst_zip, spill_mb):
+    with zipfile.ZipFile(sst_zip) as z:
+        eager = _load_shared_strings_eager(z)
+        table = SharedStringTable.from_zip(z, maxsize=3, spill_mb=spill_mb)
+    try:
+        assert table.spilled == bool(spill_mb)
+        assert len(table) == len(eager)
+        # 亂序重複讀取，令小容量 LRU 反覆逐出與命中
+        order = list(range(len(eager))) + list(range(len(eager) - 1, -1, -1))
+        assert [table[i] for i in order] == [eager[i] for i in order]
+        assert list(table) == eager
+        assert table[-1] == eager[-1]
+        assert len(table._cache) <= 3
+        assert table.hits > 0
+    finally:
+        table.close()
+
+
+def test_missing_part_returns_none(tmp_path):
+    path = tmp_path / 'empty.zip'
+    with zipfile.ZipFile(path, 'w') as zw:
+        zw.writestr('xl/workbook.xml', '<workbook/>')
+    with zipfile.ZipFile(path) as z:
+        assert SharedStringTable.from_zip(z, maxsize=10, spill_mb=0) is None
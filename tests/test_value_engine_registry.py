@@ -0,0 +1,67 @@
+import os
+import zipfile
+
+import pytest
+
+import utils.value_engines.registry as registry
+
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(registry, '_stats_cache', None)
+    monkeypatch.setattr(registry, '_dirty', False)
+    yield
+    registry._stats_cache = None
+    registry._dirty = False
+
+
+def _xlsx(path):
+    """最小工作簿：兩張表，各有一個數值儲存格"""
+    files = {
+        '[Content_Types].xml': '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types"/>',
+        'xl/workbook.xml': (
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+            '<sheet name="A" sheetId="1" r:id="rId1"/><sheet name="B" sheetId="2" r:id="rId2"/></sheets></workbook>'),
+        'xl/_rels/workbook.xml.rels': (
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+            '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet2.xml"/>'
+            '</Relationships>'),
+    }
+    for i in (1, 2):
+        files[f'xl/worksheets/sheet{i}.xml'] = (
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            f'<row r="1"><c r="A1"><v>{i}</v></c></row></sheetData></worksheet>')
+    with zipfile.ZipFile(path, 'w') as z:
+        for name, data in files.items():
+            z.writestr(name, data)
+    return str(path)
+
+
+def test_record_run_does_not_write_until_flush(tmp_path):
+    book = _xlsx(tmp_path / 'book.xlsx')
+    registry.record_run(book, 'xml', 0.1, ok=True)
+    assert not os.path.exists(registry._stats_path())
+    registry.flush_stats()
+    assert os.path.exists(registry._stats_path())
+    registry._stats_cache = None
+    key = registry.file_key(book)[0]
+    assert registry._load_stats()['files'][key]['engines']['xml']['runs'] == 1
+
+
+def test_partial_trial_does_not_pin(tmp_path, monkeypatch):
+    monkeypatch.setattr(registry, 'available_engines', lambda: ['xml', 'polars_xml'])
+    book = _xlsx(tmp_path / 'book.xlsx')
+    engine, values = registry.trial_engines(book, silent=True, sheets={'B'})
+    assert engine in ('xml', 'polars_xml')
+    assert list(values) == ['B']
+    assert registry.file_key(book)[0] not in registry._load_stats()['files']
+
+    chosen, _ = registry.resolve_auto_engine(book, allow_trial=False)
+    assert chosen is not None
+    chosen, _ = registry.resolve_auto_engine(book)
+    assert chosen is None
+
+    engine, _ = registry.trial_engines(book, silent=True)
+    assert registry._load_stats()['files'][registry.file_key(book)[0]]['pinned'] == engine
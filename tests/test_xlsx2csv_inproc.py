@@ -0,0 +1,43 @@
+import pytest
+
+pytest.importorskip('xlsx2csv')
+from openpyxl import Workbook  # noqa: E402
+
+from utils.value_engines.xlsx2csv_inproc import (  # noqa: E402
+    xlsx_to_csv_bytes,
+    xlsx_to_csv_bytes_inproc,
+    xlsx_to_csv_bytes_subprocess,
+)
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = tmp_path / 'wb.xlsx'
+    wb = Workbook()
+    wb.remove(wb.active)
+    for si in range(3):
+        ws = wb.create_sheet(f"S{si + 1}")
+        for r in range(1, 31):
+            ws.append([r * c if c % 3 else f"t,{r % 7}" for c in range(1, 7)])
+        ws['H2'] = 'sparse "quoted"'
+    wb.save(path)
+    return str(path)
+
+
+def _norm(sheets):
+    return [v.replace(b'\r\n', b'\n') for v in sheets.values()]
+
+
+def test_inproc_matches_subprocess(workbook):
+    a = xlsx_to_csv_bytes_inproc(workbook, tag='test')
+    b = xlsx_to_csv_bytes_subprocess(workbook, sheet_count=3, tag='test')
+    assert list(a) == ['S1', 'S2', 'S3']
+    # 子進程模式在 --list-sheets 不可用時以 sheetN 命名，故依順序比對內容
+    assert _norm(a) == _norm(b)
+
+
+def test_sheet_subset(workbook):
+    full = xlsx_to_csv_bytes(workbook, tag='test')
+    part = xlsx_to_csv_bytes(workbook, tag='test', sheets={'S2'})
+    assert list(part) == ['S2']
+    assert part['S2'] == full['S2']
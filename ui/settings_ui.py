@@ -268,17 +268,29 @@ PARAMS_SPEC = [
 
     {
         'key': 'VALUE_ENGINE',
-        'label': '值讀取引擎（polars/polars_xml/xml/pandas）',
-        'help': 'polars：以 xlsx2csv+Polars 快速讀取各格結果值（預設；需安裝 polars/xlsx2csv）。xml：直接解析 .xlsx 的 XML 結構以取 cached 值。若未安裝 polars/xlsx2csv，會自動回退 xml。',
+        'label': '值讀取引擎（auto/polars/polars_xml/xml/pandas）',
+        'help': 'polars：以 xlsx2csv+Polars 快速讀取各格結果值（預設；需安裝 polars/xlsx2csv）。xml：直接解析 .xlsx 的 XML 結構以取 cached 值。若未安裝 polars/xlsx2csv，會自動回退 xml。auto：依每本工作簿的實測耗時與失敗次數自動選擇最快且有效的引擎。注意：只在公式讀取引擎為 openpyxl 時生效；公式讀取引擎為 xml 時由串流引擎直接讀取 cached 值，此設定（包括 auto）不會使用。',
         'type': 'choice',
-        'choices': ['polars','polars_xml','xml','pandas']
+        'choices': ['auto','polars','polars_xml','xml','pandas']
+    },
+    {
+        'key': 'VALUE_ENGINE_AUTO_TRIAL',
+        'label': 'auto 引擎：首次試跑各引擎',
+        'help': '值讀取引擎為 auto 時，每本工作簿（每個檔案大小級距）第一次遇到會逐一試跑可用的引擎，記錄耗時與失敗次數後固定最快且有效的一個，之後一直沿用以免不同引擎的值表示方式造成假差異。關閉則依同大小級距檔案的歷史統計直接選擇。',
+        'type': 'bool',
+    },
+    {
+        'key': 'VALUE_ENGINE_MAX_FAILURES',
+        'label': 'auto 引擎：連續失敗幾次後改選',
+        'help': '已固定的引擎連續失敗（例外或讀不到任何值）達此次數後，改用統計上次快且有效的引擎。',
+        'type': 'int',
     },
     {
         'key': 'FORMULA_ENGINE',
         'label': '公式讀取引擎（openpyxl/xml）',
-        'help': '目前預設 openpyxl 讀取公式；未來可提供 xml 讀公式以進一步提速。',
+        'help': 'openpyxl（預設）：公式由 openpyxl 讀取、值由「值讀取引擎」提供。xml：以串流方式單次讀取每張工作表，同時取得公式與 cached 值（不需 openpyxl + 值引擎 + Phase 2 多次解析，大檔明顯較快；失敗會自動回退 openpyxl）。注意：xml 模式不使用「值讀取引擎」設定，值的表示方式固定與 polars_xml 相同。',
         'type': 'choice',
-        'choices': ['openpyxl']
+        'choices': ['openpyxl','xml']
     },
     {
         'key': 'CSV_PERSIST',
@@ -286,10 +298,64 @@ PARAMS_SPEC = [
         'help': '預設 False 使用記憶體 BytesIO，不落地 CSV；打開後會將每個 worksheet 的 CSV 落到快取資料夾以利除錯，請注意空間使用。',
         'type': 'bool',
     },
+    {
+        'key': 'VALUE_CACHE_ENABLED',
+        'label': '值快取（Arrow IPC）',
+        'help': '值讀取引擎的結果以 Arrow IPC（Feather）格式存於快取資料夾 values/ 下，並以檔案內容指紋（zip 目錄 CRC）為鍵；檔案內容未變時下次比較直接以 mmap 載入，毋須再解析。檔案亦可由 pyarrow / pandas / DuckDB 等工具直接讀取。',
+        'type': 'bool',
+    },
+    {
+        'key': 'XLSX2CSV_INPROCESS',
+        'label': 'xlsx2csv 進程內轉換（polars/pandas 模式）',
+        'help': '在本進程內以單一 zip session 轉換所有工作表，毋須每張表啟動一個 python -m xlsx2csv 子進程；失敗時自動回退子進程模式。',
+        'type': 'bool',
+    },
+    {
+        'key': 'XML_VALUE_STREAMING',
+        'label': 'XML 值引擎串流讀取（xml/polars_xml）',
+        'help': '以 iterparse 逐列讀取 worksheet 與 sharedStrings，處理完即釋放，不需把整張表解壓後的內容與元素樹放進記憶體；超大工作表可避免超出記憶體上限。關閉則使用舊有整表解析。',
+        'type': 'bool',
+    },
+    {
+        'key': 'SHARED_STRINGS_LRU_SIZE',
+        'label': 'Shared strings 解碼快取容量',
+        'help': 'sharedStrings.xml 首次只記錄每個字串的位置，儲存格引用時才解碼；此為已解碼字串的 LRU 容量（0 表示不快取）。字串數以百萬計而實際引用較少的檔案，可大幅節省記憶體與解析時間。',
+        'type': 'int',
+    },
+    {
+        'key': 'SHARED_STRINGS_SPILL_MB',
+        'label': 'Shared strings 改用 mmap 的門檻（MB）',
+        'help': '解壓後的 sharedStrings.xml 達此大小時寫入暫存檔並以 mmap 讀取，只有實際讀到的頁面佔用記憶體；0 表示一律放在記憶體。',
+        'type': 'int',
+    },
     {
         'key': 'MAX_SHEET_WORKERS',
         'label': '最大並發 Sheet 讀取數',
-        'help': '允許同時處理多個 worksheet 的數目（建議 4 或 CPU 核心數）。併發可顯著縮短大型檔案讀取時間。',
+        'help': '允許同時處理多個 worksheet 的數目（建議 4 或 CPU 核心數）。公式讀取引擎為 xml 時，會以多進程每個 worker 解析一張工作表再合併，可顯著縮短大型多工作表檔案的讀取時間。',
+        'type': 'int',
+    },
+    {
+        'key': 'COMPACT_CELL_STORE',
+        'label': '儲存格緊湊儲存（節省記憶體）',
+        'help': '讀取結果與載入的基準線改以緊湊格式保存（整數位址、平行陣列、相同公式只存一次），大型工作簿記憶體可減少數倍；基準線與歷史快照的檔案格式不變。如遇相容問題可關閉。',
+        'type': 'bool',
+    },
+    {
+        'key': 'COLUMNAR_DIFF_MIN_CELLS',
+        'label': '欄式差異比較門檻（儲存格數）',
+        'help': '工作表有資料的儲存格數達此數量時，改以 Polars 欄式 join 一次找出有差異的位址，再只對這些位址分類變更類型；0 表示停用（一律逐格比較）。需安裝 polars。',
+        'type': 'int',
+    },
+    {
+        'key': 'FORMULA_MEMO_SIZE',
+        'label': '公式美化快取容量（每本工作簿）',
+        'help': '相同的公式文字（下拉填充、絕對參照）只做一次外部參照路徑還原與判斷，其餘直接重用結果；超過容量時淘汰最久未用的項目。0 表示停用。',
+        'type': 'int',
+    },
+    {
+        'key': 'PARALLEL_SHEET_MIN_SIZE_MB',
+        'label': '啟用多進程 Sheet 解析的最小檔案大小（MB）',
+        'help': '小於此大小的檔案維持單進程解析（進程池啟動與結果回傳有固定成本，小檔反而較慢）。',
         'type': 'int',
     },
     {
@@ -366,6 +432,19 @@ PARAMS_SPEC = [
         'type': 'choice',
         'choices': ['lz4','zstd','gzip']
     },
+    {
+        'key': 'BASELINE_CONTAINER',
+        'label': '基準線容器格式',
+        'help': 'segmented：每張工作表獨立壓縮成一個區段，檔尾附索引（.baseline.seg）；載入時只讀索引，比較時只解碼實際有變更的工作表，未變更的工作表寫回時直接沿用原壓縮區段。json：整份工作簿一個壓縮 JSON（舊格式）。兩種格式皆可讀取，下次保存時轉為所選格式。',
+        'type': 'choice',
+        'choices': ['segmented','json']
+    },
+    {
+        'key': 'BASELINE_CACHE_MB',
+        'label': '基準線記憶體快取 (MB)',
+        'help': '在記憶體保存最近載入或保存過的基準線，同一檔案再次比較時毋須重新讀取與解壓；基準線檔案的修改時間或大小改變時自動失效。超過上限時逐出最久未使用的基準線。0 = 停用。',
+        'type': 'int',
+    },
     {
         'key': 'LZ4_COMPRESSION_LEVEL',
         'label': 'LZ4 壓縮等級 (0-16)',
@@ -530,6 +609,24 @@ PARAMS_SPEC = [
         'help': '忽略 CACHE_FOLDER 內所有檔案事件，避免快取本身引起的監控噪音（建議啟用）。',
         'type': 'bool',
     },
+    {
+        'key': 'CACHE_MAX_SIZE_MB',
+        'label': '快取容量上限 (MB)',
+        'help': 'CACHE_FOLDER 內工作簿副本的總大小上限；超出時逐出最久未使用的副本（正在解析的副本不會被逐出）。0 表示不限。',
+        'type': 'int',
+    },
+    {
+        'key': 'CACHE_MAX_AGE_DAYS',
+        'label': '快取存活期（日）',
+        'help': '副本超過此日數未被使用即刪除（連同其值快取）。0 表示不按時間逐出。',
+        'type': 'int',
+    },
+    {
+        'key': 'CACHE_RECONCILE_ON_START',
+        'label': '啟動時對帳快取',
+        'help': '啟動時以磁碟實況重建快取索引，刪除來源已改名 / 移走的副本及孤立的值快取，再按容量上限逐出。',
+        'type': 'bool',
+    },
     {
         'key': 'COPY_RETRY_COUNT',
         'label': '複製重試次數',
@@ -548,6 +645,24 @@ PARAMS_SPEC = [
         'help': '以較小區塊逐段讀寫來源檔，可降低一次性長時間把持來源句柄的風險。0 表示關閉。',
         'type': 'int',
     },
+    {
+        'key': 'STABILITY_SAMPLE_SEC',
+        'label': '穩定性取樣間隔（秒）',
+        'help': '穩定性追蹤器對「正在等待穩定」的檔案做 stat 的間隔（可輸入小數）。檔案事件會即時推後安靜期限，安靜窗口（COPY_STABILITY_CHECKS-1）× COPY_STABILITY_INTERVAL_SEC 一到即開始複製，不再固定 sleep；早已穩定的檔案不需等待。',
+        'type': 'text',
+    },
+    {
+        'key': 'IN_MEMORY_COPY_MAX_MB',
+        'label': '記憶體副本門檻 (MB)',
+        'help': '來源檔不大於此大小時，只從網絡讀取一次到記憶體，之後 openpyxl、值引擎、外部參照、作者讀取等全部解析同一份記憶體 zip，不寫快取檔、也不需複製後等待。超過門檻仍寫入快取檔。0 表示停用。',
+        'type': 'int',
+    },
+    {
+        'key': 'IN_MEMORY_COPY_TOTAL_MB',
+        'label': '記憶體副本總量上限 (MB)',
+        'help': '所有記憶體副本合計的上限，超出時釋放最久未使用者（正在解析的檔案除外）。',
+        'type': 'int',
+    },
     {
         'key': 'COPY_POST_SLEEP_SEC',
         'label': '複製完成後短暫等待（秒）',
@@ -585,6 +700,12 @@ PARAMS_SPEC = [
         'help': '快速跳過時允許的修改時間容差（秒，可輸入小數）。',
         'type': 'text',
     },
+    {
+        'key': 'ENABLE_PART_FINGERPRINTS',
+        'label': '以工作表指紋只重讀有變更的工作表',
+        'help': '基準線會記錄 xlsx 內每張工作表、sharedStrings 及 externalLinks 的 CRC32 與大小。比較時若全部相同即直接判定無變更；否則只重讀指紋有變的工作表，其餘沿用基準線內容。sharedStrings 或外部連結有變時仍會完整重讀。',
+        'type': 'bool',
+    },
     {
         'key': 'SKIP_WHEN_TEMP_LOCK_PRESENT',
         'label': '偵測暫存鎖檔 (~$) 時延後觸碰',
@@ -594,10 +715,40 @@ PARAMS_SPEC = [
     # Phase 2：複製引擎
     {
         'key': 'COPY_ENGINE',
-        'label': '複製引擎（Windows）',
-        'help': '選擇複製檔案所使用的引擎：python（內建）、powershell（Copy-Item）、robocopy（穩定、對網路良好）。',
+        'label': '複製引擎',
+        'help': '選擇複製檔案所使用的引擎：python（內建）、powershell（Copy-Item）、robocopy（穩定、對網路良好）、delta（增量：與現有快取副本比對 zip part 的 CRC，只從來源讀取有變更的 part，適合慢速網絡上的大型工作簿）、kernel（Linux：以 copy_file_range / sendfile 在核心內複製，不經 Python 緩衝區，適合以 CIFS 掛載共享的監控主機）。ops_log 的 Engine 欄會記錄實際使用的方法。',
         'type': 'choice',
-        'choices': ['python','powershell','robocopy']
+        'choices': ['python','powershell','robocopy','delta','kernel']
+    },
+    {
+        'key': 'DELTA_COPY_MIN_SIZE_MB',
+        'label': '增量複製最小檔案 (MB)',
+        'help': 'COPY_ENGINE=delta 時，小於此大小的檔案直接完整複製。0 表示一律嘗試增量。',
+        'type': 'int',
+    },
+    {
+        'key': 'COPY_MAX_WORKERS',
+        'label': '背景複製工作執行緒數',
+        'help': '複製排程器的工作執行緒數（基準線預取等背景複製使用）。實際同時讀取同一共享的數量另受「每個共享並行複製上限」限制。',
+        'type': 'int',
+    },
+    {
+        'key': 'COPY_MAX_PER_SHARE',
+        'label': '每個共享並行複製上限',
+        'help': '所有複製（監控事件、比較、建立基準線、背景預取）對同一共享（\\\\server\\share、磁碟機或掛載點）同時進行的數量上限，避免一批存檔同時對同一台檔案伺服器開啟大量讀取。',
+        'type': 'int',
+    },
+    {
+        'key': 'COPY_SHARE_BANDWIDTH_MBPS',
+        'label': '每個共享頻寬上限 (MB/s)',
+        'help': '每個共享的讀取頻寬上限（權杖桶，可輸入小數）。0 表示不限。設定後 python 引擎一律分塊讀取；robocopy / PowerShell 於完成後整筆計入，由下一次複製償還。',
+        'type': 'text',
+    },
+    {
+        'key': 'BASELINE_COPY_PREFETCH',
+        'label': '基準線預取檔案數',
+        'help': '建立基準線時，在處理目前檔案的同時於背景預先複製之後 N 個檔案到快取（受上述共享限制）。0 表示停用。',
+        'type': 'int',
     },
     {
         'key': 'PREFER_SUBPROCESS_FOR_XLSM',
@@ -620,6 +771,12 @@ PARAMS_SPEC = [
         'help': '在此秒數內，相同檔案＋工作表＋相同內容的變更只記錄一次至 CSV（避免短時間重覆記錄同一批變更）。',
         'type': 'int',
     },
+    {
+        'key': 'COPY_METRICS_FLUSH_SEC',
+        'label': '複製統計寫出間隔（秒）',
+        'help': '複製成功/失敗明細與按引擎、按共享的耗時直方圖、吞吐量、重試統計先在記憶體累計，每隔此秒數由背景執行緒一次寫出到 ops_log（copy_success_*.csv、copy_failures_*.csv、copy_metrics_*.json），不再每次複製各開一次 CSV。',
+        'type': 'int',
+    },
 
     # 白名單
     {
@@ -748,14 +905,14 @@ class SettingsDialog(tk.Toplevel):
             ]),
             ('輪巡與事件控制', [
                'DEBOUNCE_INTERVAL_SEC','POLLING_SIZE_THRESHOLD_MB','DENSE_POLLING_INTERVAL_SEC','DENSE_POLLING_DURATION_SEC',
-               'SPARSE_POLLING_INTERVAL_SEC','SPARSE_POLLING_DURATION_SEC','QUICK_SKIP_BY_STAT','MTIME_TOLERANCE_SEC',
+               'SPARSE_POLLING_INTERVAL_SEC','SPARSE_POLLING_DURATION_SEC','QUICK_SKIP_BY_STAT','MTIME_TOLERANCE_SEC','ENABLE_PART_FINGERPRINTS',
                'SKIP_WHEN_TEMP_LOCK_PRESENT','POLLING_STABLE_CHECKS','POLLING_COOLDOWN_SEC',
                'MAX_CONCURRENT_COMPARES','DEDUP_PENDING_EVENTS','IMMEDIATE_COMPARE_ON_FIRST_EVENT'
            ]),
             ('複製與快取', [
-                'USE_LOCAL_CACHE','STRICT_NO_ORIGINAL_READ','CACHE_FOLDER','IGNORE_CACHE_FOLDER','COPY_RETRY_COUNT','COPY_RETRY_BACKOFF_SEC',
-                'COPY_CHUNK_SIZE_MB','COPY_STABILITY_CHECKS','COPY_STABILITY_INTERVAL_SEC','COPY_STABILITY_MAX_WAIT_SEC','COPY_POST_SLEEP_SEC',
-                'COPY_ENGINE','PREFER_SUBPROCESS_FOR_XLSM','SUBPROCESS_ENGINE_FOR_XLSM','ROBOCOPY_ENABLE_Z'
+                'USE_LOCAL_CACHE','STRICT_NO_ORIGINAL_READ','CACHE_FOLDER','IGNORE_CACHE_FOLDER','CACHE_MAX_SIZE_MB','CACHE_MAX_AGE_DAYS','CACHE_RECONCILE_ON_START','COPY_RETRY_COUNT','COPY_RETRY_BACKOFF_SEC',
+                'COPY_CHUNK_SIZE_MB','IN_MEMORY_COPY_MAX_MB','IN_MEMORY_COPY_TOTAL_MB','COPY_STABILITY_CHECKS','COPY_STABILITY_INTERVAL_SEC','COPY_STABILITY_MAX_WAIT_SEC','STABILITY_SAMPLE_SEC','COPY_POST_SLEEP_SEC',
+                'COPY_ENGINE','DELTA_COPY_MIN_SIZE_MB','COPY_MAX_WORKERS','COPY_MAX_PER_SHARE','COPY_SHARE_BANDWIDTH_MBPS','BASELINE_COPY_PREFETCH','PREFER_SUBPROCESS_FOR_XLSM','SUBPROCESS_ENGINE_FOR_XLSM','ROBOCOPY_ENABLE_Z'
             ]),
             ('比較與變更檢測', [
                 'FORMULA_ONLY_MODE','TRACK_DIRECT_VALUE_CHANGES','TRACK_FORMULA_CHANGES','ENABLE_FORMULA_VALUE_CHECK','MAX_FORMULA_VALUE_CELLS',
@@ -763,12 +920,12 @@ class SettingsDialog(tk.Toplevel):
                 'ADDRESS_COL_WIDTH','CONSOLE_TERM_WIDTH_OVERRIDE','HEADER_INFO_SECOND_LINE','DIFF_HIGHLIGHT_ENABLED'
             ]),
             ('基準線與壓縮/歸檔', [
-                'DEFAULT_COMPRESSION_FORMAT','LZ4_COMPRESSION_LEVEL','ZSTD_COMPRESSION_LEVEL','GZIP_COMPRESSION_LEVEL',
+                'DEFAULT_COMPRESSION_FORMAT','BASELINE_CONTAINER','BASELINE_CACHE_MB','LZ4_COMPRESSION_LEVEL','ZSTD_COMPRESSION_LEVEL','GZIP_COMPRESSION_LEVEL',
                 'ENABLE_ARCHIVE_MODE','ARCHIVE_AFTER_DAYS','ARCHIVE_COMPRESSION_FORMAT','SHOW_COMPRESSION_STATS'
             ]),
             ('日誌與輸出', [
                'LOG_FOLDER','LOG_FILE_DATE','CSV_LOG_FILE','CONSOLE_TEXT_LOG_ENABLED','CONSOLE_TEXT_LOG_FILE','LOG_DEDUP_WINDOW_SEC',
-               'ENABLE_OPS_LOG','IGNORE_LOG_FOLDER','CONSOLE_TEXT_LOG_ONLY_CHANGES',
+               'ENABLE_OPS_LOG','COPY_METRICS_FLUSH_SEC','IGNORE_LOG_FOLDER','CONSOLE_TEXT_LOG_ONLY_CHANGES',
                'PER_EVENT_CONSOLE_ENABLED','PER_EVENT_CONSOLE_DIR','PER_EVENT_CONSOLE_MAX_CHANGES','PER_EVENT_CONSOLE_INCLUDE_ALL_SHEETS','PER_EVENT_CONSOLE_ADD_EVENT_ID',
                'DEBUG_LEVEL','DEBUG_WRAP_WIDTH','DEBUG_MAX_LIST_ITEMS','DEBUG_TRUNCATE_BYTES','DEBUG_REPEAT_PREFIX_ON_WRAP','DEBUG_TAG_EVENT_ID'
            ]),
@@ -776,7 +933,7 @@ class SettingsDialog(tk.Toplevel):
                 'ENABLE_BLACK_CONSOLE','CONSOLE_POPUP_ON_COMPARISON','CONSOLE_ALWAYS_ON_TOP','CONSOLE_TEMP_TOPMOST_DURATION','CONSOLE_INITIAL_TOPMOST_DURATION','CONSOLE_COLORIZE_TYPES','CONSOLE_FORMULA_COLOR','CONSOLE_VALUE_COLOR','CONSOLE_FONT_FAMILY','CONSOLE_FONT_SIZE','CONSOLE_WRAP_NONE'
             ]),
            ('值/公式讀取引擎', [
-               'VALUE_ENGINE','FORMULA_ENGINE','CSV_PERSIST','MAX_SHEET_WORKERS'
+               'VALUE_ENGINE','VALUE_ENGINE_AUTO_TRIAL','VALUE_ENGINE_MAX_FAILURES','FORMULA_ENGINE','CSV_PERSIST','VALUE_CACHE_ENABLED','XLSX2CSV_INPROCESS','XML_VALUE_STREAMING','SHARED_STRINGS_LRU_SIZE','SHARED_STRINGS_SPILL_MB','MAX_SHEET_WORKERS','PARALLEL_SHEET_MIN_SIZE_MB','COMPACT_CELL_STORE','COLUMNAR_DIFF_MIN_CELLS','FORMULA_MEMO_SIZE'
            ]),
             ('時間線 / Timeline', [
                'UI_TIMELINE_DEFAULT_DAYS','UI_TIMELINE_PAGE_SIZE','UI_TIMELINE_MAX_PAGE_SIZE','UI_TIMELINE_WARN_DAYS',
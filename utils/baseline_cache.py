@@ -0,0 +1,177 @@
+"""
+行程內基準線快取（BASELINE_CACHE_MB）
+- load_baseline 以基準線路徑為 key 保存解析結果；下次載入只需 stat 實際檔案，(mtime_ns, size) 相同即直接返回
+- save_baseline 寫入後即更新快取（write-through），其他行程或手動改動檔案時 mtime 改變自動失效
+- 依估算的記憶體用量按最久未使用逐出，總量不超過 BASELINE_CACHE_MB（0 = 停用）；
+  分段容器的 LazyCells 解碼更多工作表後，於下次命中時重新估算
+- 返回淺複製的 dict：呼叫方改動頂層欄位不影響快取；cells 為唯讀結構（CompactSheet / LazyCells），與快取共用
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import config.settings as settings
+
+# 每個儲存格的估算用量（bytes）：CompactSheet 平行陣列 + 值物件；一般 dict 儲存格約為其數倍
+_COMPACT_CELL_BYTES = 96
+_DICT_CELL_BYTES = 480
+_TREE_BLOCK_BYTES = 120
+
+
+def _budget_bytes() -> int:
+    try:
+        return int(float(getattr(settings, 'BASELINE_CACHE_MB', 0) or 0) * 1024 * 1024)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _file_sig(path: Optional[str]) -> Optional[Tuple[str, int, int]]:
+    if not path:
+        return None
+    try:
+        st = os.stat(path)
+        return (os.path.normcase(os.path.abspath(path)), st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+
+def estimate_bytes(data: Optional[dict]) -> int:
+    """
+    估算一份基準線在記憶體中的用量（只計已解碼的工作表、暫存的壓縮區段，
+    以及欄式比較快取在 CompactSheet 上的 Polars DataFrame，見 utils.columnar.sheet_frame）
+    """
+    if not data:
+        return 0
+    from utils.cell_store import CompactSheet
+    from utils.baseline_container import LazyCells
+    total = 1024
+    cells = data.get('cells') or {}
+    if isinstance(cells, LazyCells):
+        sheets = [cells[n] for n in cells if cells.is_loaded(n)]
+        total += cells.held_bytes()
+    else:
+        sheets = list(cells.values())
+    for ws in sheets:
+        per = _COMPACT_CELL_BYTES if isinstance(ws, CompactSheet) else _DICT_CELL_BYTES
+        total += len(ws or {}) * per
+        frame = getattr(ws, '_frame', None) if isinstance(ws, CompactSheet) else None
+        if frame is not None:
+            try:
+                total += int(frame.estimated_size())
+            except Exception:
+                pass
+    tree = data.get('content_tree') or {}
+    for s in (tree.get('sheets') or {}).values():
+        total += len(s.get('blocks') or {}) * _TREE_BLOCK_BYTES
+    return total
+
+
+class BaselineCache:
+    """以 get_baseline_cache() 取得共用實例"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()   # key -> {'sig', 'data', 'bytes'}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _key(base_path: str) -> str:
+        return os.path.normcase(os.path.abspath(base_path))
+
+    def get(self, base_path: str, actual_file: Optional[str]) -> Optional[dict]:
+        """實際檔案與快取時相同（路徑、mtime_ns、大小）時返回快取內容的淺複製，否則返回 None"""
+        if _budget_bytes() <= 0:
+            self._enforce()
+            return None
+        sig = _file_sig(actual_file)
+        k = self._key(base_path)
+        with self._lock:
+            e = self._entries.get(k)
+            if e is None or sig is None or e['sig'] != sig:
+                if e is not None:
+                    self._drop(k)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(k)
+            self.hits += 1
+            data = e['data']
+        # LazyCells 可能已解碼更多工作表：重新估算並按預算逐出
+        size = estimate_bytes(data)
+        with self._lock:
+            if self._entries.get(k) is e:
+                self.total_bytes += size - e['bytes']
+                e['bytes'] = size
+        self._enforce(keep=k)
+        return dict(data)
+
+    def put(self, base_path: str, actual_file: Optional[str], data: Optional[dict]) -> None:
+        budget = _budget_bytes()
+        k = self._key(base_path)
+        sig = _file_sig(actual_file)
+        if budget <= 0 or not data or sig is None:
+            self.invalidate(base_path)
+            self._enforce()
+            return
+        size = estimate_bytes(data)
+        with self._lock:
+            self._drop(k)
+            if size <= budget:
+                self._entries[k] = {'sig': sig, 'data': dict(data), 'bytes': size}
+                self.total_bytes += size
+        # 上限可能已於設定介面調低：一併逐出超出的部分
+        self._enforce(keep=k)
+
+    def invalidate(self, base_path: str) -> None:
+        with self._lock:
+            self._drop(self._key(base_path))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def _drop(self, k: str) -> None:
+        e = self._entries.pop(k, None)
+        if e is not None:
+            self.total_bytes -= e['bytes']
+
+    def _enforce(self, keep: Optional[str] = None) -> None:
+        budget = _budget_bytes()
+        with self._lock:
+            if budget <= 0:
+                self._entries.clear()
+                self.total_bytes = 0
+                return
+            for k in list(self._entries):
+                if self.total_bytes <= budget:
+                    break
+                if k == keep:
+                    continue
+                self._drop(k)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self.total_bytes, 'hits': self.hits,
+                    'misses': self.misses, 'evictions': self.evictions}
+
+    def describe(self) -> str:
+        st = self.stats()
+        return (f"entries={st['entries']} size={st['bytes'] / 1024 / 1024:.1f}/{_budget_bytes() / 1024 / 1024:.1f}MB "
+                f"hits={st['hits']} misses={st['misses']} evictions={st['evictions']}")
+
+
+_cache: Optional[BaselineCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_baseline_cache() -> BaselineCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = BaselineCache()
+        return _cache
@@ -0,0 +1,368 @@
+"""
+分段基準線容器（<base_key>.baseline.seg，BASELINE_CONTAINER='segmented'）
+- 檔頭：magic、壓縮格式、generation（每次寫入隨機產生）
+- 區段：meta（cells 以外的欄位）與每張工作表各自獨立壓縮的 JSON
+- 檔尾索引：各區段的 offset / 長度 / 解壓後長度 / blake2b 雜湊 / 儲存格數，以及 trailer（索引位置與 CRC）
+- 讀取：mmap 後只讀檔頭、索引與 meta；cells 為 LazyCells（唯讀 Mapping），第一次存取某工作表時才解碼該區段
+- 增量解析沿用的工作表（excel_parser 的 part 指紋）以 overlay() 疊加，不解碼；寫回時直接搬移原壓縮區段
+- 寫入一律先寫暫存檔再 os.replace；替換前會把仍在使用舊檔的 LazyCells 未讀區段載入記憶體（detach），
+  Windows 上替換時不會有開啟中的 handle
+"""
+import os
+import io
+import json
+import mmap
+import zlib
+import struct
+import hashlib
+import logging
+import threading
+import weakref
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import config.settings as settings
+from utils.cell_store import CompactSheet, json_default
+
+SEG_EXT = '.seg'
+MAGIC = b'XLBSEG\x00\x01'
+TRAILER_MAGIC = b'XLBSIDX1'
+CONTAINER_VERSION = 1
+_HEADER = struct.Struct('<8sB7x16s')         # magic, codec, generation
+_TRAILER = struct.Struct('<QII8s')           # index offset, index length, index crc32, magic
+_CODECS = {'gzip': 0, 'lz4': 1, 'zstd': 2}
+_CODEC_NAMES = {v: k for k, v in _CODECS.items()}
+
+
+class BaselineContainerError(ValueError):
+    """容器格式錯誤（magic / 索引 CRC / 區段雜湊不符）"""
+
+
+def is_container(path: str) -> bool:
+    return str(path).endswith(SEG_EXT)
+
+
+def _seg_hash(data) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _dumps(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'), default=json_default).encode('utf-8')
+
+
+def _compress(raw: bytes, codec: str) -> bytes:
+    from utils.compression import compress_data
+    return compress_data(raw, codec)
+
+
+def _decompress(data: bytes, codec: str) -> str:
+    from utils.compression import decompress_data
+    return decompress_data(bytes(data), codec)
+
+
+def _effective_codec(codec: Optional[str]) -> str:
+    from utils.compression import CompressionFormat
+    codec = CompressionFormat.validate_format(codec or settings.DEFAULT_COMPRESSION_FORMAT)
+    return codec if codec in _CODECS else 'gzip'
+
+
+# ---- 讀取 ----
+
+def _read_index(mm) -> dict:
+    if len(mm) < _HEADER.size + _TRAILER.size:
+        raise BaselineContainerError('檔案過短')
+    magic, codec_id, gen = _HEADER.unpack_from(mm, 0)
+    if magic != MAGIC:
+        raise BaselineContainerError('magic 不符')
+    off, length, crc, tmagic = _TRAILER.unpack_from(mm, len(mm) - _TRAILER.size)
+    if tmagic != TRAILER_MAGIC or off + length > len(mm) - _TRAILER.size:
+        raise BaselineContainerError('trailer 不符')
+    raw = mm[off:off + length]
+    if zlib.crc32(raw) & 0xffffffff != crc:
+        raise BaselineContainerError('索引 CRC 不符')
+    index = json.loads(raw.decode('utf-8'))
+    if index.get('v') != CONTAINER_VERSION or index.get('gen') != gen.hex() or index.get('codec') != _CODEC_NAMES.get(codec_id):
+        raise BaselineContainerError('索引與檔頭不一致')
+    return index
+
+
+class _Source:
+    """一個容器檔的索引與（detach 後的）原始壓縮區段；同一檔案的 LazyCells / overlay 共用"""
+
+    def __init__(self, path: str, index: dict):
+        self.path = path
+        self.index = index
+        self.codec = index['codec']
+        self.gen = index['gen']
+        self.segments: Dict[str, list] = {s[0]: s for s in index['sheets']}   # name -> [name, off, len, raw, hash, ncells]
+        self._raw: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self.detached = False
+
+    def raw_segment(self, name: str) -> bytes:
+        """工作表的壓縮區段（驗證雜湊）；未 detach 時以 mmap 讀取後立即關閉檔案"""
+        with self._lock:
+            data = self._raw.get(name)
+        if data is None:
+            data = self._read_segments([name])[name]
+        return data
+
+    def _read_segments(self, names: List[str]) -> Dict[str, bytes]:
+        out = {}
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            _, _, gen = _HEADER.unpack_from(mm, 0)
+            if gen.hex() != self.gen:
+                raise OSError(f"基準線已被改寫（generation 不符）: {self.path}")
+            for name in names:
+                seg = self.segments[name]
+                data = mm[seg[1]:seg[1] + seg[2]]
+                if _seg_hash(data) != seg[4]:
+                    raise BaselineContainerError(f"區段雜湊不符: {name}")
+                out[name] = data
+        return out
+
+    def detach(self) -> None:
+        """把尚未讀取的區段載入記憶體，之後不再需要原檔（原檔即將被替換）"""
+        if self.detached:
+            return
+        with self._lock:
+            missing = [n for n in self.segments if n not in self._raw]
+        if missing:
+            data = self._read_segments(missing)
+            with self._lock:
+                self._raw.update(data)
+        self.detached = True
+
+
+_live_lock = threading.Lock()
+_live: Dict[str, "weakref.WeakSet[_Source]"] = {}
+
+
+def _path_key(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def _register(src: _Source) -> None:
+    with _live_lock:
+        _live.setdefault(_path_key(src.path), weakref.WeakSet()).add(src)
+
+
+def detach_readers(path: str) -> None:
+    """替換 / 刪除容器檔前呼叫：仍在使用的 LazyCells 改為由記憶體中的壓縮區段提供資料"""
+    with _live_lock:
+        sources = list(_live.pop(_path_key(path), ()))
+    for src in sources:
+        try:
+            src.detach()
+        except Exception as e:
+            logging.warning(f"基準線區段預載失敗 {path}: {e}")
+
+
+class LazyCells(Mapping):
+    """
+    {sheet: cells} 的唯讀延遲映射：鍵與儲存格數取自索引，第一次取值時才解碼該工作表
+    （COMPACT_CELL_STORE 啟用時解碼為 CompactSheet）
+    """
+
+    def __init__(self, source: _Source, order: Optional[List[str]] = None, loaded: Optional[dict] = None,
+                 decoded: Optional[dict] = None):
+        self._src = source
+        self._order = list(order) if order is not None else [s[0] for s in source.index['sheets']]
+        self._loaded: Dict[str, object] = dict(decoded or {})
+        self._loaded.update(loaded or {})
+        # loaded：overlay 提供的工作表，不屬於來源區段，寫回時不可搬移舊區段；decoded：與區段內容相同的已解碼工作表
+        self._own = set(loaded or {})
+        self._lock = threading.Lock()
+        self.decoded = 0
+
+    def __getitem__(self, name):
+        with self._lock:
+            if name in self._loaded:
+                return self._loaded[name]
+        if name not in self._order or name not in self._src.segments:
+            raise KeyError(name)
+        raw = self._src.raw_segment(name)
+        ws = json.loads(_decompress(raw, self._src.codec))
+        if getattr(settings, 'COMPACT_CELL_STORE', True) and isinstance(ws, dict):
+            ws = CompactSheet.from_dict(ws) or ws
+        with self._lock:
+            self._loaded.setdefault(name, ws)
+            self.decoded += 1
+            return self._loaded[name]
+
+    def __contains__(self, name) -> bool:
+        return name in self._order
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._order)
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def cell_count(self, name: str) -> int:
+        """不解碼取得儲存格數（overlay 提供的工作表以實際長度計）"""
+        with self._lock:
+            if name in self._own:
+                return len(self._loaded[name] or {})
+        seg = self._src.segments.get(name)
+        return int(seg[5]) if seg else 0
+
+    def is_loaded(self, name: str) -> bool:
+        with self._lock:
+            return name in self._loaded
+
+    def held_bytes(self) -> int:
+        """detach 後暫存在記憶體中的壓縮區段大小"""
+        with self._src._lock:
+            return sum(len(b) for b in self._src._raw.values())
+
+    def reusable_segment(self, name: str, codec: str) -> Optional[Tuple[bytes, list]]:
+        """寫回時可直接搬移的原壓縮區段（工作表來自來源容器且壓縮格式相同）；否則 None"""
+        if name in self._own or name not in self._src.segments or codec != self._src.codec:
+            return None
+        return self._src.raw_segment(name), self._src.segments[name]
+
+    def overlay(self, sheets: dict, order: List[str]) -> 'LazyCells':
+        """以 sheets（新解析的工作表）覆蓋，其餘沿用本容器的延遲區段；order 為新的工作表順序"""
+        with self._lock:
+            keep = {n: ws for n, ws in self._loaded.items() if n in order and n not in sheets}
+        own = {n: ws for n, ws in keep.items() if n in self._own}
+        own.update(sheets)
+        return LazyCells(self._src, order=order, loaded=own,
+                         decoded={n: ws for n, ws in keep.items() if n not in self._own})
+
+    def __eq__(self, other):
+        if isinstance(other, Mapping):
+            if set(self.keys()) != set(other.keys()):
+                return False
+            return all(self[k] == other[k] for k in self)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"LazyCells(sheets={len(self)}, decoded={self.decoded}, path={os.path.basename(self._src.path)})"
+
+
+def load_container(path: str, preload=None) -> dict:
+    """
+    讀取容器：返回 meta dict，'cells' 為 LazyCells（只讀檔頭、索引與 meta 區段）。
+    preload：剛寫入此檔的 cells（save 後的 write-through），其中已解碼的工作表直接沿用，不再解碼
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        index = _read_index(mm)
+        off, length, _raw_len, h = index['meta']
+        meta_raw = mm[off:off + length]
+    if _seg_hash(meta_raw) != h:
+        raise BaselineContainerError('meta 區段雜湊不符')
+    data = json.loads(_decompress(meta_raw, index['codec']))
+    src = _Source(path, index)
+    _register(src)
+    if index.get('has_cells', True):
+        decoded = {}
+        if preload is not None:
+            for name in src.segments:
+                if isinstance(preload, LazyCells):
+                    if preload.is_loaded(name):
+                        decoded[name] = preload[name]
+                elif isinstance(preload.get(name), CompactSheet):
+                    # 只沿用唯讀的 CompactSheet；一般 dict 可能仍被呼叫方修改，留待按需解碼
+                    decoded[name] = preload[name]
+        data['cells'] = LazyCells(src, decoded=decoded)
+    return data
+
+
+# ---- 寫入 ----
+
+def save_container(path: str, data: dict, codec: Optional[str] = None) -> str:
+    """
+    寫入容器（暫存檔 + os.replace），返回路徑。
+    data['cells'] 為 LazyCells 時，來自原容器且未重新解析的工作表直接搬移壓縮區段
+    """
+    codec = _effective_codec(codec)
+    cells = data.get('cells')
+    meta = {k: v for k, v in data.items() if k != 'cells'}
+    meta['timestamp'] = datetime.now().isoformat()
+    meta['compression_format'] = codec
+    meta['container'] = 'segmented'
+    gen = os.urandom(16)
+
+    buf = io.BytesIO()
+    buf.write(_HEADER.pack(MAGIC, _CODECS[codec], gen))
+
+    def put(raw_bytes: bytes) -> list:
+        comp = _compress(raw_bytes, codec)
+        off = buf.tell()
+        buf.write(comp)
+        return [off, len(comp), len(raw_bytes), _seg_hash(comp)]
+
+    raw = _dumps(meta)
+    meta_entry = put(raw)
+    sheets = []
+    reused = 0
+    if cells is not None:
+        for name in cells:
+            seg = cells.reusable_segment(name, codec) if isinstance(cells, LazyCells) else None
+            if seg is not None:
+                comp, old = seg
+                off = buf.tell()
+                buf.write(comp)
+                sheets.append([name, off, len(comp), old[3], old[4], old[5]])
+                reused += 1
+                continue
+            ws = cells[name]
+            raw = _dumps(ws if ws is not None else {})
+            entry = put(raw)
+            sheets.append([name] + entry + [len(ws or {})])
+    index = {'v': CONTAINER_VERSION, 'codec': codec, 'gen': gen.hex(), 'meta': meta_entry,
+             'sheets': sheets, 'has_cells': cells is not None}
+    idx_raw = json.dumps(index, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    idx_off = buf.tell()
+    buf.write(idx_raw)
+    buf.write(_TRAILER.pack(idx_off, len(idx_raw), zlib.crc32(idx_raw) & 0xffffffff, TRAILER_MAGIC))
+
+    tmp = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(buf.getbuffer())
+        # 讀取方仍可能引用舊檔區段：先載入記憶體再替換
+        detach_readers(path)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+    if getattr(settings, 'SHOW_DEBUG_MESSAGES', False):
+        print(f"   [baseline-seg] {os.path.basename(path)} sheets={len(sheets)} reused_segments={reused} codec={codec}")
+    return path
+
+
+def recompress_container(path: str, codec: str) -> Optional[str]:
+    """以另一種壓縮格式重寫全部區段（歸檔用）；格式相同時不動作"""
+    codec = _effective_codec(codec)
+    data = load_container(path)
+    if data.get('compression_format') == codec:
+        return None
+    cells = data.get('cells')
+    if isinstance(cells, LazyCells):
+        data['cells'] = {n: cells[n] for n in cells}
+    return save_container(path, data, codec)
+
+
+def container_stats(path: str) -> Optional[dict]:
+    """與 compression.get_compression_stats 相同欄位（原始大小取自索引，不需解壓）"""
+    try:
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            index = _read_index(mm)
+        original = (index['meta'][2] or 0) + sum(int(s[3] or 0) for s in index['sheets'])
+        ratio = (1 - size / original) * 100 if original > 0 else 0
+        return {'format': index['codec'], 'compressed_size': size, 'original_size': original,
+                'compression_ratio': ratio, 'savings_bytes': original - size, 'sheets': len(index['sheets'])}
+    except (OSError, ValueError, KeyError) as e:
+        logging.error(f"獲取容器統計資訊失敗: {path}, 錯誤: {e}")
+        return None
+
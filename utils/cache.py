@@ -1,13 +1,13 @@
 import os
 import time
+import errno
 import hashlib
 import shutil
 import logging
 import re
 import io
-import csv
-from datetime import datetime
 import config.settings as settings
+from utils.copy_scheduler import get_copy_scheduler, throttle as _throttle, bandwidth_limited as _bandwidth_limited
 
 _MAX_WIN_FILENAME = 240  # conservative cap to avoid MAX_PATH issues
 _HASH_LEN = 16
@@ -51,6 +51,7 @@ def _chunked_copy(src: str, dst: str, chunk_mb: int = 4):
             buf = fsrc.read(chunk_size)
             if not buf:
                 break
+            _throttle(src, len(buf))
             fdst.write(buf)
     try:
         shutil.copystat(src, dst)
@@ -58,90 +59,116 @@ def _chunked_copy(src: str, dst: str, chunk_mb: int = 4):
         pass
 
 
-def _ops_log_copy_failure(network_path: str, error: Exception, attempts: int, strict_mode: bool):
+class _KernelCopyUnsupported(Exception):
+    """此檔案系統組合不支援該系統呼叫（尚未寫入任何資料，可改用下一種方法）"""
+
+
+# copy_file_range 跨檔案系統（例如 CIFS -> ext4）在新核心回傳 EXDEV；部分 FUSE / 舊核心回傳 ENOSYS / EOPNOTSUPP / EINVAL
+_KERNEL_COPY_UNSUPPORTED = {getattr(errno, n) for n in ('EXDEV', 'ENOSYS', 'EOPNOTSUPP', 'ENOTSUP', 'EINVAL', 'EBADF') if hasattr(errno, n)}
+
+
+def _kernel_copy_loop(src: str, method: str, infd: int, outfd: int, size: int, chunk: int) -> int:
+    offset = 0
+    while offset < size:
+        # 支援停止時中斷（每個區塊檢查一次）
+        if getattr(settings, 'force_stop', False):
+            raise OSError('Operation cancelled: stopping')
+        n = min(chunk, size - offset)
+        try:
+            if method == 'copy_file_range':
+                sent = os.copy_file_range(infd, outfd, n, offset, offset)
+            else:
+                sent = os.sendfile(outfd, infd, offset, n)
+        except OSError as e:
+            if offset == 0 and e.errno in _KERNEL_COPY_UNSUPPORTED:
+                raise _KernelCopyUnsupported(f"{method}: {e}")
+            raise
+        if sent == 0:
+            break
+        _throttle(src, sent)
+        offset += sent
+    return offset
+
+
+def _kernel_copy(src: str, dst: str, chunk_mb: int = 4) -> str:
+    """
+    核心輔助複製（COPY_ENGINE='kernel'，Linux）：os.copy_file_range，不支援時改用 os.sendfile，
+    兩者皆不可用時退回一般讀寫；資料不經 Python 緩衝區。返回實際使用的方法名稱。
+    """
+    chunk = max(1, int(chunk_mb or 4)) * 1024 * 1024
+    methods = [m for m in ('copy_file_range', 'sendfile') if hasattr(os, m)]
+    used = None
+    with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+        size = os.fstat(fsrc.fileno()).st_size
+        for method in methods:
+            try:
+                copied = _kernel_copy_loop(src, method, fsrc.fileno(), fdst.fileno(), size, chunk)
+                used = method
+                break
+            except _KernelCopyUnsupported as e:
+                if getattr(settings, 'SHOW_DEBUG_MESSAGES', False):
+                    print(f"      [kernel-copy] {e}，改用下一種方法")
+                fdst.seek(0)
+                fdst.truncate()
+        if used is None:
+            used = 'readwrite'
+            copied = 0
+            while True:
+                if getattr(settings, 'force_stop', False):
+                    raise OSError('Operation cancelled: stopping')
+                buf = fsrc.read(chunk)
+                if not buf:
+                    break
+                _throttle(src, len(buf))
+                fdst.write(buf)
+                copied += len(buf)
+    try:
+        shutil.copystat(src, dst)
+    except Exception:
+        pass
+    # 複製後驗證（與 robocopy / PowerShell 路徑一致）：目的檔須存在且大小與來源相同
+    try:
+        d_sz = os.path.getsize(dst)
+        s_sz = os.path.getsize(src)
+    except OSError as ve:
+        raise OSError(f"kernel copy 驗證失敗: {ve}")
+    if d_sz != s_sz or copied != s_sz:
+        raise OSError(f"kernel copy 大小不符: copied={copied} dst={d_sz} src={s_sz}")
+    if getattr(settings, 'SHOW_DEBUG_MESSAGES', False):
+        print(f"      [copy-ok] engine=kernel:{used} dst={dst} dst_size={d_sz} src_size={s_sz}")
+    return used
+
+
+def _ops_log_copy_failure(network_path: str, error: Exception, attempts: int, strict_mode: bool, engine=None):
+    """記錄複製失敗（見 utils.copy_metrics：記憶體累計，定期寫出 ops_log）；engine 為最後嘗試的引擎，未嘗試複製時為 None"""
     try:
-        base_dir = os.path.join(settings.LOG_FOLDER, 'ops_log')
-        os.makedirs(base_dir, exist_ok=True)
-        fname = f"copy_failures_{datetime.now():%Y%m%d}.csv"
-        fpath = os.path.join(base_dir, fname)
-        new_file = not os.path.exists(fpath)
-        with open(fpath, 'a', encoding='utf-8', newline='') as f:
-            w = csv.writer(f)
-            if new_file:
-                w.writerow(['Timestamp','Path','Error','Attempts','STRICT_NO_ORIGINAL_READ','COPY_CHUNK_SIZE_MB','BACKOFF_SEC'])
-            w.writerow([
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                network_path,
-                str(error),
-                attempts,
-                bool(getattr(settings, 'STRICT_NO_ORIGINAL_READ', False)),
-                int(getattr(settings, 'COPY_CHUNK_SIZE_MB', 0)),
-                float(getattr(settings, 'COPY_RETRY_BACKOFF_SEC', 0.0)),
-            ])
+        from utils.copy_metrics import get_copy_metrics
+        get_copy_metrics().record_failure(network_path, error, attempts, strict_mode, engine=engine)
     except Exception:
         pass
 
-def _ops_log_copy_success(network_path: str, duration: float, attempts: int, engine: str, chunk_mb: int):
+def _ops_log_copy_success(network_path: str, duration: float, attempts: int, engine: str, chunk_mb: int,
+                          bytes_transferred=None, size_bytes=None):
+    """記錄複製成功；size_bytes 由呼叫方提供（不再對網絡路徑重新 stat）。完整複製的傳輸量即檔案大小"""
     try:
-        base_dir = os.path.join(settings.LOG_FOLDER, 'ops_log')
-        os.makedirs(base_dir, exist_ok=True)
-        fname = f"copy_success_{datetime.now():%Y%m%d}.csv"
-        fpath = os.path.join(base_dir, fname)
-        new_file = not os.path.exists(fpath)
-        with open(fpath, 'a', encoding='utf-8', newline='') as f:
-            w = csv.writer(f)
-            if new_file:
-                w.writerow(['Timestamp','Path','SizeMB','DurationSec','Attempts','Engine','ChunkMB','StabilityChecks','StabilityInterval','StabilityMaxWait','STRICT_NO_ORIGINAL_READ'])
-            size_mb = os.path.getsize(network_path)/(1024*1024) if os.path.exists(network_path) else ''
-            w.writerow([
-                datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                network_path,
-                f"{(size_mb or 0):.2f}" if size_mb != '' else '',
-                f"{duration:.2f}",
-                attempts,
-                engine,
-                int(chunk_mb),
-                int(getattr(settings, 'COPY_STABILITY_CHECKS', 0)),
-                float(getattr(settings, 'COPY_STABILITY_INTERVAL_SEC', 0.0)),
-                float(getattr(settings, 'COPY_STABILITY_MAX_WAIT_SEC', 0.0)),
-                bool(getattr(settings, 'STRICT_NO_ORIGINAL_READ', False)),
-            ])
+        from utils.copy_metrics import get_copy_metrics
+        get_copy_metrics().record_success(network_path, duration, attempts, engine, chunk_mb,
+                                          size_bytes=size_bytes, bytes_transferred=bytes_transferred)
     except Exception:
         pass
 
 
 def _wait_for_stable_mtime(path: str, checks: int, interval: float, max_wait: float) -> bool:
+    """
+    等待來源連續 checks 次（間隔 interval 秒）mtime / size 不變，最多 max_wait 秒。
+    由 utils.stability 的追蹤器實作：安靜窗口 (checks-1)*interval 一到即返回，早已穩定的檔案不需等待。
+    """
     try:
         if checks <= 1:
             return True
-        last = None
-        same = 0
-        start = time.time()
-        while True:
-            # 允許在停止時立即退出等待
-            try:
-                if getattr(settings, 'force_stop', False):
-                    return False
-            except Exception:
-                pass
-            try:
-                cur = os.path.getmtime(path)
-            except Exception:
-                return False
-            if last is None:
-                last = cur
-                same = 1
-            else:
-                if cur == last:
-                    same += 1
-                else:
-                    same = 1
-                    last = cur
-            if same >= checks:
-                return True
-            if max_wait is not None and (time.time() - start) >= max_wait:
-                return False
-            time.sleep(max(0.0, interval))
+        from utils.stability import get_stability_tracker
+        quiet = (checks - 1) * max(0.0, interval)
+        return get_stability_tracker().wait_until_stable(path, quiet, max_wait)
     except Exception:
         return False
 
@@ -301,6 +328,26 @@ def _run_subprocess_copy(src: str, dst: str, engine: str = 'robocopy'):
         raise ValueError(f"Unknown subprocess copy engine: {engine}")
 
 
+def _cache_record(cache_file: str, network_path: str, hit: bool, memory: bool = False):
+    """
+    登記到快取管理器（命中 / 新複製）；新複製後按 CACHE_MAX_SIZE_MB / CACHE_MAX_AGE_DAYS 逐出。
+    memory=True：記憶體副本，只登記 key（其值快取以同一快取路徑為 key，對帳時不可當作孤立檔刪除）
+    """
+    try:
+        from utils.cache_manager import get_cache_manager
+        mgr = get_cache_manager()
+        if mgr is None:
+            return
+        if memory:
+            mgr.record_memory(cache_file, network_path, hit)
+        elif hit:
+            mgr.record_hit(cache_file, network_path)
+        else:
+            mgr.record_store(cache_file, network_path)
+    except Exception as e:
+        logging.warning(f"快取管理器登記失敗: {e}")
+
+
 def copy_to_cache(network_path, silent=False):
     # 嚴格模式下，如果不使用本地快取，直接返回 None（不讀原檔）
     if not settings.USE_LOCAL_CACHE:
@@ -313,6 +360,14 @@ def copy_to_cache(network_path, silent=False):
     try:
         os.makedirs(settings.CACHE_FOLDER, exist_ok=True)
 
+        # 同一檔案正由複製排程器在背景複製（例如基準線預取）：等待其結果，不重複讀取來源
+        try:
+            joined, result = get_copy_scheduler().join_inflight(network_path)
+            if joined:
+                return result
+        except Exception as e:
+            logging.warning(f"等待排程中的複製失敗: {e}")
+
         # If the source already under cache root, return as-is to avoid prefix duplication
         if _is_in_cache(network_path):
             return network_path
@@ -324,10 +379,20 @@ def copy_to_cache(network_path, silent=False):
 
         cache_file = os.path.join(settings.CACHE_FOLDER, _safe_cache_basename(network_path))
 
+        # 記憶體副本仍新於來源：直接沿用（見 utils.mem_cache）
+        try:
+            from utils import mem_cache
+            if mem_cache.lookup_fresh(cache_file, network_path):
+                _cache_record(cache_file, network_path, hit=True, memory=True)
+                return cache_file
+        except Exception as e:
+            logging.warning(f"檢查記憶體副本失敗: {e}")
+
         # 若快取已新於來源，直接用快取檔
         if os.path.exists(cache_file):
             try:
                 if os.path.getmtime(cache_file) >= os.path.getmtime(network_path):
+                    _cache_record(cache_file, network_path, hit=True)
                     return cache_file
             except OSError as e:
                 logging.warning(f"獲取緩存檔案時間失敗: {e}")
@@ -346,6 +411,7 @@ def copy_to_cache(network_path, silent=False):
         chunk_mb = max(0, int(getattr(settings, 'COPY_CHUNK_SIZE_MB', 0)))
 
         last_err = None
+        used_engine = None  # 最近一次嘗試的引擎（失敗統計按實際引擎歸類）
         for attempt in range(1, retry + 1):
             # 若正在停止，立即中止循環
             try:
@@ -359,14 +425,17 @@ def copy_to_cache(network_path, silent=False):
             st_interval = max(0.0, float(getattr(settings, 'COPY_STABILITY_INTERVAL_SEC', 1.0)))
             st_maxwait = float(getattr(settings, 'COPY_STABILITY_MAX_WAIT_SEC', 3.0))
             if st_checks > 1:
+                wait_start = time.monotonic()
                 stable_ok = _wait_for_stable_mtime(network_path, st_checks, st_interval, st_maxwait)
                 if not stable_ok:
                     if not silent:
                         print(f"      ⏳ 源檔案仍在變動，延後複製（第 {attempt}/{retry} 次）")
-                    time.sleep(backoff * attempt)
+                    # 追蹤器已等滿 COPY_STABILITY_MAX_WAIT_SEC 時毋須再退避；
+                    # 提早返回（stat 暫時失敗，例如 Excel 存檔改名 / SMB 斷線，或停止中）則照舊退避
+                    if time.monotonic() - wait_start < st_maxwait:
+                        time.sleep(backoff * attempt)
                     continue
 
-            copy_start = time.time()
             try:
                 # 子程序複製策略：.xlsm 或設定指定時優先
                 use_sub = False
@@ -374,28 +443,60 @@ def copy_to_cache(network_path, silent=False):
                 prefer_xlsm = bool(getattr(settings, 'PREFER_SUBPROCESS_FOR_XLSM', False))
                 if sub_engine in ('robocopy', 'powershell'):
                     use_sub = True
+                elif sub_engine in ('delta', 'kernel'):
+                    # 明確選擇 delta / kernel 時 .xlsm 亦使用該引擎
+                    pass
                 elif prefer_xlsm and str(network_path).lower().endswith('.xlsm'):
                     sub_engine = getattr(settings, 'SUBPROCESS_ENGINE_FOR_XLSM', 'robocopy')
                     use_sub = True
 
-                used_engine = 'python'
-                if use_sub:
-                    _run_subprocess_copy(network_path, cache_file, engine=sub_engine)
-                    used_engine = sub_engine
-                else:
-                    if chunk_mb > 0:
-                        _chunked_copy(network_path, cache_file, chunk_mb=chunk_mb)
+                # 同一共享的並行複製數受 COPY_MAX_PER_SHARE 限制（等待名額的時間不計入複製耗時）
+                with get_copy_scheduler().share_slot(network_path):
+                    copy_start = time.time()
+                    used_engine = 'python'
+                    bytes_transferred = None
+                    from utils import mem_cache
+                    if mem_cache.should_load(network_size):
+                        # 小檔：只讀一次到記憶體，不寫快取檔
+                        used_engine = 'memory'
+                        data, src_stat = mem_cache.read_source(network_path, chunk_mb=chunk_mb or 4)
+                        mem_cache.store(cache_file, network_path, data, src_stat)
+                    elif sub_engine == 'delta':
+                        from utils.delta_copy import delta_copy
+                        used_engine = 'delta'
+                        dstats = delta_copy(network_path, cache_file, chunk_mb=chunk_mb or 4)
+                        used_engine = 'delta' if dstats['mode'] == 'delta' else 'delta-full'
+                        bytes_transferred = dstats['bytes_transferred']
+                        if not silent and dstats['mode'] == 'delta':
+                            print(f"      增量複製：重用 {dstats['reused_members']} 個 part，"
+                                  f"傳輸 {bytes_transferred/(1024*1024):.2f}/{dstats['bytes_total']/(1024*1024):.2f} MB")
+                    elif sub_engine == 'kernel':
+                        used_engine = 'kernel'
+                        kernel_mode = _kernel_copy(network_path, cache_file, chunk_mb=chunk_mb or 4)
+                        used_engine = f"kernel:{kernel_mode}"
+                    elif use_sub:
+                        used_engine = sub_engine
+                        _run_subprocess_copy(network_path, cache_file, engine=sub_engine)
+                        # 子進程無法分塊限流：完成後整筆扣除，由同一共享的下一次複製償還
+                        _throttle(network_path, network_size or 0)
                     else:
-                        shutil.copy2(network_path, cache_file)
-                # 短暫等待，給檔案系統穩定
-                time.sleep(getattr(settings, 'COPY_POST_SLEEP_SEC', 0.2))
+                        if chunk_mb > 0 or _bandwidth_limited():
+                            # 設有頻寬上限時須分塊讀取才能限流
+                            _chunked_copy(network_path, cache_file, chunk_mb=chunk_mb or 4)
+                        else:
+                            shutil.copy2(network_path, cache_file)
+                # 短暫等待，給檔案系統穩定（記憶體副本沒有寫檔，毋須等待）
+                if used_engine != 'memory':
+                    time.sleep(getattr(settings, 'COPY_POST_SLEEP_SEC', 0.2))
                 duration = time.time() - copy_start
                 if not silent:
                     print(f"      複製完成，耗時 {duration:.1f} 秒（第 {attempt}/{retry} 次嘗試）")
                 try:
-                    _ops_log_copy_success(network_path, duration, attempt, engine=used_engine, chunk_mb=chunk_mb)
+                    _ops_log_copy_success(network_path, duration, attempt, engine=used_engine, chunk_mb=chunk_mb,
+                                          bytes_transferred=bytes_transferred, size_bytes=network_size)
                 except Exception:
                     pass
+                _cache_record(cache_file, network_path, hit=False, memory=(used_engine == 'memory'))
                 return cache_file
             except (PermissionError, OSError) as e:
                 last_err = e
@@ -410,7 +511,7 @@ def copy_to_cache(network_path, silent=False):
         if getattr(settings, 'STRICT_NO_ORIGINAL_READ', False):
             logging.error(f"嚴格模式：無法複製到緩存，跳過原檔讀取：{last_err}")
             try:
-                _ops_log_copy_failure(network_path, last_err, attempt, True)
+                _ops_log_copy_failure(network_path, last_err, attempt, True, engine=used_engine)
             except Exception:
                 pass
             if not silent:
@@ -419,7 +520,7 @@ def copy_to_cache(network_path, silent=False):
         else:
             logging.error(f"緩存失敗 - 將回退為直接使用原檔（非嚴格模式）：{last_err}")
             try:
-                _ops_log_copy_failure(network_path, last_err, attempt, False)
+                _ops_log_copy_failure(network_path, last_err, attempt, False, engine=used_engine)
             except Exception:
                 pass
             if not silent:
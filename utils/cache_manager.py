@@ -0,0 +1,407 @@
+"""
+本地快取（CACHE_FOLDER）容量管理
+- copy_to_cache 產生的 <md5[:16]>_<檔名> 副本登記於 <CACHE_FOLDER>/.cache_index.json：來源路徑、大小、最後使用時間
+- 記憶體副本（utils.mem_cache）沒有檔案，但值快取同樣以其快取路徑為 key：以 'memory' 項目登記，對帳時視為存活
+- 容量上限 CACHE_MAX_SIZE_MB（超出時按最久未使用逐出）、存活期 CACHE_MAX_AGE_DAYS（超過即逐出），0 表示不限；
+  容量包含 values/ 內的值快取（計入其所屬副本，逐出副本時一併刪除）
+- 正在解析的副本以 pin / pinned() 釘住（引用計數），逐出時一律略過
+- 啟動時 reconcile()：移除索引中已不存在的檔案、收編未登記的副本（以 mtime 作最後使用時間）、
+  刪除來源已被改名 / 移走的副本，以及沒有對應副本的值快取（values/*.arrow）
+- stats() / describe() 提供命中、未命中、逐出統計
+"""
+import os
+import re
+import json
+import time
+import glob
+import atexit
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import config.settings as settings
+
+INDEX_NAME = '.cache_index.json'
+INDEX_VERSION = 1
+_CACHE_FILE_RE = re.compile(r'^[0-9a-fA-F]{16}_.+')
+_SAVE_INTERVAL_SEC = 30.0
+
+
+class CacheManager:
+    """單一 CACHE_FOLDER 的索引、釘選與逐出；以 get_cache_manager() 取得共用實例"""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.index_path = os.path.join(self.root, INDEX_NAME)
+        self._lock = threading.RLock()
+        self._entries: Dict[str, dict] = {}   # 檔名 -> {'src', 'size', 'last_used'[, 'memory': True]}
+        self._pins: Dict[str, int] = {}       # 檔名 -> 引用計數
+        self._dirty = False
+        self._last_save = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.stale_removed = 0
+        self._load_index()
+
+    # ---- 索引 ----
+
+    def _load_index(self) -> None:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict) and data.get('version') == INDEX_VERSION:
+                self._entries = {k: v for k, v in (data.get('files') or {}).items() if isinstance(v, dict)}
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"   [cache-manager] 索引無法讀取，將重建: {e}")
+
+    def save(self, force: bool = False) -> None:
+        with self._lock:
+            if not force and (not self._dirty or time.time() - self._last_save < _SAVE_INTERVAL_SEC):
+                return
+            data = {'version': INDEX_VERSION, 'files': dict(self._entries)}
+            self._dirty = False
+            self._last_save = time.time()
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            tmp = f"{self.index_path}.tmp{os.getpid()}"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=1)
+            os.replace(tmp, self.index_path)
+        except Exception as e:
+            print(f"   [cache-manager] 無法保存索引: {e}")
+
+    def _key(self, cache_file: str) -> str:
+        return os.path.basename(cache_file)
+
+    # ---- 使用紀錄 ----
+
+    def record_hit(self, cache_file: str, src: str) -> None:
+        """copy_to_cache 直接沿用較新的副本"""
+        with self._lock:
+            self.hits += 1
+            self._touch(cache_file, src)
+        self.save()
+
+    def record_store(self, cache_file: str, src: str) -> None:
+        """copy_to_cache 剛完成複製；登記後按預算逐出（不會逐出剛寫入的副本）"""
+        with self._lock:
+            self.misses += 1
+            self._touch(cache_file, src)
+            self.enforce(keep=self._key(cache_file))
+        self.save()
+
+    def record_memory(self, cache_file: str, src: str, hit: bool) -> None:
+        """copy_to_cache 使用 / 建立記憶體副本：沒有副本檔，只登記 key 以保住其值快取"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self._touch(cache_file, src, memory=True)
+        self.save()
+
+    def _touch(self, cache_file: str, src: str, memory: bool = False) -> None:
+        key = self._key(cache_file)
+        if memory:
+            self._entries[key] = {'src': src, 'size': 0, 'last_used': time.time(), 'memory': True}
+            self._dirty = True
+            return
+        try:
+            size = os.path.getsize(os.path.join(self.root, key))
+        except OSError:
+            size = (self._entries.get(key) or {}).get('size', 0)
+        self._entries[key] = {'src': src, 'size': int(size), 'last_used': time.time()}
+        self._dirty = True
+
+    # ---- 釘選 ----
+
+    def pin(self, cache_file: str) -> None:
+        key = self._key(cache_file)
+        with self._lock:
+            self._pins[key] = self._pins.get(key, 0) + 1
+
+    def unpin(self, cache_file: str) -> None:
+        key = self._key(cache_file)
+        with self._lock:
+            n = self._pins.get(key, 0) - 1
+            if n > 0:
+                self._pins[key] = n
+            else:
+                self._pins.pop(key, None)
+
+    def is_pinned(self, cache_file: str) -> bool:
+        with self._lock:
+            return self._pins.get(self._key(cache_file), 0) > 0
+
+    @contextmanager
+    def pinned(self, cache_file: str):
+        self.pin(cache_file)
+        try:
+            yield cache_file
+        finally:
+            self.unpin(cache_file)
+
+    # ---- 逐出 ----
+
+    def total_bytes(self) -> int:
+        """副本大小加上 values/ 值快取大小"""
+        with self._lock:
+            copies = sum(int(e.get('size') or 0) for e in self._entries.values())
+        return copies + sum(_value_cache_sizes(self.root).values())
+
+    def _entry_bytes(self, key: str, value_sizes: Dict[str, int]) -> int:
+        """單一副本佔用的空間：副本檔（記憶體副本為 0）+ 以其為 key 的值快取"""
+        size = int((self._entries.get(key) or {}).get('size') or 0)
+        try:
+            from utils.helpers import _baseline_key_for_path
+            size += value_sizes.get(_baseline_key_for_path(os.path.join(self.root, key)), 0)
+        except Exception:
+            pass
+        return size
+
+    def _remove(self, key: str, reason: str) -> bool:
+        path = os.path.join(self.root, key)
+        entry = self._entries.get(key) or {}
+        try:
+            if not entry.get('memory') and os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            # Windows 上被其他程序開啟中時刪除失敗：保留登記，下次再試
+            if getattr(settings, 'SHOW_DEBUG_MESSAGES', False):
+                print(f"   [cache-manager] 無法刪除 {key}: {e}")
+            return False
+        self._entries.pop(key, None)
+        self._dirty = True
+        _remove_value_cache(path)
+        if reason == 'stale':
+            self.stale_removed += 1
+        else:
+            self.evictions += 1
+            self.evicted_bytes += int(entry.get('size') or 0)
+        if getattr(settings, 'SHOW_DEBUG_MESSAGES', False):
+            print(f"   [cache-manager] evict({reason}) {key}")
+        return True
+
+    def enforce(self, keep: Optional[str] = None) -> int:
+        """按存活期與容量上限逐出；返回逐出檔案數"""
+        max_mb = float(getattr(settings, 'CACHE_MAX_SIZE_MB', 0) or 0)
+        max_age_days = float(getattr(settings, 'CACHE_MAX_AGE_DAYS', 0) or 0)
+        removed = 0
+        with self._lock:
+            now = time.time()
+            candidates = sorted(
+                (k for k in self._entries if k != keep and self._pins.get(k, 0) <= 0),
+                key=lambda k: self._entries[k].get('last_used') or 0,
+            )
+            if max_age_days > 0:
+                cutoff = now - max_age_days * 86400
+                for k in list(candidates):
+                    if (self._entries[k].get('last_used') or 0) < cutoff:
+                        candidates.remove(k)
+                        removed += self._remove(k, 'age')
+            if max_mb > 0:
+                budget = int(max_mb * 1024 * 1024)
+                value_sizes = _value_cache_sizes(self.root)
+                total = sum(int(e.get('size') or 0) for e in self._entries.values()) + sum(value_sizes.values())
+                for k in candidates:
+                    if total <= budget:
+                        break
+                    size = self._entry_bytes(k, value_sizes)
+                    if self._remove(k, 'lru'):
+                        removed += 1
+                        total -= size
+        if removed:
+            self.save(force=True)
+        return removed
+
+    # ---- 啟動對帳 ----
+
+    def reconcile(self, check_sources: bool = True) -> dict:
+        """
+        以磁碟實況更新索引並清理：已消失的檔案、未登記的副本、來源已不存在的副本（含記憶體副本）、孤立的值快取；
+        最後執行一次 enforce()。返回本次處理的數目。
+        """
+        t0 = time.time()
+        out = {'missing': 0, 'adopted': 0, 'stale': 0, 'orphan_values': 0, 'evicted': 0}
+        try:
+            names = [n for n in os.listdir(self.root) if _CACHE_FILE_RE.match(n)
+                     and os.path.isfile(os.path.join(self.root, n))]
+        except FileNotFoundError:
+            names = []
+        on_disk = set(names)
+        with self._lock:
+            for k, e in list(self._entries.items()):
+                if k not in on_disk and not e.get('memory'):
+                    self._entries.pop(k, None)
+                    out['missing'] += 1
+            for n in names:
+                if n in self._entries and not self._entries[n].get('memory'):
+                    continue
+                try:
+                    st = os.stat(os.path.join(self.root, n))
+                except OSError:
+                    continue
+                # 曾登記為記憶體副本者沿用其來源路徑
+                src = (self._entries.get(n) or {}).get('src')
+                self._entries[n] = {'src': src, 'size': st.st_size, 'last_used': st.st_mtime}
+                out['adopted'] += 1
+            if check_sources:
+                for k, e in list(self._entries.items()):
+                    src = e.get('src')
+                    if src and self._pins.get(k, 0) <= 0 and not os.path.exists(src):
+                        out['stale'] += self._remove(k, 'stale')
+            self._dirty = True
+            live_keys = set(self._entries)
+        out['orphan_values'] = _remove_orphan_value_caches(self.root, live_keys)
+        out['evicted'] = self.enforce()
+        self.save(force=True)
+        out['elapsed_sec'] = round(time.time() - t0, 3)
+        return out
+
+    # ---- 統計 ----
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'files': len(self._entries),
+                'bytes': self.total_bytes(),
+                'pinned': sum(1 for v in self._pins.values() if v > 0),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / total) if total else 0.0,
+                'evictions': self.evictions,
+                'evicted_bytes': self.evicted_bytes,
+                'stale_removed': self.stale_removed,
+            }
+
+    def describe(self) -> str:
+        st = self.stats()
+        return (f"files={st['files']} size={st['bytes'] / 1024 / 1024:.1f}MB pinned={st['pinned']} "
+                f"hits={st['hits']} misses={st['misses']} hit_rate={st['hit_rate']:.1%} "
+                f"evicted={st['evictions']} ({st['evicted_bytes'] / 1024 / 1024:.1f}MB) stale={st['stale_removed']}")
+
+
+def _remove_value_cache(cache_file: str) -> None:
+    """刪除以此快取副本為 key 的值快取（utils.value_cache）"""
+    try:
+        from utils.helpers import _baseline_key_for_path
+        base_key = _baseline_key_for_path(cache_file)
+        values_dir = os.path.join(os.path.dirname(cache_file), 'values')
+        for p in glob.glob(os.path.join(glob.escape(values_dir), glob.escape(base_key) + '.*.arrow')):
+            os.remove(p)
+    except Exception:
+        pass
+
+
+def _value_cache_sizes(root: str) -> Dict[str, int]:
+    """values/ 內值快取按 base_key 合計的大小"""
+    values_dir = os.path.join(root, 'values')
+    out: Dict[str, int] = {}
+    try:
+        names = os.listdir(values_dir)
+    except OSError:
+        return out
+    for n in names:
+        if not n.endswith('.arrow'):
+            continue
+        try:
+            size = os.path.getsize(os.path.join(values_dir, n))
+        except OSError:
+            continue
+        base_key = n.rsplit('.', 3)[0]
+        out[base_key] = out.get(base_key, 0) + size
+    return out
+
+
+def _remove_orphan_value_caches(root: str, live_keys) -> int:
+    values_dir = os.path.join(root, 'values')
+    if not os.path.isdir(values_dir):
+        return 0
+    try:
+        from utils.helpers import _baseline_key_for_path
+        live = {_baseline_key_for_path(os.path.join(root, k)) for k in live_keys}
+    except Exception:
+        return 0
+    removed = 0
+    for n in os.listdir(values_dir):
+        if not n.endswith('.arrow'):
+            continue
+        # <base_key>.<engine>.<fingerprint>.arrow
+        base_key = n.rsplit('.', 3)[0]
+        if base_key not in live:
+            try:
+                os.remove(os.path.join(values_dir, n))
+                removed += 1
+            except OSError:
+                pass
+    return removed
+
+
+_manager: Optional[CacheManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_cache_manager() -> Optional[CacheManager]:
+    """目前 CACHE_FOLDER 的共用實例（CACHE_FOLDER 在設定介面被更改時重新建立）；未設定時返回 None"""
+    global _manager
+    root = getattr(settings, 'CACHE_FOLDER', None)
+    if not root:
+        return None
+    root = os.path.abspath(root)
+    with _manager_lock:
+        if _manager is None or _manager.root != root:
+            if _manager is not None:
+                _manager.save(force=True)
+            _manager = CacheManager(root)
+        return _manager
+
+
+@atexit.register
+def _save_on_exit():
+    if _manager is not None:
+        _manager.save(force=True)
+
+
+@contextmanager
+def pinned_source(src_path: str):
+    """以來源路徑釘住其快取副本（副本尚未建立亦可，之後複製的檔案同樣受保護）"""
+    mgr = None
+    cache_file = None
+    try:
+        if getattr(settings, 'USE_LOCAL_CACHE', False):
+            from utils.cache import _safe_cache_basename, _is_in_cache
+            mgr = get_cache_manager()
+            if mgr is not None:
+                cache_file = src_path if _is_in_cache(src_path) else os.path.join(mgr.root, _safe_cache_basename(src_path))
+                mgr.pin(cache_file)
+    except Exception:
+        mgr = None
+    try:
+        yield cache_file
+    finally:
+        if mgr is not None:
+            mgr.unpin(cache_file)
+            from utils import mem_cache
+            mem_cache.release_if_stale(cache_file)
+
+
+def reconcile_cache_on_startup(silent: bool = False) -> Optional[dict]:
+    """啟動時執行一次對帳與逐出（CACHE_RECONCILE_ON_START）"""
+    if not getattr(settings, 'USE_LOCAL_CACHE', False) or not getattr(settings, 'CACHE_RECONCILE_ON_START', True):
+        return None
+    try:
+        mgr = get_cache_manager()
+        if mgr is None:
+            return None
+        res = mgr.reconcile()
+        if not silent:
+            print(f"   [cache-manager] 啟動對帳: {res} | {mgr.describe()}")
+        return res
+    except Exception as e:
+        print(f"   [cache-manager] 啟動對帳失敗: {e}")
+        return None
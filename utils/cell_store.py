@@ -0,0 +1,227 @@
+"""
+緊湊儲存格存放（取代「每格一個 4-key dict」）
+- 每張工作表以平行陣列保存：排序後的整數位址（row/col 編碼）、公式表索引、值列表、旗標
+- 相同公式字串只保存一次（每表公式表 + 索引），短字串值以 sys.intern 共用
+- CompactSheet 是唯讀 Mapping：cells[addr] 會即時組回 {formula, value, cached_value, external_ref} dict，
+  既有呼叫方（.get / in / items / == / json）毋須修改
+"""
+import sys
+import bisect
+from array import array
+from collections.abc import Mapping
+from typing import Dict, Iterator, Optional
+
+CELL_KEYS = frozenset(("formula", "value", "cached_value", "external_ref"))
+
+_COL_BITS = 14          # Excel 最多 16384 欄
+_COL_MASK = (1 << _COL_BITS) - 1
+_INTERN_MAX_LEN = 64    # 只 intern 短字串（數字、代碼、常見文字）
+
+# flags 位元
+_F_EXTERNAL = 1         # external_ref=True
+_F_CACHED_NONE = 2      # cached_value 為 None（值不為 None）
+_F_CACHED_OTHER = 4     # cached_value 與 value 不同，實際值存於 _cached_extra
+
+
+def _encode_addr(addr) -> int:
+    """'AB12' -> 整數鍵（row << 14 | col-1）；無法解析返回 -1"""
+    if not isinstance(addr, str):
+        return -1
+    col = 0
+    i = 0
+    n = len(addr)
+    while i < n and 'A' <= addr[i] <= 'Z':
+        col = col * 26 + (ord(addr[i]) - 64)
+        i += 1
+    if col == 0 or col > _COL_MASK + 1 or i == n or not addr[i:].isdigit() or addr[i] == '0':
+        return -1
+    return (int(addr[i:]) << _COL_BITS) | (col - 1)
+
+
+def _decode_addr(key: int) -> str:
+    n = (key & _COL_MASK) + 1
+    s = ''
+    while n > 0:
+        n, r = divmod(n - 1, 26)
+        s = chr(65 + r) + s
+    return f"{s}{key >> _COL_BITS}"
+
+
+def _intern(v):
+    if type(v) is str and len(v) <= _INTERN_MAX_LEN:
+        return sys.intern(v)
+    return v
+
+
+class CompactSheet(Mapping):
+    """單張工作表的緊湊儲存；以 from_dict 建立，建立後唯讀"""
+
+    __slots__ = ('_keys', '_fidx', '_ftable', '_values', '_flags', '_cached_extra', '_frame')
+
+    def __init__(self):
+        self._keys = array('q')
+        self._fidx = array('i')
+        self._ftable = []
+        self._values = []
+        self._flags = bytearray()
+        self._cached_extra = {}
+        self._frame = None  # utils.columnar 的欄式 DataFrame 快取
+
+    @classmethod
+    def from_dict(cls, ws_data) -> Optional['CompactSheet']:
+        """
+        由 {addr: {formula, value, cached_value, external_ref}} 建立；
+        遇到非標準位址或非標準 cell 結構時返回 None（呼叫方保留原 dict）
+        """
+        if isinstance(ws_data, CompactSheet):
+            return ws_data
+        rows = []
+        for addr, cell in ws_data.items():
+            key = _encode_addr(addr)
+            if key < 0 or not isinstance(cell, dict) or cell.keys() != CELL_KEYS:
+                return None
+            if type(cell["external_ref"]) is not bool:
+                return None
+            rows.append((key, cell))
+        rows.sort(key=lambda kv: kv[0])
+
+        sheet = cls()
+        fpos = {}
+        for i, (key, cell) in enumerate(rows):
+            sheet._keys.append(key)
+            f = cell["formula"]
+            if f is None:
+                sheet._fidx.append(-1)
+            else:
+                idx = fpos.get(f)
+                if idx is None:
+                    idx = fpos[f] = len(sheet._ftable)
+                    sheet._ftable.append(f)
+                sheet._fidx.append(idx)
+            v = cell["value"]
+            cv = cell["cached_value"]
+            flag = _F_EXTERNAL if cell["external_ref"] else 0
+            if cv is None and v is not None:
+                flag |= _F_CACHED_NONE
+            elif cv is not v and (type(cv) is not type(v) or cv != v):
+                flag |= _F_CACHED_OTHER
+                sheet._cached_extra[i] = _intern(cv)
+            sheet._values.append(_intern(v))
+            sheet._flags.append(flag)
+        return sheet
+
+    def _cell_at(self, i: int) -> dict:
+        fi = self._fidx[i]
+        v = self._values[i]
+        flag = self._flags[i]
+        if flag & _F_CACHED_OTHER:
+            cv = self._cached_extra[i]
+        elif flag & _F_CACHED_NONE:
+            cv = None
+        else:
+            cv = v
+        return {
+            "formula": self._ftable[fi] if fi >= 0 else None,
+            "value": v,
+            "cached_value": cv,
+            "external_ref": bool(flag & _F_EXTERNAL),
+        }
+
+    def _index(self, addr) -> int:
+        key = _encode_addr(addr)
+        if key < 0:
+            return -1
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            return i
+        return -1
+
+    def __getitem__(self, addr) -> dict:
+        i = self._index(addr)
+        if i < 0:
+            raise KeyError(addr)
+        return self._cell_at(i)
+
+    def __contains__(self, addr) -> bool:
+        return self._index(addr) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        for key in self._keys:
+            yield _decode_addr(key)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def items(self):
+        for i, key in enumerate(self._keys):
+            yield _decode_addr(key), self._cell_at(i)
+
+    def values(self):
+        for i in range(len(self._keys)):
+            yield self._cell_at(i)
+
+    def rows_between(self, min_row: int, max_row: int) -> Dict[str, dict]:
+        """以 bisect 取出 min_row..max_row（含）列範圍內的儲存格"""
+        lo = bisect.bisect_left(self._keys, max(min_row, 0) << _COL_BITS)
+        hi = bisect.bisect_left(self._keys, (max_row + 1) << _COL_BITS)
+        return {_decode_addr(self._keys[i]): self._cell_at(i) for i in range(lo, hi)}
+
+    def __eq__(self, other):
+        if isinstance(other, CompactSheet):
+            if self._keys != other._keys or self._flags != other._flags:
+                return False
+            for i in range(len(self._keys)):
+                if self._cell_at(i) != other._cell_at(i):
+                    return False
+            return True
+        if isinstance(other, Mapping):
+            if len(self) != len(other):
+                return False
+            for addr, cell in self.items():
+                if other.get(addr) != cell:
+                    return False
+            return True
+        return NotImplemented
+
+    __hash__ = None
+
+    def to_dict(self) -> Dict[str, dict]:
+        return dict(self.items())
+
+    def __reduce__(self):
+        # pickle / deepcopy 時以一般 dict 還原（與舊格式一致）
+        return (CompactSheet.from_dict, (self.to_dict(),))
+
+    def __repr__(self):
+        return f"CompactSheet(cells={len(self)}, formulas={len(self._ftable)})"
+
+
+def compact_cells(cells):
+    """
+    將 {sheet: {addr: cell}} 轉為 {sheet: CompactSheet}；無法轉換的工作表保留原 dict。
+    cells 為 None 時原樣返回。
+    """
+    if not cells:
+        return cells
+    out = {}
+    for name, ws_data in cells.items():
+        sheet = CompactSheet.from_dict(ws_data) if isinstance(ws_data, Mapping) else None
+        out[name] = sheet if sheet is not None else ws_data
+    return out
+
+
+def expand_cells(cells):
+    """還原為純 dict 結構（需要修改內容時使用）"""
+    if not cells:
+        return cells
+    return {name: (ws.to_dict() if isinstance(ws, CompactSheet) else ws) for name, ws in cells.items()}
+
+
+def json_default(o):
+    """json.dump(s) 的 default hook：CompactSheet 及其他 Mapping 以 dict 輸出（格式與舊版一致）"""
+    if isinstance(o, CompactSheet):
+        return o.to_dict()
+    if isinstance(o, Mapping):
+        return dict(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
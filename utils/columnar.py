@@ -0,0 +1,126 @@
+"""
+欄式（Polars）工作表模型：供大型工作表快速找出有差異的儲存格
+- 每張表轉為 DataFrame：key(row<<14|col) / row / col / formula / value / cached / ext
+- 差異以 key 做 full join 後向量化比較，只把「可能有變」的位址交回 Python 做精確分類
+- 值欄以「型別標記 + 字串」編碼（'s:abc'、'b:1'、'int:3'），避免 True / 'True' 之類混淆；
+  編碼相同必定原值相同，編碼不同才需要 Python 再確認（例如 1 與 1.0），因此結果只會是超集
+- 未安裝 polars 或位址無法編碼時返回 None，由呼叫方回退原本的逐格比較
+"""
+from typing import List, Optional, Set
+
+try:
+    import polars as pl
+    HAS_POLARS = True
+except ImportError:
+    pl = None
+    HAS_POLARS = False
+
+from utils.cell_store import CompactSheet, _encode_addr, _decode_addr, _COL_BITS
+from utils.content_tree import ROW_BLOCK
+
+
+def _enc(v):
+    if v is None:
+        return None
+    t = type(v)
+    if t is str:
+        return 's:' + v
+    if t is bool:
+        return 'b:1' if v else 'b:0'
+    return f"{t.__name__}:{v!r}"
+
+
+def sheet_frame(ws) -> Optional["pl.DataFrame"]:
+    """
+    將單張工作表（CompactSheet 或 {addr: cell} dict）轉為欄式 DataFrame；
+    CompactSheet 直接由平行陣列建立，並快取在物件上（基準線工作表可重複使用）
+    """
+    if not HAS_POLARS or ws is None:
+        return None
+    if isinstance(ws, CompactSheet):
+        cached = getattr(ws, '_frame', None)
+        if cached is not None:
+            return cached
+        ftable = ws._ftable
+        n = len(ws._keys)
+        formulas = [ftable[i] if i >= 0 else None for i in ws._fidx]
+        values = [_enc(v) for v in ws._values]
+        cached_col = []
+        for i in range(n):
+            cell = ws._cell_at(i) if ws._flags[i] & 6 else None
+            cached_col.append(_enc(cell['cached_value']) if cell is not None else values[i])
+        df = pl.DataFrame({
+            'key': pl.Series(ws._keys, dtype=pl.Int64),
+            'formula': pl.Series(formulas, dtype=pl.Utf8),
+            'value': pl.Series(values, dtype=pl.Utf8),
+            'cached': pl.Series(cached_col, dtype=pl.Utf8),
+            'ext': pl.Series([bool(f & 1) for f in ws._flags], dtype=pl.Boolean),
+        })
+        df = _with_row_col(df)
+        ws._frame = df
+        return df
+
+    keys, formulas, values, cached_col, ext = [], [], [], [], []
+    for addr, cell in ws.items():
+        k = _encode_addr(addr)
+        if k < 0 or not isinstance(cell, dict):
+            return None
+        keys.append(k)
+        formulas.append(cell.get('formula'))
+        values.append(_enc(cell.get('value')))
+        cached_col.append(_enc(cell.get('cached_value')))
+        ext.append(bool(cell.get('external_ref', False)))
+    try:
+        df = pl.DataFrame({
+            'key': pl.Series(keys, dtype=pl.Int64),
+            'formula': pl.Series([None if f is None else str(f) for f in formulas], dtype=pl.Utf8),
+            'value': pl.Series(values, dtype=pl.Utf8),
+            'cached': pl.Series(cached_col, dtype=pl.Utf8),
+            'ext': pl.Series(ext, dtype=pl.Boolean),
+        })
+    except Exception:
+        return None
+    return _with_row_col(df)
+
+
+def _with_row_col(df):
+    return df.with_columns(
+        (pl.col('key') // (1 << _COL_BITS)).alias('row'),
+        ((pl.col('key') % (1 << _COL_BITS)) + 1).alias('col'),
+        pl.lit(True).alias('present'),
+    )
+
+
+def changed_addresses(old_ws, new_ws, blocks: Optional[Set[int]] = None,
+                      block_rows: int = ROW_BLOCK) -> Optional[List[str]]:
+    """
+    以 (row, col) full join 找出可能有差異的位址（依列、欄排序）；
+    blocks 給定時只返回這些列區塊（row // block_rows）內的位址，對應內容樹的變更區塊；
+    返回 None 表示不宜使用欄式比較（未安裝 polars、資料無法編碼，或任一方不是 CompactSheet——
+    由 dict 逐格建 DataFrame 的成本已高於直接逐格比較）
+    """
+    if not HAS_POLARS or not isinstance(old_ws, CompactSheet) or not isinstance(new_ws, CompactSheet):
+        return None
+    try:
+        a = sheet_frame(old_ws)
+        b = sheet_frame(new_ws)
+        if a is None or b is None:
+            return None
+        cols = ['key', 'present', 'formula', 'value', 'cached', 'ext']
+        if blocks is not None:
+            if not blocks:
+                return []
+            blist = sorted(blocks)
+            a = a.filter((pl.col('row') // block_rows).is_in(blist))
+            b = b.filter((pl.col('row') // block_rows).is_in(blist))
+        j = a.select(cols).join(b.select(cols), on='key', how='full', coalesce=True, suffix='_new')
+        diff = j.filter(
+            pl.col('present').ne_missing(pl.col('present_new'))
+            | pl.col('formula').ne_missing(pl.col('formula_new'))
+            | pl.col('value').ne_missing(pl.col('value_new'))
+            | pl.col('cached').ne_missing(pl.col('cached_new'))
+            | pl.col('ext').ne_missing(pl.col('ext_new'))
+        ).sort('key')
+        return [_decode_addr(k) for k in diff['key'].to_list()]
+    except Exception:
+        return None
@@ -28,6 +28,7 @@ except ImportError as e:
     print("[WARNING] 請執行: pip install zstandard")
 
 import config.settings as settings
+from utils.cell_store import json_default
 
 class CompressionFormat:
     """壓縮格式枚舉"""
@@ -169,7 +170,7 @@ def save_compressed_file(filepath, data, format_type=None, level=None):
     
     # 準備數據
     if isinstance(data, dict):
-        json_data = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        json_data = json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=json_default)
     else:
         json_data = str(data)
     
@@ -178,7 +179,7 @@ def save_compressed_file(filepath, data, format_type=None, level=None):
         data_with_timestamp = data.copy()
         data_with_timestamp['timestamp'] = datetime.now().isoformat()
         data_with_timestamp['compression_format'] = format_type
-        json_data = json.dumps(data_with_timestamp, ensure_ascii=False, separators=(',', ':'))
+        json_data = json.dumps(data_with_timestamp, ensure_ascii=False, separators=(',', ':'), default=json_default)
     
     # 壓縮數據
     compressed_data = compress_data(json_data, format_type, level)
@@ -263,6 +264,11 @@ def get_compression_stats(filepath):
     """
     if not os.path.exists(filepath):
         return None
+
+    # 分段基準線容器：原始大小取自檔尾索引
+    from utils.baseline_container import is_container, container_stats
+    if is_container(filepath):
+        return container_stats(filepath)
     
     format_type = CompressionFormat.detect_format(filepath)
     file_size = os.path.getsize(filepath)
@@ -0,0 +1,146 @@
+"""
+階層式內容雜湊（Merkle tree）：workbook → sheet → row block → cell
+- cell：blake2b(位址 + formula/value/cached_value/external_ref 的 repr)，型別不同即雜湊不同
+- row block：同一區塊（預設每 256 列）內 cell 雜湊相加（mod 2^128），與 dict 迭代順序無關
+- sheet：依區塊編號排序後串接再雜湊；workbook root：依工作表名稱排序後串接再雜湊（與舊版 sort_keys 一致，不受工作表順序影響）
+- 基準線保存 content_tree，content_hash 即 root；比較時 root 相同即無變更，否則只需進入雜湊不同的工作表 / 區塊
+"""
+import hashlib
+from typing import Dict, Iterable, Optional, Set
+
+from utils.cell_store import CompactSheet, _COL_BITS, _decode_addr
+
+TREE_VERSION = 1
+ROW_BLOCK = 256
+_MOD = 1 << 128
+
+
+def _row_of(addr: str) -> int:
+    i = 0
+    n = len(addr)
+    while i < n and addr[i].isalpha():
+        i += 1
+    try:
+        return int(addr[i:])
+    except ValueError:
+        return 0
+
+
+def _digest(addr, formula, value, cached_value, external_ref) -> int:
+    payload = f"{addr}\x1f{formula!r}\x1f{value!r}\x1f{cached_value!r}\x1f{bool(external_ref)}"
+    return int.from_bytes(hashlib.blake2b(payload.encode('utf-8'), digest_size=16).digest(), 'big')
+
+
+def _cell_digest(addr, cell) -> int:
+    return _digest(addr, cell.get('formula'), cell.get('value'),
+                   cell.get('cached_value'), cell.get('external_ref', False))
+
+
+def _sheet_blocks(ws, block_rows: int) -> Dict[str, int]:
+    blocks: Dict[int, int] = {}
+    if isinstance(ws, CompactSheet):
+        # 直接讀平行陣列，毋須逐格組 dict
+        shift = _COL_BITS
+        ftable, fidx, values, flags = ws._ftable, ws._fidx, ws._values, ws._flags
+        for i, key in enumerate(ws._keys):
+            fi = fidx[i]
+            v = values[i]
+            flag = flags[i]
+            cv = ws._cached_extra[i] if flag & 4 else (None if flag & 2 else v)
+            d = _digest(_decode_addr(key), ftable[fi] if fi >= 0 else None, v, cv, flag & 1)
+            b = (key >> shift) // block_rows
+            blocks[b] = (blocks.get(b, 0) + d) % _MOD
+    else:
+        for addr, cell in ws.items():
+            b = _row_of(str(addr)) // block_rows
+            blocks[b] = (blocks.get(b, 0) + _cell_digest(addr, cell or {})) % _MOD
+    return {str(b): f"{h:032x}" for b, h in sorted(blocks.items())}
+
+
+def _sheet_hash(name: str, blocks: Dict[str, str]) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    h.update(name.encode('utf-8'))
+    for b in sorted(blocks, key=int):
+        h.update(f"\x1e{b}:{blocks[b]}".encode('ascii'))
+    return h.hexdigest()
+
+
+def build_content_tree(cells, prev_tree: Optional[dict] = None,
+                       reuse_sheets: Iterable[str] = (), block_rows: int = ROW_BLOCK) -> Optional[dict]:
+    """
+    計算 {sheet: {addr: cell}} 的內容樹：
+      {'v': 1, 'block_rows': 256, 'root': hex, 'sheets': {name: {'hash': hex, 'blocks': {block: hex}}}}
+    - reuse_sheets：已知內容未變（例如 part 指紋相同而沿用基準線）的工作表，直接沿用 prev_tree 的子樹
+    """
+    if cells is None:
+        return None
+    reuse = set(reuse_sheets or ())
+    prev_sheets = {}
+    if prev_tree and prev_tree.get('v') == TREE_VERSION and prev_tree.get('block_rows') == block_rows:
+        prev_sheets = prev_tree.get('sheets') or {}
+    sheets = {}
+    # 先看名稱再取值：沿用的工作表不需取出內容（分段基準線的 LazyCells 因此不會解碼）
+    for name in cells:
+        if name in reuse and name in prev_sheets:
+            sheets[name] = prev_sheets[name]
+            continue
+        ws = cells[name]
+        blocks = _sheet_blocks(ws or {}, block_rows)
+        sheets[name] = {'hash': _sheet_hash(name, blocks), 'blocks': blocks}
+    root = hashlib.blake2b(digest_size=16)
+    for name in sorted(sheets):
+        root.update(f"\x1d{name}\x1f{sheets[name]['hash']}".encode('utf-8'))
+    return {'v': TREE_VERSION, 'block_rows': block_rows, 'root': root.hexdigest(), 'sheets': sheets}
+
+
+def tree_root(tree: Optional[dict]) -> Optional[str]:
+    if not tree or tree.get('v') != TREE_VERSION:
+        return None
+    return tree.get('root')
+
+
+def diff_trees(old_tree: Optional[dict], new_tree: Optional[dict]) -> Optional[Dict[str, Optional[Set[int]]]]:
+    """
+    比對兩棵內容樹，返回 {sheet_name: 需檢查的區塊集合}；
+    - 相同的工作表不會出現在結果中（root 相同時返回空 dict）
+    - 只存在於一方的工作表對應 None（需整張比較）
+    - 無法比較（版本 / 區塊大小不同或缺樹）時返回 None
+    """
+    if not old_tree or not new_tree:
+        return None
+    if old_tree.get('v') != TREE_VERSION or new_tree.get('v') != TREE_VERSION:
+        return None
+    if old_tree.get('block_rows') != new_tree.get('block_rows'):
+        return None
+    if old_tree.get('root') == new_tree.get('root'):
+        return {}
+    old_sheets = old_tree.get('sheets') or {}
+    new_sheets = new_tree.get('sheets') or {}
+    out: Dict[str, Optional[Set[int]]] = {}
+    for name in set(old_sheets) | set(new_sheets):
+        a = old_sheets.get(name)
+        b = new_sheets.get(name)
+        if a is None or b is None:
+            out[name] = None
+            continue
+        if a.get('hash') == b.get('hash'):
+            continue
+        ab = a.get('blocks') or {}
+        bb = b.get('blocks') or {}
+        out[name] = {int(k) for k in set(ab) | set(bb) if ab.get(k) != bb.get(k)}
+    return out
+
+
+def restrict_to_blocks(ws, blocks: Optional[Set[int]], block_rows: int = ROW_BLOCK):
+    """只取出指定區塊（列範圍）內的儲存格，返回 {addr: cell}；blocks 為 None 時返回原工作表"""
+    if blocks is None or ws is None:
+        return ws
+    out = {}
+    if isinstance(ws, CompactSheet):
+        for b in sorted(blocks):
+            out.update(ws.rows_between(b * block_rows, (b + 1) * block_rows - 1))
+        return out
+    for addr, cell in ws.items():
+        if _row_of(str(addr)) // block_rows in blocks:
+            out[addr] = cell
+    return out
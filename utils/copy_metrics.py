@@ -0,0 +1,302 @@
+"""
+複製統計（取代每次複製各開一次 ops_log CSV）
+- 記憶體內累計：按引擎、按共享（見 utils.copy_scheduler.share_root）分開的次數、失敗、重試、位元組、
+  耗時直方圖（對數級距）與吞吐量；大小由 copy_to_cache 傳入，不再對網絡路徑重新 stat
+- 每筆複製仍保留一列明細（ops_log/copy_success_*.csv / copy_failures_*.csv 欄位不變），先存於記憶體，
+  由背景計時執行緒每 COPY_METRICS_FLUSH_SEC 秒（或累積 _MAX_PENDING_ROWS 列時立即）一次寫出；
+  累計摘要寫入 ops_log/copy_metrics_<日期>.json（同日重新啟動時接續累計）
+- 執行期查詢：get_copy_metrics().snapshot() / describe()
+- ENABLE_OPS_LOG=False 時只在記憶體累計，不寫檔
+"""
+import os
+import csv
+import json
+import time
+import atexit
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import config.settings as settings
+
+METRICS_VERSION = 1
+# 耗時直方圖上界（秒）；最後一格為 +inf
+LATENCY_BOUNDS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 120.0)
+_MAX_PENDING_ROWS = 500
+
+# 明細欄位與舊版 ops_log 相同（既有的當日檔案可繼續附加）；增量複製的實際傳輸量只記在 JSON 摘要的 transferred
+SUCCESS_HEADER = ['Timestamp', 'Path', 'SizeMB', 'DurationSec', 'Attempts', 'Engine', 'ChunkMB', 'StabilityChecks',
+                  'StabilityInterval', 'StabilityMaxWait', 'STRICT_NO_ORIGINAL_READ']
+FAILURE_HEADER = ['Timestamp', 'Path', 'Error', 'Attempts', 'STRICT_NO_ORIGINAL_READ', 'COPY_CHUNK_SIZE_MB', 'BACKOFF_SEC']
+
+
+def _new_bucket() -> dict:
+    return {'copies': 0, 'failures': 0, 'retries': 0, 'bytes': 0, 'transferred': 0,
+            'seconds': 0.0, 'max_sec': 0.0, 'hist': [0] * (len(LATENCY_BOUNDS) + 1)}
+
+
+def _hist_index(sec: float) -> int:
+    for i, b in enumerate(LATENCY_BOUNDS):
+        if sec <= b:
+            return i
+    return len(LATENCY_BOUNDS)
+
+
+def _percentile(hist: List[int], q: float) -> Optional[float]:
+    """由直方圖估計百分位數（返回該級距上界；落在最後一格返回 None 表示超過最大上界）"""
+    total = sum(hist)
+    if total == 0:
+        return None
+    need = q * total
+    acc = 0
+    for i, n in enumerate(hist):
+        acc += n
+        if acc >= need:
+            return LATENCY_BOUNDS[i] if i < len(LATENCY_BOUNDS) else None
+    return None
+
+
+def _summarize(b: dict) -> dict:
+    out = {k: b[k] for k in ('copies', 'failures', 'retries', 'bytes', 'transferred')}
+    out['seconds'] = round(b['seconds'], 3)
+    out['max_sec'] = round(b['max_sec'], 3)
+    out['mb_per_sec'] = round(b['transferred'] / 1024 / 1024 / b['seconds'], 2) if b['seconds'] > 0 else None
+    out['avg_sec'] = round(b['seconds'] / b['copies'], 3) if b['copies'] else None
+    out['p50_sec'] = _percentile(b['hist'], 0.5)
+    out['p95_sec'] = _percentile(b['hist'], 0.95)
+    out['hist'] = list(b['hist'])
+    return out
+
+
+class CopyMetrics:
+    """以 get_copy_metrics() 取得共用實例"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.day = datetime.now().strftime('%Y%m%d')
+        self.by_engine: Dict[str, dict] = {}
+        self.by_share: Dict[str, dict] = {}
+        self._success_rows: List[list] = []
+        self._failure_rows: List[list] = []
+        self._last_flush = time.time()
+        self._flushing = False
+        self._dirty = False
+        self._loaded_day = None
+        self._timer: Optional[threading.Thread] = None
+
+    # ---- 記錄 ----
+
+    def _share(self, path: str) -> str:
+        try:
+            from utils.copy_scheduler import share_root
+            return share_root(path)
+        except Exception:
+            return ''
+
+    def _roll_day(self) -> None:
+        """跨日：先寫出前一日的資料再歸零（呼叫方持有 _lock）"""
+        today = datetime.now().strftime('%Y%m%d')
+        if today != self.day:
+            pending = (self.day, self._success_rows, self._failure_rows, self._snapshot_locked())
+            self._success_rows, self._failure_rows = [], []
+            self.by_engine, self.by_share = {}, {}
+            self.day = today
+            threading.Thread(target=self._write, args=pending, daemon=True).start()
+
+    def record_success(self, path: str, duration: float, attempts: int, engine: str, chunk_mb: int,
+                       size_bytes: Optional[int] = None, bytes_transferred: Optional[int] = None) -> None:
+        size = int(size_bytes or 0)
+        xfer = int(bytes_transferred if bytes_transferred is not None else size)
+        share = self._share(path)
+        size_mb = f"{size / (1024 * 1024):.2f}" if size_bytes is not None else ''
+        row = [
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'), path, size_mb, f"{duration:.2f}", attempts, engine,
+            int(chunk_mb), int(getattr(settings, 'COPY_STABILITY_CHECKS', 0)),
+            float(getattr(settings, 'COPY_STABILITY_INTERVAL_SEC', 0.0)),
+            float(getattr(settings, 'COPY_STABILITY_MAX_WAIT_SEC', 0.0)),
+            bool(getattr(settings, 'STRICT_NO_ORIGINAL_READ', False)),
+        ]
+        with self._lock:
+            self._roll_day()
+            for b in (self.by_engine.setdefault(engine, _new_bucket()), self.by_share.setdefault(share, _new_bucket())):
+                b['copies'] += 1
+                b['retries'] += max(0, int(attempts) - 1)
+                b['bytes'] += size
+                b['transferred'] += xfer
+                b['seconds'] += duration
+                b['max_sec'] = max(b['max_sec'], duration)
+                b['hist'][_hist_index(duration)] += 1
+            self._success_rows.append(row)
+            self._dirty = True
+        self._maybe_flush()
+
+    def record_failure(self, path: str, error: Exception, attempts: int, strict_mode: bool,
+                       engine: Optional[str] = None) -> None:
+        share = self._share(path)
+        engine = engine or str(getattr(settings, 'COPY_ENGINE', 'python'))
+        row = [
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'), path, str(error), attempts, bool(strict_mode),
+            int(getattr(settings, 'COPY_CHUNK_SIZE_MB', 0)), float(getattr(settings, 'COPY_RETRY_BACKOFF_SEC', 0.0)),
+        ]
+        with self._lock:
+            self._roll_day()
+            for b in (self.by_engine.setdefault(engine, _new_bucket()), self.by_share.setdefault(share, _new_bucket())):
+                b['failures'] += 1
+                b['retries'] += max(0, int(attempts) - 1)
+            self._failure_rows.append(row)
+            self._dirty = True
+        self._maybe_flush()
+
+    # ---- 寫出 ----
+
+    def _flush_interval(self) -> float:
+        try:
+            return max(1.0, float(getattr(settings, 'COPY_METRICS_FLUSH_SEC', 60)))
+        except (TypeError, ValueError):
+            return 60.0
+
+    def _maybe_flush(self) -> None:
+        """到期或累積過多明細時，於背景執行緒寫出（不佔用複製路徑）"""
+        with self._lock:
+            pending = len(self._success_rows) + len(self._failure_rows)
+            due = time.time() - self._last_flush >= self._flush_interval() or pending >= _MAX_PENDING_ROWS
+            if not due or self._flushing:
+                return
+            self._flushing = True
+        threading.Thread(target=self._flush_bg, name='copy-metrics-flush', daemon=True).start()
+
+    def _flush_bg(self) -> None:
+        try:
+            self.flush()
+        finally:
+            with self._lock:
+                self._flushing = False
+
+    def start_timer(self) -> None:
+        """背景計時執行緒：每 COPY_METRICS_FLUSH_SEC 秒寫出一次（期間有新紀錄才寫），突發複製後的明細不必等到下一次複製"""
+        with self._lock:
+            if self._timer is not None and self._timer.is_alive():
+                return
+            self._timer = threading.Thread(target=self._timer_loop, name='copy-metrics-timer', daemon=True)
+            self._timer.start()
+
+    def _timer_loop(self) -> None:
+        while True:
+            time.sleep(self._flush_interval())
+            with self._lock:
+                due = self._dirty and not self._flushing
+            if due:
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"   [copy-metrics] 定時寫出失敗: {e}")
+
+    def flush(self) -> None:
+        with self._lock:
+            pending = (self.day, self._success_rows, self._failure_rows, self._snapshot_locked())
+            self._success_rows, self._failure_rows = [], []
+            self._last_flush = time.time()
+            self._dirty = False
+        self._write(*pending)
+
+    def _base_dir(self) -> str:
+        return os.path.join(getattr(settings, 'LOG_FOLDER', '.'), 'ops_log')
+
+    def _write(self, day: str, success_rows: List[list], failure_rows: List[list], snap: dict) -> None:
+        if not getattr(settings, 'ENABLE_OPS_LOG', True):
+            return
+        with self._flush_lock:
+            try:
+                base_dir = self._base_dir()
+                os.makedirs(base_dir, exist_ok=True)
+                for rows, prefix, header in ((success_rows, 'copy_success', SUCCESS_HEADER),
+                                             (failure_rows, 'copy_failures', FAILURE_HEADER)):
+                    if not rows:
+                        continue
+                    fpath = os.path.join(base_dir, f"{prefix}_{day}.csv")
+                    new_file = not os.path.exists(fpath)
+                    with open(fpath, 'a', encoding='utf-8', newline='') as f:
+                        w = csv.writer(f)
+                        if new_file:
+                            w.writerow(header)
+                        w.writerows(rows)
+                if snap['by_engine'] or snap['by_share']:
+                    path = os.path.join(base_dir, f"copy_metrics_{day}.json")
+                    tmp = f"{path}.tmp{os.getpid()}"
+                    with open(tmp, 'w', encoding='utf-8') as f:
+                        json.dump(snap, f, ensure_ascii=False, separators=(',', ':'))
+                    os.replace(tmp, path)
+            except Exception as e:
+                print(f"   [copy-metrics] 無法寫出統計: {e}")
+
+    def load_day(self) -> None:
+        """同日重新啟動：接續當日已寫出的累計（只在第一次記錄前呼叫）"""
+        with self._lock:
+            if self._loaded_day == self.day:
+                return
+            self._loaded_day = self.day
+            path = os.path.join(self._base_dir(), f"copy_metrics_{self.day}.json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception:
+            return
+        if not isinstance(data, dict) or data.get('version') != METRICS_VERSION or data.get('bounds') != list(LATENCY_BOUNDS):
+            return
+        with self._lock:
+            for attr in ('by_engine', 'by_share'):
+                target = getattr(self, attr)
+                for name, b in (data.get(attr) or {}).items():
+                    t = target.setdefault(name, _new_bucket())
+                    for k in ('copies', 'failures', 'retries', 'bytes', 'transferred', 'seconds'):
+                        t[k] += b.get(k) or 0
+                    t['max_sec'] = max(t['max_sec'], b.get('max_sec') or 0.0)
+                    t['hist'] = [x + y for x, y in zip(t['hist'], b.get('hist') or [0] * len(t['hist']))]
+
+    # ---- 查詢 ----
+
+    def _snapshot_locked(self) -> dict:
+        return {
+            'version': METRICS_VERSION,
+            'day': self.day,
+            'updated': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'bounds': list(LATENCY_BOUNDS),
+            'by_engine': {k: _summarize(v) for k, v in self.by_engine.items()},
+            'by_share': {k: _summarize(v) for k, v in self.by_share.items()},
+        }
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return self._snapshot_locked()
+
+    def describe(self) -> str:
+        snap = self.snapshot()
+        parts = []
+        for name, b in sorted(snap['by_engine'].items()):
+            p50 = f"{b['p50_sec']}s" if b['p50_sec'] is not None else '-'
+            p95 = f"{b['p95_sec']}s" if b['p95_sec'] is not None else '-'
+            rate = f"{b['mb_per_sec']}MB/s" if b['mb_per_sec'] is not None else '-'
+            parts.append(f"{name}: n={b['copies']} fail={b['failures']} retry={b['retries']} "
+                         f"p50<={p50} p95<={p95} max={b['max_sec']}s {rate}")
+        return '; '.join(parts) or 'no copies'
+
+
+_metrics: Optional[CopyMetrics] = None
+_metrics_lock = threading.Lock()
+
+
+def get_copy_metrics() -> CopyMetrics:
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = CopyMetrics()
+            _metrics.load_day()
+            _metrics.start_timer()
+        return _metrics
+
+
+@atexit.register
+def _flush_on_exit():
+    if _metrics is not None:
+        _metrics.flush()
@@ -0,0 +1,262 @@
+"""
+複製排程器（全域協調 copy_to_cache 對網絡共享的讀取）
+- 共享根：UNC 的 \\\\server\\share、磁碟機代號、POSIX 掛載點；同一共享的並行複製數不超過 COPY_MAX_PER_SHARE
+  （所有呼叫方一體適用：observer、比較工作執行緒、基準線迴圈、背景預取）
+- 每個共享可選 bytes/sec 權杖桶（COPY_SHARE_BANDWIDTH_MBPS，0 = 不限）：各複製引擎每讀一個區塊即扣除，
+  無法分塊的子進程引擎（robocopy / PowerShell）於完成後整筆扣除，由下一次複製償還
+- submit() 以 COPY_MAX_WORKERS 個工作執行緒在背景執行 copy_to_cache，返回 Future；
+  同一檔案已在排程中時返回同一個 Future，copy_to_cache 亦會等待該結果而不重複複製
+"""
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+
+import config.settings as settings
+
+_WAIT_SLICE_SEC = 0.25
+
+
+def _stopping() -> bool:
+    return bool(getattr(settings, 'force_stop', False))
+
+
+def _key(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+_mount_cache: Dict[str, str] = {}
+
+
+def share_root(path: str) -> str:
+    """來源所屬共享：\\\\server\\share、'C:' 或掛載點（小寫正規化，作為限流 key）"""
+    p = str(path).replace('/', '\\') if str(path).startswith(('\\\\', '//')) else str(path)
+    if p.startswith('\\\\'):
+        parts = [x for x in p.split('\\') if x]
+        return ('\\\\' + '\\'.join(parts[:2])).lower()
+    drive, _ = os.path.splitdrive(p)
+    if drive:
+        return drive.upper()
+    d = os.path.dirname(os.path.abspath(p))
+    if d in _mount_cache:
+        return _mount_cache[d]
+    cur = d
+    while not os.path.ismount(cur):
+        parent = os.path.dirname(cur)
+        if parent == cur:
+            break
+        cur = parent
+    _mount_cache[d] = cur
+    return cur
+
+
+class _TokenBucket:
+    """權杖桶：容量為一秒的流量；扣除可透支，透支部分以 sleep 償還（停止時立即返回）"""
+
+    def __init__(self, rate_bps: float):
+        self.rate = float(rate_bps)
+        self.tokens = self.rate
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+        self.waited = 0.0
+
+    def consume(self, nbytes: int) -> None:
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.stamp) * self.rate)
+            self.stamp = now
+            self.tokens -= nbytes
+            delay = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if delay > 0:
+            self.waited += delay
+            end = time.monotonic() + delay
+            while not _stopping():
+                left = end - time.monotonic()
+                if left <= 0:
+                    break
+                time.sleep(min(left, _WAIT_SLICE_SEC))
+
+
+class CopyScheduler:
+    """以 get_copy_scheduler() 取得共用實例"""
+
+    def __init__(self):
+        self.max_workers = max(1, int(getattr(settings, 'COPY_MAX_WORKERS', 4) or 1))
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="copy")
+        self.lock = threading.Lock()
+        self._slots: Dict[str, threading.Semaphore] = {}
+        self._slot_limit: Dict[str, int] = {}
+        self._buckets: Dict[str, _TokenBucket] = {}
+        self._active: Dict[str, int] = {}
+        self.inflight: Dict[str, Future] = {}
+        self._tls = threading.local()
+        self.stopped = False
+        self.stats_counts = {'submitted': 0, 'joined': 0, 'completed': 0, 'failed': 0, 'slot_wait_sec': 0.0}
+
+    # ---- 共享並行上限 ----
+
+    def _per_share(self) -> int:
+        return max(1, int(getattr(settings, 'COPY_MAX_PER_SHARE', 2) or 1))
+
+    def _semaphore(self, share: str) -> threading.Semaphore:
+        limit = self._per_share()
+        with self.lock:
+            sem = self._slots.get(share)
+            if sem is None or self._slot_limit.get(share) != limit:
+                # 設定介面可即時修改上限：以新上限建立；舊號誌由持有者自行釋放
+                sem = self._slots[share] = threading.Semaphore(limit)
+                self._slot_limit[share] = limit
+            return sem
+
+    @contextmanager
+    def share_slot(self, path: str):
+        """取得來源所屬共享的一個複製名額；等待期間停止則拋出 OSError"""
+        share = share_root(path)
+        sem = self._semaphore(share)
+        t0 = time.monotonic()
+        while not sem.acquire(timeout=_WAIT_SLICE_SEC):
+            if _stopping():
+                raise OSError('Operation cancelled: stopping')
+        waited = time.monotonic() - t0
+        with self.lock:
+            self.stats_counts['slot_wait_sec'] += waited
+            self._active[share] = self._active.get(share, 0) + 1
+        if waited >= 1.0 and getattr(settings, 'SHOW_DEBUG_MESSAGES', False):
+            print(f"      [copy-sched] 等待共享名額 {waited:.1f}s share={share}")
+        try:
+            yield share
+        finally:
+            with self.lock:
+                self._active[share] = max(0, self._active.get(share, 1) - 1)
+            sem.release()
+
+    # ---- 頻寬 ----
+
+    def throttle(self, path: str, nbytes: int) -> None:
+        """扣除來源共享的權杖（COPY_SHARE_BANDWIDTH_MBPS=0 時不限）"""
+        try:
+            mbps = float(getattr(settings, 'COPY_SHARE_BANDWIDTH_MBPS', 0) or 0)
+        except (TypeError, ValueError):
+            mbps = 0.0
+        if mbps <= 0 or nbytes <= 0:
+            return
+        rate = mbps * 1024 * 1024
+        share = share_root(path)
+        with self.lock:
+            b = self._buckets.get(share)
+            if b is None or b.rate != rate:
+                b = self._buckets[share] = _TokenBucket(rate)
+        b.consume(nbytes)
+
+    # ---- 背景複製 ----
+
+    def submit(self, network_path: str, silent: bool = True) -> Optional[Future]:
+        """在背景執行 copy_to_cache(network_path)；返回 Future（結果同 copy_to_cache）"""
+        if self.stopped or _stopping():
+            return None
+        k = _key(network_path)
+        with self.lock:
+            fut = self.inflight.get(k)
+            if fut is not None and not fut.done():
+                return fut
+            self.stats_counts['submitted'] += 1
+
+        def _run():
+            self._tls.current = k
+            try:
+                from utils.cache import copy_to_cache
+                return copy_to_cache(network_path, silent=silent)
+            finally:
+                self._tls.current = None
+                with self.lock:
+                    if self.inflight.get(k) is fut:
+                        self.inflight.pop(k, None)
+
+        def _done(f):
+            with self.lock:
+                ok = not f.cancelled() and f.exception() is None
+                self.stats_counts['completed' if ok else 'failed'] += 1
+
+        # 持鎖提交：_run 結束時的清理須等 inflight 登記完成
+        with self.lock:
+            fut = self.executor.submit(_run)
+            self.inflight[k] = fut
+        fut.add_done_callback(_done)
+        return fut
+
+    def join_inflight(self, network_path: str) -> Tuple[bool, Optional[str]]:
+        """
+        同一檔案正由背景工作執行緒複製時等待其結果，返回 (True, 結果)；沒有排程中的複製返回 (False, None)。
+        （工作執行緒本身呼叫 copy_to_cache 不會等待自己）
+        """
+        k = _key(network_path)
+        if getattr(self._tls, 'current', None) == k:
+            return False, None
+        with self.lock:
+            fut = self.inflight.get(k)
+        if fut is None:
+            return False, None
+        while True:
+            try:
+                res = fut.result(timeout=_WAIT_SLICE_SEC)
+                with self.lock:
+                    self.stats_counts['joined'] += 1
+                return True, res
+            except FutureTimeout:
+                if _stopping():
+                    return False, None
+            except Exception:
+                return False, None
+
+    def stop(self) -> None:
+        self.stopped = True
+        with self.lock:
+            items = list(self.inflight.values())
+            self.inflight.clear()
+        for fut in items:
+            fut.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return dict(self.stats_counts,
+                        inflight=len(self.inflight),
+                        active={s: n for s, n in self._active.items() if n},
+                        throttled_sec=round(sum(b.waited for b in self._buckets.values()), 2))
+
+    def describe(self) -> str:
+        st = self.stats()
+        return (f"workers={self.max_workers} per_share={self._per_share()} inflight={st['inflight']} "
+                f"submitted={st['submitted']} joined={st['joined']} failed={st['failed']} "
+                f"slot_wait={st['slot_wait_sec']:.1f}s throttled={st['throttled_sec']:.1f}s active={st['active']}")
+
+
+_scheduler: Optional[CopyScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_copy_scheduler() -> CopyScheduler:
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None or _scheduler.stopped:
+            _scheduler = CopyScheduler()
+        return _scheduler
+
+
+def bandwidth_limited() -> bool:
+    try:
+        return float(getattr(settings, 'COPY_SHARE_BANDWIDTH_MBPS', 0) or 0) > 0
+    except (TypeError, ValueError):
+        return False
+
+
+def throttle(path: str, nbytes: int) -> None:
+    """複製引擎每讀一個區塊呼叫一次（未設頻寬上限時不做任何事）"""
+    if bandwidth_limited():
+        get_copy_scheduler().throttle(path, nbytes)
+
+
+def submit_copy(network_path: str, silent: bool = True) -> Optional[Future]:
+    return get_copy_scheduler().submit(network_path, silent=silent)
@@ -0,0 +1,229 @@
+"""
+增量複製（COPY_ENGINE='delta'）
+- 以 zip member 作為「區塊」：xlsx / xlsm 每次儲存通常只改動少數 part，其餘 part 的壓縮內容逐位元組相同
+- 只從來源讀取 central directory（檔尾數十 KB），以 (名稱, CRC, 壓縮大小, 原始大小, 壓縮方式) 對照現有快取副本；
+  相同的 member 直接從本地副本搬移壓縮內容，只有變更的 member、各 local header 與 central directory 需經網絡讀取
+- 網絡共享是掛載的檔案系統（SMB / CIFS），無法在來源端計算區塊校驗，故不採 rsync 的滾動校驗；
+  zip 結構本身已提供每個 part 的 CRC，作用等同區塊校驗
+- 組合結果寫入暫存檔，核對大小並以 zipfile 解壓重用的 member 驗證 CRC 後才替換快取副本；
+  任何一步不符（非 zip、沒有舊副本、來源於複製期間改變、驗證失敗）即回退完整複製
+"""
+import os
+import shutil
+import struct
+import zipfile
+from typing import Dict, List, Optional, Tuple
+
+import config.settings as settings
+from utils.copy_scheduler import throttle
+
+_LOCAL_HDR = struct.Struct('<4s2B4HL2L2H')
+_LOCAL_SIG = b'PK\x03\x04'
+# 小於此大小的 member 與相鄰內容合併讀取，省去額外的 header 讀取往返
+_MIN_REUSE_BYTES = 64 * 1024
+
+
+class _CountingReader:
+    """包裝來源檔案物件，統計實際讀取位元組（供 zipfile 讀 central directory 使用）"""
+
+    def __init__(self, fp):
+        self._fp = fp
+        self.bytes_read = 0
+
+    def read(self, n=-1):
+        data = self._fp.read(n)
+        self.bytes_read += len(data)
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._fp, name)
+
+
+def _check_stop():
+    if getattr(settings, 'force_stop', False):
+        raise OSError('Operation cancelled: stopping')
+
+
+def _member_key(info: zipfile.ZipInfo) -> Tuple:
+    return (info.filename, info.CRC, info.compress_size, info.file_size, info.compress_type)
+
+
+def _read_exact(fp, offset: int, length: int) -> bytes:
+    fp.seek(offset)
+    data = fp.read(length)
+    if len(data) != length:
+        raise OSError(f"short read at {offset}: {len(data)}/{length}")
+    return data
+
+
+def _data_offset(fp, info: zipfile.ZipInfo) -> Tuple[int, bytes]:
+    """讀取 local header，返回 (壓縮內容起點, header 位元組)"""
+    fixed = _read_exact(fp, info.header_offset, _LOCAL_HDR.size)
+    fields = _LOCAL_HDR.unpack(fixed)
+    if fields[0] != _LOCAL_SIG:
+        raise zipfile.BadZipFile(f"bad local header for {info.filename}")
+    var = _read_exact(fp, info.header_offset + _LOCAL_HDR.size, fields[10] + fields[11])
+    return info.header_offset + _LOCAL_HDR.size + len(var), fixed + var
+
+
+def _index_old_copy(path: str) -> Dict[Tuple, int]:
+    """現有快取副本：member key -> 壓縮內容起點（全在本地磁碟）"""
+    out = {}
+    with open(path, 'rb') as fp, zipfile.ZipFile(fp) as z:
+        for info in z.infolist():
+            if info.compress_size < _MIN_REUSE_BYTES:
+                continue
+            try:
+                out[_member_key(info)] = _data_offset(fp, info)[0]
+            except Exception:
+                continue
+    return out
+
+
+def _plan(src_fp, src_size: int, old_index: Dict[Tuple, int]):
+    """
+    依來源 central directory 建立寫出計劃：[('src', off, len) | ('old', off, len) | ('bytes', data)]；
+    返回 (計劃, 重用的 member 名稱, 重用位元組)
+    """
+    counter = _CountingReader(src_fp)
+    with zipfile.ZipFile(counter) as zs:
+        infos = sorted(zs.infolist(), key=lambda i: i.header_offset)
+        cd_start = zs.start_dir
+    plan: List[tuple] = []
+    reused: List[str] = []
+    reused_bytes = 0
+
+    def add_src(off, length):
+        if length <= 0:
+            return
+        if plan and plan[-1][0] == 'src' and plan[-1][1] + plan[-1][2] == off:
+            plan[-1] = ('src', plan[-1][1], plan[-1][2] + length)
+        else:
+            plan.append(('src', off, length))
+
+    pos = 0
+    for i, info in enumerate(infos):
+        h = info.header_offset
+        nxt = infos[i + 1].header_offset if i + 1 < len(infos) else cd_start
+        add_src(pos, h - pos)
+        old_off = old_index.get(_member_key(info)) if info.compress_size >= _MIN_REUSE_BYTES else None
+        if old_off is None:
+            add_src(h, nxt - h)
+        else:
+            d, hdr = _data_offset(src_fp, info)
+            plan.append(('bytes', hdr))
+            plan.append(('old', old_off, info.compress_size))
+            add_src(d + info.compress_size, nxt - (d + info.compress_size))
+            reused.append(info.filename)
+            reused_bytes += info.compress_size
+        pos = nxt
+    add_src(pos, src_size - pos)
+    return plan, reused, reused_bytes, counter.bytes_read
+
+
+def _copy_range(fsrc, fdst, offset: int, length: int, chunk: int, throttle_path: Optional[str] = None) -> None:
+    """throttle_path：從網絡來源讀取時按來源共享限流（本地舊副本不限）"""
+    fsrc.seek(offset)
+    left = length
+    while left > 0:
+        _check_stop()
+        buf = fsrc.read(min(chunk, left))
+        if not buf:
+            raise OSError(f"unexpected EOF at {offset + length - left}")
+        if throttle_path:
+            throttle(throttle_path, len(buf))
+        fdst.write(buf)
+        left -= len(buf)
+
+
+def _full_copy(src: str, tmp: str, chunk: int) -> int:
+    with open(src, 'rb', buffering=0) as fsrc, open(tmp, 'wb') as fdst:
+        total = 0
+        while True:
+            _check_stop()
+            buf = fsrc.read(chunk)
+            if not buf:
+                break
+            throttle(src, len(buf))
+            fdst.write(buf)
+            total += len(buf)
+    return total
+
+
+def delta_copy(src: str, dst: str, chunk_mb: int = 4) -> dict:
+    """
+    將 src 複製到 dst；dst 已存在且兩者都是 zip 時只傳輸變更的 member。
+    返回 {'mode': 'delta'|'full', 'bytes_total', 'bytes_transferred', 'reused_members', 'reused_bytes'}；
+    失敗時拋出 OSError（由 copy_to_cache 重試）
+    """
+    chunk = max(1, int(chunk_mb or 4)) * 1024 * 1024
+    st0 = os.stat(src)
+    stats = {'mode': 'full', 'bytes_total': st0.st_size, 'bytes_transferred': 0,
+             'reused_members': 0, 'reused_bytes': 0}
+    tmp = f"{dst}.delta{os.getpid()}.tmp"
+    min_mb = float(getattr(settings, 'DELTA_COPY_MIN_SIZE_MB', 0) or 0)
+    try:
+        done = False
+        if os.path.exists(dst) and st0.st_size >= min_mb * 1024 * 1024:
+            try:
+                old_index = _index_old_copy(dst)
+            except Exception:
+                old_index = {}
+            if old_index:
+                try:
+                    done = _delta_build(src, dst, tmp, st0, old_index, chunk, stats)
+                except zipfile.BadZipFile as e:
+                    print(f"      [delta-copy] 回退完整複製: {e}")
+        if not done:
+            stats.update(mode='full', reused_members=0, reused_bytes=0)
+            stats['bytes_transferred'] = _full_copy(src, tmp, chunk)
+        st1 = os.stat(src)
+        if (st1.st_size, st1.st_mtime) != (st0.st_size, st0.st_mtime):
+            raise OSError('source changed during copy')
+        try:
+            shutil.copystat(src, tmp)
+        except Exception:
+            pass
+        os.replace(tmp, dst)
+        return stats
+    finally:
+        try:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+        except OSError:
+            pass
+
+
+def _delta_build(src, dst, tmp, st0, old_index, chunk, stats) -> bool:
+    """按計劃組合暫存檔並驗證；驗證不符返回 False（呼叫方改為完整複製）"""
+    with open(src, 'rb', buffering=0) as fsrc:
+        plan, reused, reused_bytes, cd_bytes = _plan(fsrc, st0.st_size, old_index)
+        if not reused:
+            return False
+        transferred = cd_bytes
+        with open(dst, 'rb') as fold, open(tmp, 'wb') as fdst:
+            for step in plan:
+                if step[0] == 'bytes':
+                    fdst.write(step[1])
+                    transferred += len(step[1])
+                elif step[0] == 'old':
+                    _copy_range(fold, fdst, step[1], step[2], chunk)
+                else:
+                    _copy_range(fsrc, fdst, step[1], step[2], chunk, throttle_path=src)
+                    transferred += step[2]
+    if os.path.getsize(tmp) != st0.st_size:
+        print("      [delta-copy] 大小不符，回退完整複製")
+        return False
+    try:
+        with zipfile.ZipFile(tmp) as zt:
+            for name in reused:
+                with zt.open(name) as f:
+                    while f.read(chunk):
+                        pass
+    except Exception as e:
+        print(f"      [delta-copy] 驗證失敗，回退完整複製: {e}")
+        return False
+    stats.update(mode='delta', bytes_transferred=transferred,
+                 reused_members=len(reused), reused_bytes=reused_bytes)
+    return True
+
@@ -10,6 +10,7 @@ import json
 from datetime import datetime
 from typing import Dict, Any, Optional
 import config.settings as settings
+from utils.cell_store import json_default
 
 try:
     from utils.helpers import _baseline_key_for_path
@@ -185,7 +186,7 @@ def sync_history_to_git_repo(file_path: str,
         out_name = f"{_now_stamp()}.cells.json"
         out_path = os.path.join(target_dir, out_name)
         with open(out_path, 'w', encoding='utf-8') as f:
-            json.dump(payload, f, ensure_ascii=False, indent=2)
+            json.dump(payload, f, ensure_ascii=False, indent=2, default=json_default)
         # 若已禁用 Git 整合，僅落地 JSON，不嘗試提交
         if getattr(settings, 'DISABLE_GIT_INTEGRATION', False):
             return out_path
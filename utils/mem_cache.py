@@ -0,0 +1,225 @@
+"""
+記憶體快取副本（IN_MEMORY_COPY_MAX_MB）
+- 小於門檻的來源檔，copy_to_cache 只讀取一次到記憶體（bytes），不寫快取檔、不需 COPY_POST_SLEEP_SEC
+- 以「本應寫入的快取檔路徑」作 key：copy_to_cache 照常返回該路徑字串，各讀取方以 local_source(path)
+  取得共用的 BytesIO（openpyxl、值引擎、extract_external_refs、get_excel_last_author、part 指紋皆直接解析）
+- 需要實體檔案的讀取方（xlsx2csv 子進程、多進程工作表解析）以 materialize(path) 即時落地
+- 總量上限 IN_MEMORY_COPY_TOTAL_MB，超出時按最久未使用釋放（正被解析、已 pin 的副本除外）
+- 來源更新時，已 pin 的副本不會即時釋放（解析中的讀取方仍需要它）：只標記為過時，
+  由下一次 store 原子替換，或於最後一個 pin 解除時釋放（release_if_stale）
+"""
+import io
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+import config.settings as settings
+from utils.copy_scheduler import throttle
+
+_lock = threading.Lock()
+_entries: "OrderedDict[str, dict]" = OrderedDict()   # key -> {'data', 'path', 'src', 'src_mtime', 'src_size'}
+_stats = {'loads': 0, 'hits': 0, 'bytes_loaded': 0, 'released': 0, 'materialized': 0}
+
+
+def _key(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def threshold_bytes() -> int:
+    return int(float(getattr(settings, 'IN_MEMORY_COPY_MAX_MB', 0) or 0) * 1024 * 1024)
+
+
+def should_load(size: Optional[int]) -> bool:
+    """來源大小不超過門檻時走記憶體路徑（0 表示停用）"""
+    limit = threshold_bytes()
+    return limit > 0 and size is not None and 0 < size <= limit
+
+
+def read_source(src: str, chunk_mb: int = 4) -> Tuple[bytes, os.stat_result]:
+    """一次讀入來源檔；讀取期間大小或 mtime 改變時拋出 OSError（由 copy_to_cache 重試）"""
+    chunk = max(1, int(chunk_mb or 4)) * 1024 * 1024
+    st0 = os.stat(src)
+    buf = bytearray()
+    with open(src, 'rb', buffering=0) as f:
+        while True:
+            if getattr(settings, 'force_stop', False):
+                raise OSError('Operation cancelled: stopping')
+            part = f.read(chunk)
+            if not part:
+                break
+            throttle(src, len(part))
+            buf += part
+    st1 = os.stat(src)
+    if len(buf) != st1.st_size or (st1.st_size, st1.st_mtime) != (st0.st_size, st0.st_mtime):
+        raise OSError('source changed during copy')
+    return bytes(buf), st1
+
+
+def store(path: str, src: str, data: bytes, src_stat: os.stat_result) -> None:
+    with _lock:
+        _entries[_key(path)] = {
+            'data': data, 'path': path, 'src': src,
+            'src_mtime': src_stat.st_mtime, 'src_size': src_stat.st_size,
+        }
+        _entries.move_to_end(_key(path))
+        _stats['loads'] += 1
+        _stats['bytes_loaded'] += len(data)
+    _enforce_budget(keep=_key(path))
+
+
+def lookup_fresh(path: str, src: str) -> bool:
+    """記憶體副本存在且來源未再修改（與磁碟快取「快取 mtime >= 來源 mtime」同義）"""
+    with _lock:
+        e = _entries.get(_key(path))
+    if e is None:
+        return False
+    if not should_load(e['src_size']):
+        # 門檻已調低或停用（設定介面可即時更改）：改回磁碟快取；正被解析時先沿用記憶體副本
+        return not _release_unless_pinned(path)
+    try:
+        st = os.stat(src)
+    except OSError:
+        return False
+    if st.st_mtime <= e['src_mtime'] and st.st_size == e['src_size']:
+        with _lock:
+            if _key(path) in _entries:
+                _entries.move_to_end(_key(path))
+            _stats['hits'] += 1
+        return True
+    # 來源已更新：釋放舊內容，避免讀取方經 local_source 取得過時副本（已 pin 者只標記過時）
+    _release_unless_pinned(path)
+    return False
+
+
+def get_bytes(path) -> Optional[bytes]:
+    if not isinstance(path, str):
+        return None
+    with _lock:
+        e = _entries.get(_key(path))
+        return e['data'] if e is not None else None
+
+
+def local_source(path):
+    """記憶體中有此副本時返回 BytesIO（共用同一份 bytes），否則原樣返回路徑"""
+    data = get_bytes(path)
+    return io.BytesIO(data) if data is not None else path
+
+
+def is_in_memory(path) -> bool:
+    return get_bytes(path) is not None
+
+
+def exists(path) -> bool:
+    return is_in_memory(path) or (isinstance(path, str) and os.path.exists(path))
+
+
+def getsize(path) -> int:
+    data = get_bytes(path)
+    return len(data) if data is not None else os.path.getsize(path)
+
+
+def materialize(path: str) -> str:
+    """記憶體副本寫成實體快取檔（mtime 設為來源 mtime），返回路徑；本來就在磁碟的直接返回"""
+    with _lock:
+        e = _entries.get(_key(path))
+    if e is None:
+        return path
+    try:
+        if os.path.exists(path) and os.path.getmtime(path) >= e['src_mtime'] and os.path.getsize(path) == len(e['data']):
+            return path
+    except OSError:
+        pass
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f"{path}.mem{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(e['data'])
+        os.utime(tmp, (time.time(), e['src_mtime']))
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+    with _lock:
+        _stats['materialized'] += 1
+    try:
+        from utils.cache_manager import get_cache_manager
+        mgr = get_cache_manager()
+        if mgr is not None:
+            mgr.record_store(path, e['src'])
+    except Exception:
+        pass
+    return path
+
+
+def release(path: str) -> None:
+    with _lock:
+        if _entries.pop(_key(path), None) is not None:
+            _stats['released'] += 1
+
+
+def _release_unless_pinned(path: str) -> bool:
+    """未被 pin 時釋放並返回 True；已 pin 時保留內容、標記為過時並返回 False"""
+    if not _pinned(path):
+        release(path)
+        return True
+    with _lock:
+        e = _entries.get(_key(path))
+        if e is not None:
+            e['stale'] = True
+    return False
+
+
+def release_if_stale(path: str) -> None:
+    """最後一個 pin 解除後呼叫：釋放期間被標記為過時、且未被新內容替換的副本"""
+    if _pinned(path):
+        return
+    with _lock:
+        e = _entries.get(_key(path))
+        if e is not None and e.get('stale'):
+            _entries.pop(_key(path), None)
+            _stats['released'] += 1
+
+
+def _pinned(path: str) -> bool:
+    try:
+        from utils.cache_manager import get_cache_manager
+        mgr = get_cache_manager()
+        return bool(mgr and mgr.is_pinned(path))
+    except Exception:
+        return False
+
+
+def _enforce_budget(keep: Optional[str] = None) -> None:
+    budget = int(float(getattr(settings, 'IN_MEMORY_COPY_TOTAL_MB', 0) or 0) * 1024 * 1024)
+    if budget <= 0:
+        return
+    with _lock:
+        total = sum(len(e['data']) for e in _entries.values())
+        candidates = [(k, e['path']) for k, e in _entries.items() if k != keep]
+    for k, p in candidates:
+        if total <= budget:
+            break
+        if _pinned(p):
+            continue
+        with _lock:
+            e = _entries.pop(k, None)
+            if e is None:
+                continue
+            total -= len(e['data'])
+            _stats['released'] += 1
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_stats, files=len(_entries), bytes=sum(len(e['data']) for e in _entries.values()))
+
+
+def describe() -> str:
+    st = stats()
+    return (f"files={st['files']} size={st['bytes'] / 1024 / 1024:.1f}MB loads={st['loads']} hits={st['hits']} "
+            f"released={st['released']} materialized={st['materialized']}")
@@ -0,0 +1,254 @@
+"""
+檔案穩定性追蹤（事件驅動，取代 sleep 輪詢）
+- 每個檔案一份狀態：最後一次 (mtime, size)、最後變動時間；watchdog 事件以 notify() 即時推後「安靜」期限
+- 單一取樣執行緒只對「有人在等」的檔案做 stat：每 STABILITY_SAMPLE_SEC 一次，另在各檔案安靜期限到達時立即補一次，
+  該次 stat 確認未再變動即視為穩定並喚醒等待方，毋須固定 sleep
+- 首次查詢時 mtime 已早於安靜窗口、且近期沒有事件的檔案（例如啟動時建立基準線）立即視為穩定
+- wait_until_stable()：阻塞等待（copy_to_cache、新檔建立基準線）；watch()：穩定時回呼（輪詢處理器）
+"""
+import os
+import time
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+import config.settings as settings
+
+_PRUNE_AFTER_SEC = 600.0
+_MIN_WAKE_SEC = 0.02
+
+
+def _stat_sig(path: str) -> Optional[Tuple[float, int]]:
+    try:
+        st = os.stat(path)
+        return (st.st_mtime, st.st_size)
+    except OSError:
+        return None
+
+
+def _stopping() -> bool:
+    return bool(getattr(settings, 'force_stop', False))
+
+
+class _FileState:
+    __slots__ = ('path', 'sig', 'last_change', 'last_sample', 'last_event', 'waiters', 'watchers')
+
+    def __init__(self, path: str):
+        self.path = path
+        self.sig = None
+        self.last_change = 0.0      # monotonic：最後一次觀察到變動（stat 改變或事件）
+        self.last_sample = 0.0      # monotonic：最後一次 stat
+        self.last_event = None      # monotonic：最後一次 watchdog 事件
+        self.waiters = []           # 各等待方的安靜窗口（秒）
+        self.watchers: Dict[str, dict] = {}   # owner -> {'quiet', 'callback', 'not_before'}
+
+    def quiet_confirmed(self, quiet: float, now: float) -> bool:
+        """安靜窗口已過，且窗口結束後有一次 stat 確認未再變動"""
+        if self.sig is None:
+            return False
+        if self.last_event is not None and now - self.last_event < quiet:
+            return False
+        return self.last_sample - self.last_change >= quiet
+
+
+class StabilityTracker:
+    """以 get_stability_tracker() 取得共用實例"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._files: Dict[str, _FileState] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.samples = 0
+        self.events = 0
+
+    @staticmethod
+    def _key(path: str) -> str:
+        return os.path.normcase(os.path.abspath(path))
+
+    def _sample_sec(self) -> float:
+        try:
+            return max(0.05, float(getattr(settings, 'STABILITY_SAMPLE_SEC', 0.5)))
+        except (TypeError, ValueError):
+            return 0.5
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='stability-sampler', daemon=True)
+            self._thread.start()
+
+    def _observe(self, path: str, quiet: float, sig, ts: float) -> _FileState:
+        """
+        登記一次新的 stat 結果並返回狀態；呼叫方須持有 _cond（stat 本身在鎖外完成）。
+        新狀態：mtime 已早於安靜窗口者視為早已穩定；否則（含來源時鐘超前）由此刻起計
+        """
+        key = self._key(path)
+        s = self._files.get(key)
+        self.samples += 1
+        if s is None:
+            s = self._files[key] = _FileState(path)
+            s.sig = sig
+            age = (time.time() - sig[0]) if sig else 0.0
+            s.last_change = ts - age if age >= quiet else ts
+        elif sig != s.sig:
+            s.sig = sig
+            s.last_change = ts
+        s.last_sample = max(s.last_sample, ts)
+        return s
+
+    # ---- 事件 ----
+
+    def notify(self, path: str) -> None:
+        """watchdog 事件：檔案剛有活動，重新計算安靜窗口"""
+        with self._cond:
+            s = self._files.get(self._key(path))
+            if s is None:
+                s = self._files[self._key(path)] = _FileState(path)
+                s.sig = _stat_sig(path)
+            now = time.monotonic()
+            s.last_event = now
+            s.last_change = now
+            s.last_sample = now
+            self.events += 1
+            self._cond.notify_all()
+
+    # ---- 等待 / 回呼 ----
+
+    def wait_until_stable(self, path: str, quiet: float, max_wait: Optional[float] = None) -> bool:
+        """阻塞至檔案安靜 quiet 秒；逾時、檔案不存在或停止中返回 False"""
+        quiet = max(0.0, float(quiet or 0))
+        deadline = None if max_wait is None else time.monotonic() + max(0.0, float(max_wait))
+        sig = _stat_sig(path)
+        ts = time.monotonic()
+        with self._cond:
+            s = self._observe(path, quiet, sig, ts)
+            s.waiters.append(quiet)
+            self._ensure_thread()
+            self._cond.notify_all()
+            try:
+                while True:
+                    if _stopping() or s.sig is None:
+                        return False
+                    now = time.monotonic()
+                    if s.quiet_confirmed(quiet, now):
+                        return True
+                    if deadline is not None and now >= deadline:
+                        return False
+                    timeout = self._sample_sec() if deadline is None else max(0.0, min(self._sample_sec(), deadline - now))
+                    self._cond.wait(timeout)
+            finally:
+                s.waiters.remove(quiet)
+
+    def watch(self, path: str, quiet: float, callback: Callable[[], None], owner: str = 'default',
+              delay: float = 0.0) -> None:
+        """檔案安靜 quiet 秒（且距今至少 delay 秒）時，於獨立執行緒呼叫 callback 一次；同一 owner 重複登記會取代舊的"""
+        sig = _stat_sig(path)
+        ts = time.monotonic()
+        with self._cond:
+            s = self._observe(path, float(quiet), sig, ts)
+            s.watchers[owner] = {
+                'quiet': float(quiet),
+                'callback': callback,
+                'not_before': time.monotonic() + max(0.0, float(delay or 0)),
+            }
+            self._ensure_thread()
+            self._cond.notify_all()
+
+    def unwatch(self, path: str, owner: str = 'default') -> None:
+        with self._cond:
+            s = self._files.get(self._key(path))
+            if s is not None:
+                s.watchers.pop(owner, None)
+
+    def unwatch_owner(self, owner: str) -> None:
+        with self._cond:
+            for s in self._files.values():
+                s.watchers.pop(owner, None)
+
+    def quiet_for(self, path: str) -> Optional[float]:
+        """距最後一次觀察到的變動秒數；未追蹤的檔案返回 None"""
+        with self._cond:
+            s = self._files.get(self._key(path))
+            return None if s is None else time.monotonic() - s.last_change
+
+    # ---- 取樣執行緒 ----
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                active = [s for s in self._files.values() if s.waiters or s.watchers]
+                if not active:
+                    self._prune()
+                    self._cond.wait(self._sample_sec() * 4)
+                    continue
+            # stat 可能是網絡往返：不持有鎖
+            sampled = [(s, _stat_sig(s.path), time.monotonic()) for s in active]
+            due = []
+            with self._cond:
+                self.samples += len(sampled)
+                for s, sig, ts in sampled:
+                    if sig != s.sig:
+                        s.sig = sig
+                        s.last_change = ts
+                    s.last_sample = ts
+                now = time.monotonic()
+                next_wake = now + self._sample_sec()
+                floor = now + _MIN_WAKE_SEC
+                for s in active:
+                    for owner, w in list(s.watchers.items()):
+                        if s.quiet_confirmed(w['quiet'], now) and now >= w['not_before']:
+                            s.watchers.pop(owner, None)
+                            due.append(w['callback'])
+                        else:
+                            next_wake = min(next_wake, max(floor, w['not_before'], s.last_change + w['quiet']))
+                    for q in s.waiters:
+                        if not s.quiet_confirmed(q, now):
+                            next_wake = min(next_wake, max(floor, s.last_change + q))
+                self._cond.notify_all()
+            for cb in due:
+                threading.Thread(target=self._safe_call, args=(cb,), daemon=True).start()
+            with self._cond:
+                timeout = max(0.0, next_wake - time.monotonic())
+                if timeout > 0:
+                    self._cond.wait(timeout)
+
+    @staticmethod
+    def _safe_call(cb) -> None:
+        try:
+            if not _stopping():
+                cb()
+        except Exception as e:
+            print(f"   [stability] callback error: {e}")
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for k, s in list(self._files.items()):
+            if not s.waiters and not s.watchers and now - max(s.last_change, s.last_sample) > _PRUNE_AFTER_SEC:
+                self._files.pop(k, None)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'files': len(self._files),
+                'waiting': sum(1 for s in self._files.values() if s.waiters),
+                'watching': sum(len(s.watchers) for s in self._files.values()),
+                'samples': self.samples,
+                'events': self.events,
+            }
+
+
+_tracker: Optional[StabilityTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def get_stability_tracker() -> StabilityTracker:
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = StabilityTracker()
+        return _tracker
+
+
+def copy_quiet_window() -> float:
+    """複製前所需安靜秒數：沿用 COPY_STABILITY_CHECKS 次 × COPY_STABILITY_INTERVAL_SEC 的「連續不變」窗口"""
+    checks = max(1, int(getattr(settings, 'COPY_STABILITY_CHECKS', 2)))
+    interval = max(0.0, float(getattr(settings, 'COPY_STABILITY_INTERVAL_SEC', 1.0)))
+    return (checks - 1) * interval
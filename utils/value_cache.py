@@ -0,0 +1,196 @@
+"""
+值引擎結果快取（Arrow IPC / Feather v2）
+- 每本工作簿一個檔案：<CACHE_FOLDER>/values/<baseline_key>.<engine>.<fingerprint>.arrow
+- fingerprint 取自快取副本 zip 目錄（各 part 名稱 + CRC + 大小），只讀 central directory，不需解壓；
+  內容未變的工作簿下次比較時直接 mmap 載入，毋須再跑值引擎
+- 欄位：sheet / address / kind / s / i / f（kind：0=None、1=str、2=int、3=float、4=bool、255=空工作表佔位），
+  各型別存於對應欄位，載入後型別與值引擎輸出完全一致；外部工具（pyarrow、pandas、DuckDB）可直接讀取
+- 未安裝 polars 時停用（load 返回 None、save 不寫檔）
+"""
+import os
+import glob
+import hashlib
+import zipfile
+from typing import Dict, Optional
+
+try:
+    import polars as pl
+    HAS_POLARS = True
+except ImportError:
+    pl = None
+    HAS_POLARS = False
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    HAS_PYARROW = True
+except ImportError:
+    pa = None
+    pa_ipc = None
+    HAS_PYARROW = False
+
+import config.settings as settings
+
+CACHE_VERSION = 1
+_K_NONE, _K_STR, _K_INT, _K_FLOAT, _K_BOOL, _K_EMPTY_SHEET = 0, 1, 2, 3, 4, 255
+
+
+def workbook_fingerprint(path: str) -> Optional[str]:
+    """zip central directory（名稱 / CRC / 大小）的 blake2b；無法讀取時返回 None"""
+    try:
+        h = hashlib.blake2b(digest_size=10)
+        h.update(f"v{CACHE_VERSION}".encode('ascii'))
+        from utils import mem_cache
+        with zipfile.ZipFile(mem_cache.local_source(path), 'r') as z:
+            for info in sorted(z.infolist(), key=lambda i: i.filename):
+                h.update(f"\x1f{info.filename}\x1e{info.CRC:08x}\x1e{info.file_size}".encode('utf-8'))
+        return h.hexdigest()
+    except Exception:
+        return None
+
+
+def _values_dir() -> Optional[str]:
+    root = getattr(settings, 'CACHE_FOLDER', None)
+    if not root:
+        return None
+    return os.path.join(root, 'values')
+
+
+def _cache_prefix(path: str, engine: str) -> Optional[str]:
+    d = _values_dir()
+    if not d:
+        return None
+    try:
+        from utils.helpers import _baseline_key_for_path
+        base_key = _baseline_key_for_path(path)
+    except Exception:
+        base_key = os.path.basename(path)
+    return os.path.join(d, f"{base_key}.{engine}.")
+
+
+def _enabled() -> bool:
+    return HAS_POLARS and bool(getattr(settings, 'VALUE_CACHE_ENABLED', True))
+
+
+def _to_frame(values_by_sheet) -> "pl.DataFrame":
+    sheets, addrs, kinds, s_col, i_col, f_col = [], [], [], [], [], []
+    for name, vals in values_by_sheet.items():
+        if not vals:
+            sheets.append(name); addrs.append(None); kinds.append(_K_EMPTY_SHEET)
+            s_col.append(None); i_col.append(None); f_col.append(None)
+            continue
+        for addr, v in vals.items():
+            sheets.append(name)
+            addrs.append(str(addr))
+            t = type(v)
+            if v is None:
+                kinds.append(_K_NONE); s_col.append(None); i_col.append(None); f_col.append(None)
+            elif t is bool:
+                kinds.append(_K_BOOL); s_col.append(None); i_col.append(1 if v else 0); f_col.append(None)
+            elif t is int and -(1 << 63) <= v < (1 << 63):
+                kinds.append(_K_INT); s_col.append(None); i_col.append(v); f_col.append(None)
+            elif t is float:
+                kinds.append(_K_FLOAT); s_col.append(None); i_col.append(None); f_col.append(v)
+            elif t is str:
+                kinds.append(_K_STR); s_col.append(v); i_col.append(None); f_col.append(None)
+            else:
+                # 其他型別（datetime 等）不在值引擎輸出範圍內；放棄快取以免型別改變造成假差異
+                raise TypeError(f"unsupported value type: {t.__name__}")
+    return pl.DataFrame({
+        'sheet': pl.Series(sheets, dtype=pl.Utf8),
+        'address': pl.Series(addrs, dtype=pl.Utf8),
+        'kind': pl.Series(kinds, dtype=pl.UInt8),
+        's': pl.Series(s_col, dtype=pl.Utf8),
+        'i': pl.Series(i_col, dtype=pl.Int64),
+        'f': pl.Series(f_col, dtype=pl.Float64),
+    })
+
+
+def _read_columns(path: str):
+    """以 mmap 讀取（有 pyarrow 時零複製），返回各欄 Python list"""
+    cols = ('sheet', 'address', 'kind', 's', 'i', 'f')
+    if HAS_PYARROW:
+        with pa.memory_map(path, 'r') as source:
+            table = pa_ipc.open_file(source).read_all()
+            return [table.column(c).to_pylist() for c in cols]
+    df = pl.read_ipc(path)
+    return [df[c].to_list() for c in cols]
+
+
+def load_value_cache(path: str, engine: str, fingerprint: Optional[str] = None) -> Optional[Dict[str, Dict[str, object]]]:
+    """指紋相符時返回 {sheet: {addr: value}}；否則（或停用 / 讀取失敗）返回 None"""
+    if not _enabled():
+        return None
+    fingerprint = fingerprint or workbook_fingerprint(path)
+    prefix = _cache_prefix(path, engine)
+    if not fingerprint or not prefix:
+        return None
+    cache_path = f"{prefix}{fingerprint}.arrow"
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        sheets, addrs, kinds, s_col, i_col, f_col = _read_columns(cache_path)
+    except Exception as e:
+        print(f"   [value-cache] read failed, ignore: {e}")
+        return None
+    out: Dict[str, Dict[str, object]] = {}
+    cur_name = None
+    cur = None
+    for name, addr, k, s, i, f in zip(sheets, addrs, kinds, s_col, i_col, f_col):
+        if name != cur_name:
+            cur_name = name
+            cur = out.setdefault(name, {})
+        if k == _K_EMPTY_SHEET:
+            continue
+        if k == _K_STR:
+            cur[addr] = s
+        elif k == _K_INT:
+            cur[addr] = i
+        elif k == _K_FLOAT:
+            cur[addr] = f
+        elif k == _K_BOOL:
+            cur[addr] = bool(i)
+        else:
+            cur[addr] = None
+    return out
+
+
+def save_value_cache(path: str, engine: str, values_by_sheet, fingerprint: Optional[str] = None) -> Optional[str]:
+    """寫入本工作簿的值快取並刪除同一工作簿 / 引擎的舊指紋檔案；返回快取路徑（未寫入返回 None）"""
+    if not _enabled() or not values_by_sheet:
+        return None
+    fingerprint = fingerprint or workbook_fingerprint(path)
+    prefix = _cache_prefix(path, engine)
+    if not fingerprint or not prefix:
+        return None
+    cache_path = f"{prefix}{fingerprint}.arrow"
+    try:
+        df = _to_frame(values_by_sheet)
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp = f"{cache_path}.tmp{os.getpid()}"
+        # 不壓縮：讀取時才能 mmap 零複製
+        df.write_ipc(tmp, compression='uncompressed')
+        os.replace(tmp, cache_path)
+    except Exception as e:
+        print(f"   [value-cache] write skipped: {e}")
+        try:
+            if 'tmp' in locals() and os.path.exists(tmp):
+                os.remove(tmp)
+        except Exception:
+            pass
+        return None
+    for old in glob.glob(glob.escape(prefix) + '*.arrow'):
+        if old != cache_path:
+            try:
+                os.remove(old)
+            except Exception:
+                pass
+    # 值快取計入 CACHE_MAX_SIZE_MB：寫入後按預算逐出（不逐出本工作簿的副本）
+    try:
+        from utils.cache_manager import get_cache_manager
+        mgr = get_cache_manager() if getattr(settings, 'USE_LOCAL_CACHE', False) else None
+        if mgr is not None:
+            mgr.enforce(keep=os.path.basename(path))
+    except Exception:
+        pass
+    return cache_path
@@ -1,48 +1,20 @@
 from typing import Dict, Optional
 from io import BytesIO
-import subprocess
-import sys
 import os
 
 # Pandas-based value reader via xlsx2csv -> CSV in-memory (fallback-friendly)
 
-def _xlsx2csv_to_bytes(xlsx_path: str, sheet_count: int | None = None) -> Dict[str, bytes]:
-    sheets: Dict[str, bytes] = {}
-    try:
-        cmd_list = [sys.executable, '-m', 'xlsx2csv', '--list-sheets', xlsx_path]
-        proc = subprocess.run(cmd_list, capture_output=True, text=True)
-        rc = proc.returncode
-        out = proc.stdout or ''
-        err = proc.stderr or ''
-        names = [ln.strip() for ln in out.splitlines() if ln.strip()]
-        print(f"   [pandas-xlsx2csv] list rc={rc} names={names} err={(err.strip()[:200] if err else '')}")
-        if rc != 0 or not names:
-            if sheet_count:
-                print(f"   [pandas-xlsx2csv] fallback brute-force by index 1..{sheet_count}")
-                for i in range(1, sheet_count+1):
-                    cmd_fetch = [sys.executable, '-m', 'xlsx2csv', '-s', str(i), xlsx_path]
-                    proc2 = subprocess.run(cmd_fetch, capture_output=True, text=False)
-                    if proc2.returncode != 0:
-                        e2 = (proc2.stderr.decode('utf-8', 'ignore') if proc2.stderr else '')
-                        print(f"   [pandas-xlsx2csv] fetch sheet#{i} rc={proc2.returncode} err={e2[:200]}")
-                        continue
-                    sheets[f"sheet{i}"] = proc2.stdout
-                return sheets
-            return {}
-        for i, name in enumerate(names, start=1):
-            cmd_fetch = [sys.executable, '-m', 'xlsx2csv', '-s', str(i), xlsx_path]
-            proc2 = subprocess.run(cmd_fetch, capture_output=True, text=False)
-            if proc2.returncode != 0:
-                e2 = (proc2.stderr.decode('utf-8', 'ignore') if proc2.stderr else '')
-                print(f"   [pandas-xlsx2csv] fetch sheet#{i} rc={proc2.returncode} name='{name}' err={e2[:200]}")
-                continue
-            sheets[name] = proc2.stdout
-    except Exception as e:
-        print(f"   [pandas-xlsx2csv] exception: {e}")
-    return sheets
+def _xlsx2csv_to_bytes(xlsx_path: str, sheet_count: int | None = None, sheets: Optional[set] = None) -> Dict[str, bytes]:
+    """
+    Convert each worksheet to CSV bytes via xlsx2csv.
+    Returns: { sheet_name: csv_bytes }
+    進程內單一 zip session 轉換，失敗時回退舊有子進程流程（見 xlsx2csv_inproc）。
+    """
+    from utils.value_engines.xlsx2csv_inproc import xlsx_to_csv_bytes
+    return xlsx_to_csv_bytes(xlsx_path, sheet_count=sheet_count, tag='pandas-xlsx2csv', sheets=sheets)
 
 
-def read_values_from_xlsx_via_pandas(xlsx_path: str, persist_csv: bool=False, persist_dir: Optional[str]=None, sheet_count: int | None = None) -> Dict[str, Dict[str, Optional[str]]]:
+def read_values_from_xlsx_via_pandas(xlsx_path: str, persist_csv: bool=False, persist_dir: Optional[str]=None, sheet_count: int | None = None, sheets: Optional[set] = None) -> Dict[str, Dict[str, Optional[str]]]:
     import pandas as pd
     try:
         from utils.helpers import _baseline_key_for_path
@@ -50,7 +22,8 @@ def read_values_from_xlsx_via_pandas(xlsx_path: str, persist_csv: bool=False, pe
         _baseline_key_for_path = lambda p: os.path.basename(p)
 
     out: Dict[str, Dict[str, Optional[str]]] = {}
-    sheets = _xlsx2csv_to_bytes(xlsx_path, sheet_count=sheet_count)
+    csv_by_sheet = _xlsx2csv_to_bytes(xlsx_path, sheet_count=sheet_count, sheets=sheets)
+    persist_csv = persist_csv and sheets is None  # 部分讀取不覆寫整本工作簿的合併 CSV
     combined_rows = []  # (sheet, address, value)
 
     def col_to_letters(n: int) -> str:
@@ -60,7 +33,7 @@ def read_values_from_xlsx_via_pandas(xlsx_path: str, persist_csv: bool=False, pe
             s = chr(65 + r) + s
         return s
 
-    for name, csv_bytes in (sheets or {}).items():
+    for name, csv_bytes in (csv_by_sheet or {}).items():
         try:
             df = pd.read_csv(BytesIO(csv_bytes), header=None)
             if df.shape[0] == 0 or df.shape[1] == 0:
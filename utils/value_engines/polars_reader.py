@@ -1,65 +1,84 @@
 from typing import Dict, Optional
 from io import BytesIO
-import subprocess
-import sys
 import os
 
 # Polars-based value reader via xlsx2csv -> CSV in-memory
 
-def _xlsx2csv_to_bytes(xlsx_path: str, sheet_count: int | None = None) -> Dict[str, bytes]:
+def _xlsx2csv_to_bytes(xlsx_path: str, sheet_count: int | None = None, sheets: Optional[set] = None) -> Dict[str, bytes]:
     """
     Convert each worksheet to CSV bytes via xlsx2csv.
     Returns: { sheet_name: csv_bytes }
-    Prints diagnostic info (rc/stdout/stderr) for troubleshooting.
+    進程內單一 zip session 轉換，失敗時回退舊有子進程流程（見 xlsx2csv_inproc）。
     """
-    sheets: Dict[str, bytes] = {}
-    # List sheets
-    try:
-        # Try list-sheets first
-        cmd_list = [sys.executable, '-m', 'xlsx2csv', '--list-sheets', xlsx_path]
-        proc = subprocess.run(cmd_list, capture_output=True, text=True)
-        rc = proc.returncode
-        out = proc.stdout or ''
-        err = proc.stderr or ''
-        names = [ln.strip() for ln in out.splitlines() if ln.strip()]
-        print(f"   [polars-xlsx2csv] list rc={rc} names={names} err={(err.strip()[:200] if err else '')}")
-        if rc != 0 or not names:
-            # Fallback: brute-force by index if sheet_count provided
-            if sheet_count:
-                print(f"   [polars-xlsx2csv] fallback brute-force by index 1..{sheet_count}")
-                for i in range(1, sheet_count+1):
-                    cmd_fetch = [sys.executable, '-m', 'xlsx2csv', '-s', str(i), xlsx_path]
-                    proc2 = subprocess.run(cmd_fetch, capture_output=True, text=False)
-                    rc2 = proc2.returncode
-                    if rc2 != 0:
-                        e2 = (proc2.stderr.decode('utf-8', 'ignore') if proc2.stderr else '')
-                        print(f"   [polars-xlsx2csv] fetch sheet#{i} rc={rc2} err={e2[:200]}")
-                        continue
-                    sheets[f"sheet{i}"] = proc2.stdout
-                return sheets
-            return {}
-        # Fetch each sheet by discovered names
-        for i, name in enumerate(names, start=1):
-            cmd_fetch = [sys.executable, '-m', 'xlsx2csv', '-s', str(i), xlsx_path]
-            proc2 = subprocess.run(cmd_fetch, capture_output=True, text=False)
-            rc2 = proc2.returncode
-            if rc2 != 0:
-                e2 = (proc2.stderr.decode('utf-8', 'ignore') if proc2.stderr else '')
-                print(f"   [polars-xlsx2csv] fetch sheet#{i} rc={rc2} name='{name}' err={e2[:200]}")
-                continue
-            sheets[name] = proc2.stdout
-    except Exception as e:
-        print(f"   [polars-xlsx2csv] exception: {e}")
-    return sheets
+    from utils.value_engines.xlsx2csv_inproc import xlsx_to_csv_bytes
+    return xlsx_to_csv_bytes(xlsx_path, sheet_count=sheet_count, tag='polars-xlsx2csv', sheets=sheets)
+
+
+def _col_to_letters(n: int) -> str:
+    s = ''
+    while n > 0:
+        n, r = divmod(n-1, 26)
+        s = chr(65 + r) + s
+    return s
+
+
+def _sheet_to_long(df):
+    """
+    wide -> long（向量化）：返回 (long_df, values)
+    - long_df 欄位：row, col, address, value（字串化，供合併 CSV）；依列、欄排序（與逐格迴圈順序一致）
+    - values：與 long_df 對齊的原型別值（int/float/bool/str），避免字串化造成假差異
+    - 依 dtype 分組 unpivot，每組各自保留型別；空白（null 或 ''）不輸出，與 openpyxl 行為一致
+    """
+    import polars as pl
+    names = df.columns
+    col_of = {n: i + 1 for i, n in enumerate(names)}
+    letters_of = {n: _col_to_letters(i + 1) for i, n in enumerate(names)}
+    df = df.with_row_index('row', offset=1)
+
+    groups: Dict[object, list] = {}
+    for n, dt in zip(names, df.dtypes[1:]):
+        groups.setdefault(dt, []).append(n)
+
+    parts = []
+    for gid, (dt, cols) in enumerate(groups.items()):
+        long = df.unpivot(on=cols, index='row', variable_name='var', value_name='v')
+        keep = pl.col('v').is_not_null()
+        if dt == pl.String:
+            keep = keep & (pl.col('v') != '')
+        if dt == pl.Boolean:
+            sval = pl.when(pl.col('v')).then(pl.lit('True')).otherwise(pl.lit('False'))
+        else:
+            sval = pl.col('v').cast(pl.String)
+        long = long.filter(keep).with_columns(
+            pl.col('var').replace_strict(col_of, return_dtype=pl.Int64).alias('col'),
+            pl.concat_str([pl.col('var').replace_strict(letters_of, return_dtype=pl.String),
+                           pl.col('row').cast(pl.String)]).alias('address'),
+            sval.alias('value'),
+            pl.lit(gid, dtype=pl.Int32).alias('gid'),
+        ).sort('row', 'col')
+        parts.append(long)
+
+    if len(parts) == 1:
+        long = parts[0]
+        return long.select('row', 'col', 'address', 'value'), long['v'].to_list()
+    # 多種 dtype：各組值先各自轉 Python，再依合併後的列、欄順序取回
+    group_vals = [p['v'].to_list() for p in parts]
+    merged = pl.concat([
+        p.select('row', 'col', 'address', 'value', 'gid', pl.int_range(pl.len(), dtype=pl.Int64).alias('pos'))
+        for p in parts
+    ]).sort('row', 'col')
+    values = [group_vals[g][i] for g, i in zip(merged['gid'].to_list(), merged['pos'].to_list())]
+    return merged.select('row', 'col', 'address', 'value'), values
 
 
-def read_values_from_xlsx_via_polars(xlsx_path: str, persist_csv: bool=False, persist_dir: Optional[str]=None, sheet_count: int | None = None) -> Dict[str, Dict[str, Optional[str]]]:
+def read_values_from_xlsx_via_polars(xlsx_path: str, persist_csv: bool=False, persist_dir: Optional[str]=None, sheet_count: int | None = None, sheets: Optional[set] = None) -> Dict[str, Dict[str, Optional[str]]]:
     """
     Read display values using xlsx2csv + polars.
     Returns: { sheet_name: { 'A1': value, ... }, ... }
     If persist_csv=True and persist_dir provided, save ONE combined CSV per workbook at:
       <persist_dir>/values/<baseline_key>.values.csv
     CSV columns: sheet,address,value
+    sheets: only read the named sheets (None = all); the combined CSV is only written for full reads.
     """
     import polars as pl
     try:
@@ -68,42 +87,24 @@ def read_values_from_xlsx_via_polars(xlsx_path: str, persist_csv: bool=False, pe
         _baseline_key_for_path = lambda p: os.path.basename(p)
 
     out: Dict[str, Dict[str, Optional[str]]] = {}
-    sheets = _xlsx2csv_to_bytes(xlsx_path, sheet_count=sheet_count)
-    combined_rows = []  # (sheet, address, value)
-    for name, csv_bytes in (sheets or {}).items():
+    csv_by_sheet = _xlsx2csv_to_bytes(xlsx_path, sheet_count=sheet_count, sheets=sheets)
+    persist_csv = persist_csv and sheets is None  # 部分讀取不覆寫整本工作簿的合併 CSV
+    dump_frames = []  # 每張表的 (sheet, address, value) 長表，供合併 CSV
+    for name, csv_bytes in (csv_by_sheet or {}).items():
         try:
             # Read CSV into Polars (in-memory)
             df = pl.read_csv(BytesIO(csv_bytes), has_header=False)
             if df.height == 0 or df.width == 0:
                 out[name] = {}
                 continue
-            # wide -> long with addresses
-            # rows: 1..N ; cols: 1..M -> address like A1, B2
-            def col_to_letters(n: int) -> str:
-                s = ''
-                while n > 0:
-                    n, r = divmod(n-1, 26)
-                    s = chr(65 + r) + s
-                return s
-            long_rows = []
-            for r in range(df.height):
-                row = df.row(r)
-                for c in range(len(row)):
-                    v = row[c]
-                    if v is None or (isinstance(v, str) and v == ''):
-                        continue  # skip blanks to align with openpyxl behaviour
-                    addr = f"{col_to_letters(c+1)}{r+1}"
-                    # 保留原型別避免假差異
-                    sval = v
-                    long_rows.append((addr, sval))
-                    # 合併 CSV 需字串化
-                    csv_v = '' if v is None else str(v).replace('"','""')
-                    combined_rows.append((name, addr, csv_v))
-            out[name] = {addr: val for addr, val in long_rows}
+            long_df, values = _sheet_to_long(df)
+            out[name] = dict(zip(long_df['address'].to_list(), values))
+            if persist_csv and persist_dir and long_df.height:
+                dump_frames.append(long_df.select(pl.lit(name).alias('sheet'), 'address', 'value'))
         except Exception:
             out[name] = {}
     # Persist ONE combined CSV if requested
-    if persist_csv and persist_dir and combined_rows:
+    if persist_csv and persist_dir and dump_frames:
         try:
             base_key = _baseline_key_for_path(xlsx_path)
             values_dir = os.path.join(persist_dir, 'values')
@@ -111,10 +112,7 @@ def read_values_from_xlsx_via_polars(xlsx_path: str, persist_csv: bool=False, pe
             out_path = os.path.join(values_dir, f"{base_key}.values.csv")
             with open(out_path, 'w', encoding='utf-8', newline='') as f:
                 f.write('sheet,address,value\n')
-                for sheet, addr, val in combined_rows:
-                    # escape quotes and commas if necessary (basic CSV)
-                    v = '' if val is None else str(val).replace('"','""')
-                    f.write(f'"{sheet}","{addr}","{v}"\n')
+                pl.concat(dump_frames).write_csv(f, include_header=False, quote_style='always')
         except Exception:
             pass
     return out
@@ -3,6 +3,8 @@ import xml.etree.ElementTree as ET
 from typing import Dict, Optional
 import os
 
+from utils.value_engines.stream_reader import load_shared_strings, iter_cell_nodes
+
 # 以 XML 解析 .xlsx 的 worksheet 值（cached），再交由上層使用（可配合 Polars 做後處理）
 # 返回結構：{ sheet_name: { 'A1': value, ... } }
 
@@ -73,7 +75,67 @@ def _split_addr(addr: str):
     return col, r
 
 
-def read_values_from_xlsx_via_polars_xml(xlsx_path: str) -> Dict[str, Dict[str, Optional[str]]]:
+def _streaming_enabled() -> bool:
+    try:
+        import config.settings as settings
+        return bool(getattr(settings, 'XML_VALUE_STREAMING', True))
+    except Exception:
+        return True
+
+
+def _cell_value(t, raw, sst):
+    if raw is None:
+        return None
+    if t == 's':
+        # shared string
+        try:
+            idx = int(raw)
+            return sst[idx] if 0 <= idx < len(sst) else ''
+        except Exception:
+            return ''
+    if t == 'b':
+        return True if raw in ('1', 'true', 'TRUE') else False
+    # 數值或一般字串，先原樣返回（上層如需再做型別轉換）
+    return raw
+
+
+def _sheet_values_stream(fp, sst) -> Dict[str, Optional[str]]:
+    """串流模式：iterparse 逐列處理並清除，峰值記憶體與單列大小成正比"""
+    vals: Dict[str, Optional[str]] = {}
+    for addr, t, has_v, raw, inline in iter_cell_nodes(fp):
+        if not addr:
+            continue
+        if not has_v:
+            # inlineStr 支援
+            if inline is not None:
+                vals[addr] = inline
+            continue
+        vals[addr] = _cell_value(t, raw, sst)
+    return vals
+
+
+def _sheet_values_tree(root, sst) -> Dict[str, Optional[str]]:
+    """整表模式：ET.fromstring 後 findall（XML_VALUE_STREAMING=False 時使用）"""
+    vals: Dict[str, Optional[str]] = {}
+    for c in root.findall(f'.//{{{NS_MAIN}}}c'):
+        addr = c.attrib.get('r')
+        if not addr:
+            continue
+        t = c.attrib.get('t')  # s=sharedString, b=boolean, str=string, inlineStr, etc.
+        v_node = c.find(f'{{{NS_MAIN}}}v')
+        if v_node is None:
+            # inlineStr 支援
+            is_node = c.find(f'{{{NS_MAIN}}}is')
+            if is_node is not None:
+                tnode = is_node.find(f'.//{{{NS_MAIN}}}t')
+                vals[addr] = (tnode.text if tnode is not None else '')
+            continue
+        vals[addr] = _cell_value(t, v_node.text, sst)
+    return vals
+
+
+def read_values_from_xlsx_via_polars_xml(xlsx_path: str, sheets: Optional[set] = None) -> Dict[str, Dict[str, Optional[str]]]:
+    """sheets：只讀取指定名稱的工作表（None 表示全部）"""
     out: Dict[str, Dict[str, Optional[str]]] = {}
     
     # 嘗試導入增強型日誌系統
@@ -94,21 +156,25 @@ def read_values_from_xlsx_via_polars_xml(xlsx_path: str) -> Dict[str, Dict[str,
         print(f"   [error] 路徑不是字串，而是 {type(xlsx_path)}")
         return {}
         
-    if not os.path.exists(xlsx_path):
+    from utils import mem_cache
+    if not mem_cache.exists(xlsx_path):
         print(f"   [error] 路徑不存在: {xlsx_path}")
         return {}
     
     # 記錄檔案資訊
     try:
-        file_size = os.path.getsize(xlsx_path) / (1024 * 1024)
-        modified_time = os.path.getmtime(xlsx_path)
-        access_time = os.path.getatime(xlsx_path)
-        
-        from datetime import datetime
-        print(f"   [file-info] 大小: {file_size:.2f} MB")
-        print(f"   [file-info] 修改時間: {datetime.fromtimestamp(modified_time)}")
-        print(f"   [file-info] 存取時間: {datetime.fromtimestamp(access_time)}")
-        print(f"   [file-info] 存取間隔: {access_time - modified_time:.2f} 秒")
+        if mem_cache.is_in_memory(xlsx_path):
+            print(f"   [file-info] 記憶體副本，大小: {mem_cache.getsize(xlsx_path) / (1024 * 1024):.2f} MB")
+        else:
+            file_size = os.path.getsize(xlsx_path) / (1024 * 1024)
+            modified_time = os.path.getmtime(xlsx_path)
+            access_time = os.path.getatime(xlsx_path)
+
+            from datetime import datetime
+            print(f"   [file-info] 大小: {file_size:.2f} MB")
+            print(f"   [file-info] 修改時間: {datetime.fromtimestamp(modified_time)}")
+            print(f"   [file-info] 存取時間: {datetime.fromtimestamp(access_time)}")
+            print(f"   [file-info] 存取間隔: {access_time - modified_time:.2f} 秒")
     except Exception as e:
         print(f"   [warning] 無法取得檔案資訊: {e}")
     
@@ -139,47 +205,23 @@ def read_values_from_xlsx_via_polars_xml(xlsx_path: str) -> Dict[str, Dict[str,
         old_timeout = socket.getdefaulttimeout()
         socket.setdefaulttimeout(30)  # 30秒超時
         
-        with zipfile.ZipFile(local_path, 'r') as z:
-            sst = _load_shared_strings(z)
-            sheets = _workbook_sheet_names(z)
+        with zipfile.ZipFile(mem_cache.local_source(local_path), 'r') as z:
+            streaming = _streaming_enabled()
+            sst = load_shared_strings(z) if streaming else _load_shared_strings(z)
+            sheet_names = _workbook_sheet_names(z)
             # 順序依 workbook.xml
-            for i, name in enumerate(sheets, start=1):
+            for i, name in enumerate(sheet_names, start=1):
+                if sheets is not None and name not in sheets:
+                    continue
                 sheet_path = f'xl/worksheets/sheet{i}.xml'
                 if sheet_path not in z.namelist():
                     continue
                 try:
-                    xml = z.read(sheet_path)
-                    root = ET.fromstring(xml)
-                    vals: Dict[str, Optional[str]] = {}
-                    for c in root.findall(f'.//{{{NS_MAIN}}}c'):
-                        addr = c.attrib.get('r')
-                        if not addr:
-                            continue
-                        t = c.attrib.get('t')  # s=sharedString, b=boolean, str=string, inlineStr, etc.
-                        v_node = c.find(f'{{{NS_MAIN}}}v')
-                        if v_node is None:
-                            # inlineStr 支援
-                            is_node = c.find(f'{{{NS_MAIN}}}is')
-                            if is_node is not None:
-                                tnode = is_node.find(f'.//{{{NS_MAIN}}}t')
-                                vals[addr] = (tnode.text if tnode is not None else '')
-                            continue
-                        raw = v_node.text
-                        if raw is None:
-                            vals[addr] = None
-                        elif t == 's':
-                            # shared string
-                            try:
-                                idx = int(raw)
-                                vals[addr] = sst[idx] if 0 <= idx < len(sst) else ''
-                            except Exception:
-                                vals[addr] = ''
-                        elif t == 'b':
-                            vals[addr] = True if raw in ('1', 'true', 'TRUE') else False
-                        else:
-                            # 數值或一般字串，先原樣返回（上層如需再做型別轉換）
-                            vals[addr] = raw
-                    out[name] = vals
+                    if streaming:
+                        with z.open(sheet_path) as fp:
+                            out[name] = _sheet_values_stream(fp, sst)
+                    else:
+                        out[name] = _sheet_values_tree(ET.fromstring(z.read(sheet_path)), sst)
                 except Exception as e:
                     # 單張表失敗不影響其他表
                     out[name] = {}
@@ -0,0 +1,317 @@
+"""
+值引擎登記表與自動選擇（VALUE_ENGINE='auto'）
+- 每次值引擎執行都記錄：耗時（EWMA）、RSS 增量、失敗次數，按「baseline key @ 檔案大小級距」分開統計，
+  另按大小級距累積全體檔案的每 MB 耗時，作為未見過檔案的預設
+- auto 模式下每本工作簿（每個大小級距）第一次遇到時，逐一試跑可用引擎，選最快且有效的一個並固定（pinned）；
+  之後一直沿用，避免不同引擎的值表示方式（例如 'TRUE' / True / 1.0）造成假差異
+- 固定的引擎連續失敗達 VALUE_ENGINE_MAX_FAILURES 次才改選次佳引擎
+- 統計在記憶體更新，由背景計時執行緒每 _SAVE_INTERVAL_SEC 秒（及程式結束時）寫出 <LOG_FOLDER>/value_engine_stats.json，
+  解析路徑上不做磁碟 I/O；檔案項目超過 _MAX_FILE_ENTRIES 時保存前刪去最久未執行者
+- 只讀部分工作表（增量重新解析）時不試跑、不固定引擎：耗時不代表整本工作簿
+"""
+import os
+import json
+import math
+import time
+import atexit
+import threading
+import importlib.util
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config.settings as settings
+
+STATS_VERSION = 1
+_EWMA_ALPHA = 0.3
+_SAVE_INTERVAL_SEC = 60.0
+_MAX_FILE_ENTRIES = 2000
+_lock = threading.Lock()
+_stats_cache: Optional[dict] = None
+_dirty = False
+_saver: Optional[threading.Thread] = None
+
+
+# ---- 引擎表 ----
+
+def _run_polars(path, sheet_count, persist_csv, persist_dir, sheets=None):
+    from utils.value_engines.polars_reader import read_values_from_xlsx_via_polars
+    return read_values_from_xlsx_via_polars(path, persist_csv=persist_csv, persist_dir=persist_dir,
+                                            sheet_count=sheet_count, sheets=sheets)
+
+
+def _run_polars_xml(path, sheet_count, persist_csv, persist_dir, sheets=None):
+    from utils.value_engines.polars_xml_reader import read_values_from_xlsx_via_polars_xml
+    return read_values_from_xlsx_via_polars_xml(path, sheets=sheets)
+
+
+def _run_pandas(path, sheet_count, persist_csv, persist_dir, sheets=None):
+    from utils.value_engines.pandas_reader import read_values_from_xlsx_via_pandas
+    return read_values_from_xlsx_via_pandas(path, persist_csv=persist_csv, persist_dir=persist_dir,
+                                            sheet_count=sheet_count, sheets=sheets)
+
+
+def _run_xml(path, sheet_count, persist_csv, persist_dir, sheets=None):
+    from utils.value_engines.xml_reader import read_values_from_xlsx_via_xml
+    return read_values_from_xlsx_via_xml(path, sheets=sheets)
+
+
+# name -> (runner, 需要的模組)
+ENGINES: Dict[str, Tuple[Callable, Tuple[str, ...]]] = {
+    'polars_xml': (_run_polars_xml, ()),
+    'xml': (_run_xml, ()),
+    'polars': (_run_polars, ('polars', 'xlsx2csv')),
+    'pandas': (_run_pandas, ('pandas', 'xlsx2csv')),
+}
+DEFAULT_ENGINE = 'polars_xml'
+
+
+def available_engines() -> List[str]:
+    out = []
+    for name, (_, mods) in ENGINES.items():
+        if all(importlib.util.find_spec(m) is not None for m in mods):
+            out.append(name)
+    return out
+
+
+# ---- 統計 ----
+
+def _stats_path() -> str:
+    return os.path.join(getattr(settings, 'LOG_FOLDER', '.'), 'value_engine_stats.json')
+
+
+def _load_stats() -> dict:
+    global _stats_cache
+    if _stats_cache is None:
+        data = None
+        try:
+            with open(_stats_path(), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception:
+            data = None
+        if not isinstance(data, dict) or data.get('version') != STATS_VERSION:
+            data = {'version': STATS_VERSION, 'files': {}, 'buckets': {}}
+        _stats_cache = data
+    return _stats_cache
+
+
+def _mark_dirty() -> None:
+    """標記統計已變更（呼叫方持有 _lock）；實際寫檔由背景計時執行緒 / 程式結束時的 flush_stats() 負責"""
+    global _dirty, _saver
+    _dirty = True
+    if _saver is None or not _saver.is_alive():
+        _saver = threading.Thread(target=_saver_loop, name='engine-stats-saver', daemon=True)
+        _saver.start()
+
+
+def _saver_loop() -> None:
+    while True:
+        time.sleep(_SAVE_INTERVAL_SEC)
+        flush_stats()
+
+
+def _prune_locked(stats: dict) -> None:
+    files = stats['files']
+    if len(files) <= _MAX_FILE_ENTRIES:
+        return
+    def _last(item):
+        return max((e.get('last_ts') or 0 for e in item[1].get('engines', {}).values()), default=0)
+    for k, _ in sorted(files.items(), key=_last)[:len(files) - _MAX_FILE_ENTRIES]:
+        files.pop(k, None)
+
+
+def flush_stats() -> None:
+    """有變更時寫出統計檔（序列化在鎖內完成，寫檔在鎖外）"""
+    global _dirty
+    with _lock:
+        if not _dirty or _stats_cache is None:
+            return
+        _prune_locked(_stats_cache)
+        payload = json.dumps(_stats_cache, ensure_ascii=False, separators=(',', ':'))
+        _dirty = False
+    path = _stats_path()
+    try:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp, path)
+    except Exception as e:
+        print(f"   [engine-registry] 無法保存統計: {e}")
+
+
+@atexit.register
+def _flush_on_exit():
+    flush_stats()
+
+
+def size_bucket(size_bytes: int) -> int:
+    """0: <1MB, 1: 1-2MB, 2: 2-4MB, ...（以 2 倍遞增）"""
+    mb = max(size_bytes, 0) / (1024 * 1024)
+    return 0 if mb < 1 else int(math.log2(mb)) + 1
+
+
+def file_key(path: str) -> Tuple[str, int, int]:
+    """返回 (統計 key, 大小級距, 檔案大小)；key 形如 '<baseline_key>@<bucket>'"""
+    try:
+        from utils import mem_cache
+        size = mem_cache.getsize(path)
+    except OSError:
+        size = 0
+    try:
+        from utils.helpers import _baseline_key_for_path
+        base_key = _baseline_key_for_path(path)
+    except Exception:
+        base_key = os.path.basename(path)
+    bucket = size_bucket(size)
+    return f"{base_key}@{bucket}", bucket, size
+
+
+def _rss_mb() -> Optional[float]:
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 1024 / 1024
+    except Exception:
+        return None
+
+
+def record_run(path: str, engine: str, elapsed: float, ok: bool, mem_mb: Optional[float] = None) -> None:
+    """記錄一次引擎執行結果（靜態 VALUE_ENGINE 亦會記錄，切換到 auto 時即有數據可用）"""
+    key, bucket, size = file_key(path)
+    size_mb = max(size / (1024 * 1024), 0.001)
+    with _lock:
+        stats = _load_stats()
+        f = stats['files'].setdefault(key, {'engines': {}, 'pinned': None})
+        e = f['engines'].setdefault(engine, {'runs': 0, 'fail': 0, 'streak_fail': 0, 'ewma_sec': None, 'mem_mb': None})
+        b = stats['buckets'].setdefault(str(bucket), {}).setdefault(engine, {'runs': 0, 'fail': 0, 'ewma_sec_per_mb': None})
+        if ok:
+            e['runs'] += 1
+            e['streak_fail'] = 0
+            e['last_sec'] = round(elapsed, 4)
+            e['ewma_sec'] = round(elapsed if e['ewma_sec'] is None else
+                                  (1 - _EWMA_ALPHA) * e['ewma_sec'] + _EWMA_ALPHA * elapsed, 4)
+            if mem_mb is not None:
+                e['mem_mb'] = round(mem_mb, 1)
+            b['runs'] += 1
+            per_mb = elapsed / size_mb
+            b['ewma_sec_per_mb'] = round(per_mb if b['ewma_sec_per_mb'] is None else
+                                         (1 - _EWMA_ALPHA) * b['ewma_sec_per_mb'] + _EWMA_ALPHA * per_mb, 4)
+        else:
+            e['fail'] += 1
+            e['streak_fail'] += 1
+            b['fail'] += 1
+            max_fail = int(getattr(settings, 'VALUE_ENGINE_MAX_FAILURES', 2) or 1)
+            if f.get('pinned') == engine and e['streak_fail'] >= max_fail:
+                f['pinned'] = None
+        e['last_ts'] = int(time.time())
+        _mark_dirty()
+
+
+def _best(engines: Dict[str, dict], metric: str, exclude=()) -> Optional[str]:
+    cands = [(st[metric], name) for name, st in engines.items()
+             if name not in exclude and st.get('runs') and st.get(metric) is not None]
+    return min(cands)[1] if cands else None
+
+
+def resolve_auto_engine(path: str, allow_trial: bool = True) -> Tuple[Optional[str], str]:
+    """
+    auto 模式選擇引擎，返回 (engine, 原因)；engine 為 None 表示此檔案需要試跑（見 trial_engines）。
+    allow_trial=False（只讀部分工作表時）：沒有固定引擎則按大小級距統計 / 預設引擎選擇，不要求試跑
+    """
+    avail = available_engines()
+    key, bucket, _ = file_key(path)
+    with _lock:
+        stats = _load_stats()
+        f = stats['files'].get(key)
+        if f:
+            pinned = f.get('pinned')
+            if pinned in avail:
+                return pinned, f"pinned for {key}: {describe(key)}"
+            max_fail = int(getattr(settings, 'VALUE_ENGINE_MAX_FAILURES', 2) or 1)
+            failing = [k for k, v in f['engines'].items() if v.get('streak_fail', 0) >= max_fail]
+            best = _best({k: v for k, v in f['engines'].items() if k in avail}, 'ewma_sec', exclude=failing)
+            if best:
+                f['pinned'] = best
+                _mark_dirty()
+                return best, f"re-pinned fastest working for {key}: {describe(key)}"
+        if allow_trial and getattr(settings, 'VALUE_ENGINE_AUTO_TRIAL', True):
+            return None, f"no history for {key}, trial {avail}"
+        per_bucket = {k: v for k, v in (stats['buckets'].get(str(bucket)) or {}).items() if k in avail}
+        best = _best(per_bucket, 'ewma_sec_per_mb')
+        if best:
+            return best, f"size bucket {bucket} fastest"
+    return (DEFAULT_ENGINE if DEFAULT_ENGINE in avail else avail[0]), "default"
+
+
+def _nonempty(values) -> int:
+    try:
+        return sum(len(v or {}) for v in (values or {}).values())
+    except Exception:
+        return 0
+
+
+def run_engine(name: str, path: str, sheet_count=None, persist_csv=False, persist_dir=None, sheets=None):
+    """執行單一引擎（不寫入統計）；sheets 限定讀取的工作表；返回 (values, elapsed, ok, RSS 增量 MB)"""
+    runner = ENGINES[name][0]
+    rss0 = _rss_mb()
+    t0 = time.perf_counter()
+    try:
+        values = runner(path, sheet_count, persist_csv, persist_dir, sheets)
+        ok = bool(values) and _nonempty(values) > 0
+    except Exception as e:
+        print(f"   [engine-registry] {name} failed: {e}")
+        values, ok = {}, False
+    elapsed = time.perf_counter() - t0
+    rss1 = _rss_mb()
+    mem = (rss1 - rss0) if (rss0 is not None and rss1 is not None) else None
+    return values, elapsed, ok, mem
+
+
+def trial_engines(path: str, sheet_count=None, persist_csv=False, persist_dir=None, silent=False, sheets=None):
+    """
+    逐一試跑可用引擎，全部記錄後固定最快且有效者；返回 (engine, values)。
+    取得的值少於最多者的引擎視為無效（記一次失敗）；
+    全部引擎都沒有非空值（例如空白工作簿）時，以有返回工作表者中最快者為準。
+    sheets 限定部分工作表時仍返回最快者的值，但不記錄耗時、不固定引擎（子集耗時不代表整本工作簿）。
+    """
+    results = {}
+    for name in available_engines():
+        values, elapsed, ok, mem = run_engine(name, path, sheet_count, persist_csv, persist_dir, sheets)
+        results[name] = (values, elapsed, ok, mem)
+        if not silent:
+            print(f"   [value-engine] auto trial {name}: {elapsed:.3f}s ok={ok} cells={_nonempty(values)}")
+    # 「有效」＝沒有失敗且取得的值不少於各引擎中的最多者（例如 xml 引擎不讀 inlineStr，會少於 polars_xml）
+    most = max((_nonempty(r[0]) for r in results.values() if r[2]), default=0)
+    for n, r in list(results.items()):
+        if r[2] and _nonempty(r[0]) < most:
+            results[n] = (r[0], r[1], False, r[3])
+            if not silent:
+                print(f"   [value-engine] auto trial {n}: incomplete ({_nonempty(r[0])} < {most} cells)")
+    working = {n: r for n, r in results.items() if r[2]}
+    if not working:
+        working = {n: r for n, r in results.items() if r[0]}
+        for n, r in working.items():
+            results[n] = (r[0], r[1], True, r[3])
+    if sheets is None:
+        for name, (values, elapsed, ok, mem) in results.items():
+            record_run(path, name, elapsed, ok, mem)
+    if not working:
+        return DEFAULT_ENGINE, {}
+    best = min(working, key=lambda n: working[n][1])
+    if sheets is not None:
+        return best, working[best][0]
+    key = file_key(path)[0]
+    with _lock:
+        stats = _load_stats()
+        stats['files'].setdefault(key, {'engines': {}, 'pinned': None})['pinned'] = best
+        _mark_dirty()
+    return best, working[best][0]
+
+
+def describe(key: str) -> str:
+    """單一檔案 key 的統計摘要（debug 輸出用）"""
+    f = (_load_stats()['files'].get(key) or {})
+    parts = []
+    for name, st in sorted(f.get('engines', {}).items(), key=lambda kv: (kv[1].get('ewma_sec') is None, kv[1].get('ewma_sec') or 0)):
+        avg = f"{st['ewma_sec']:.3f}s" if st.get('ewma_sec') is not None else '-'
+        mem = f" mem={st['mem_mb']}MB" if st.get('mem_mb') is not None else ''
+        parts.append(f"{name}={avg} runs={st.get('runs', 0)} fail={st.get('fail', 0)}{mem}")
+    return '; '.join(parts) or 'no runs'
@@ -0,0 +1,186 @@
+"""
+索引式 shared strings 表（延遲解碼 + LRU）
+- 首次掃描只記錄每個 <si> 在解壓後 XML 中的位元組位移（array('q')），不建立任何字串物件
+- table[idx] 時才切出該段 bytes 解碼（串接其下所有 t 節點，與 iterparse 版本一致），結果放入 LRU
+- 解壓後較小的 sharedStrings.xml 保存在記憶體 bytes；超過 SHARED_STRINGS_SPILL_MB 時寫入暫存檔並 mmap，
+  常駐記憶體只與實際被引用的頁面相關
+- 支援 len() / 索引 / 迭代，可直接取代原本的 list
+"""
+import re
+import mmap
+import shutil
+import tempfile
+import zipfile
+from array import array
+from collections import OrderedDict
+from collections.abc import Sequence
+from html import unescape
+from typing import Optional
+
+SST_PART = 'xl/sharedStrings.xml'
+
+_RE_SI = re.compile(rb'<(?:[\w.-]+:)?si(?=[\s>/])')
+_RE_SST_END = re.compile(rb'</(?:[\w.-]+:)?sst\s*>')
+_RE_T = re.compile(rb'<(?:[\w.-]+:)?t(?:\s[^>]*)?(?:/>|>(.*?)</(?:[\w.-]+:)?t\s*>)', re.S)
+_RE_CDATA = re.compile(rb'<!\[CDATA\[(.*?)\]\]>', re.S)
+_RE_ENCODING = re.compile(rb'<\?xml[^>]*encoding=["\']([\w.-]+)["\']')
+
+
+def _escape_cdata(m) -> bytes:
+    return m.group(1).replace(b'&', b'&amp;').replace(b'<', b'&lt;').replace(b'>', b'&gt;')
+
+
+def _decode_si(frag: bytes) -> str:
+    """單一 <si>…</si> 片段 -> 文字（串接所有 t；行尾正規化與實體還原同 XML 解析器）"""
+    if b'<![CDATA[' in frag:
+        frag = _RE_CDATA.sub(_escape_cdata, frag)
+    parts = [m.group(1) or b'' for m in _RE_T.finditer(frag)]
+    if not parts:
+        return ''
+    raw = parts[0] if len(parts) == 1 else b''.join(parts)
+    text = raw.decode('utf-8')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    if '&' in text:
+        text = unescape(text)
+    return text
+
+
+class SharedStringTable(Sequence):
+    """sharedStrings.xml 的索引表；以 from_zip 建立"""
+
+    def __init__(self, buf, offsets: array, maxsize: int = 100000, fh=None):
+        self._buf = buf            # bytes 或 mmap
+        self._offsets = offsets    # 每個 si 的起點 + 結尾哨兵，長度 = 字串數 + 1
+        self._fh = fh              # mmap 模式下的暫存檔
+        self.maxsize = int(maxsize or 0)
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_zip(cls, z: zipfile.ZipFile, maxsize: Optional[int] = None,
+                 spill_mb: Optional[float] = None) -> Optional['SharedStringTable']:
+        """沒有 sharedStrings.xml 時返回 None；非 UTF-8 編碼時拋出 ValueError（由呼叫方回退逐一解析）"""
+        try:
+            info = z.getinfo(SST_PART)
+        except KeyError:
+            return None
+        if maxsize is None or spill_mb is None:
+            try:
+                import config.settings as settings
+            except Exception:
+                settings = None
+            if maxsize is None:
+                maxsize = getattr(settings, 'SHARED_STRINGS_LRU_SIZE', 100000)
+            if spill_mb is None:
+                spill_mb = getattr(settings, 'SHARED_STRINGS_SPILL_MB', 32)
+
+        fh = None
+        if spill_mb and info.file_size >= float(spill_mb) * 1024 * 1024:
+            fh = tempfile.TemporaryFile(prefix='sst_')
+            try:
+                with z.open(info) as src:
+                    shutil.copyfileobj(src, fh, 4 * 1024 * 1024)
+                fh.flush()
+                buf = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) if fh.tell() else b''
+            except Exception:
+                fh.close()
+                raise
+        else:
+            buf = z.read(info)
+
+        try:
+            m = _RE_ENCODING.match(buf[:200])
+            if m and m.group(1).lower().replace(b'_', b'-') not in (b'utf-8', b'utf8', b'us-ascii', b'ascii'):
+                raise ValueError(f"unsupported sharedStrings encoding: {m.group(1).decode('ascii', 'ignore')}")
+            offsets = array('q', (m.start() for m in _RE_SI.finditer(buf)))
+            end = None
+            if offsets:
+                tail_from = offsets[-1]
+                for m in _RE_SST_END.finditer(buf, tail_from):
+                    end = m.start()
+            offsets.append(end if end is not None else len(buf))
+        except Exception:
+            if fh is not None:
+                if isinstance(buf, mmap.mmap):
+                    buf.close()
+                fh.close()
+            raise
+        return cls(buf, offsets, maxsize=maxsize, fh=fh)
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def _decode(self, idx: int) -> str:
+        return _decode_si(self._buf[self._offsets[idx]:self._offsets[idx + 1]])
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        n = len(self)
+        if idx < 0:
+            idx += n
+        if not 0 <= idx < n:
+            raise IndexError('shared string index out of range')
+        if self.maxsize <= 0:
+            self.misses += 1
+            return self._decode(idx)
+        res = self._cache.get(idx)
+        if res is not None:
+            self.hits += 1
+            self._cache.move_to_end(idx)
+            return res
+        self.misses += 1
+        res = self._cache[idx] = self._decode(idx)
+        if len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+        return res
+
+    def __iter__(self):
+        # 整表走訪（少用）：不經 LRU，避免把快取洗掉
+        for i in range(len(self)):
+            yield self._decode(i)
+
+    def close(self) -> None:
+        buf, fh = self._buf, self._fh
+        self._buf, self._fh = b'', None
+        self._offsets = array('q', [0])
+        self._cache.clear()
+        try:
+            if isinstance(buf, mmap.mmap):
+                buf.close()
+        except Exception:
+            pass
+        try:
+            if fh is not None:
+                fh.close()
+        except Exception:
+            pass
+
+    def __del__(self):
+        self.close()
+
+    @property
+    def spilled(self) -> bool:
+        return self._fh is not None
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'strings': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._cache),
+            'hit_rate': (self.hits / total) if total else 0.0,
+            'spilled': self.spilled,
+        }
+
+    def describe(self):
+        st = self.stats()
+        return (f"strings={st['strings']} decoded={st['misses']} hits={st['hits']} "
+                f"cache={st['size']} hit_rate={st['hit_rate']:.1%} mmap={st['spilled']}")
+
+    def __repr__(self):
+        return f"SharedStringTable({self.describe()})"
+
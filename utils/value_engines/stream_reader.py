@@ -0,0 +1,376 @@
+"""
+單次串流 XLSX 讀取引擎（iterparse）
+- 每張 worksheet XML 只走一次，同時取出公式與 cached value
+- 逐格產出 (address, formula, cached_value, external_ref)，毋須 openpyxl + 值引擎 + Phase 2 三次解析
+- 值的表示方式與 polars_xml 引擎一致（數字保留原字串、shared string 還原、布林轉 True/False），
+  公式表示方式與 openpyxl 一致（'=' 開頭、shared formula 以 Translator 展開），避免切換引擎造成假差異
+"""
+import os
+import posixpath
+import threading
+import time
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+NS_MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+NS_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+NS_PKG_REL = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+_TAG_C = f'{{{NS_MAIN}}}c'
+_TAG_F = f'{{{NS_MAIN}}}f'
+_TAG_V = f'{{{NS_MAIN}}}v'
+_TAG_IS = f'{{{NS_MAIN}}}is'
+_TAG_T = f'{{{NS_MAIN}}}t'
+_TAG_ROW = f'{{{NS_MAIN}}}row'
+_TAG_SI = f'{{{NS_MAIN}}}si'
+_TAG_SHEETDATA = f'{{{NS_MAIN}}}sheetData'
+
+CellTuple = Tuple[str, Optional[str], object, bool]
+
+
+def _col_to_letters(n: int) -> str:
+    s = ''
+    while n > 0:
+        n, r = divmod(n - 1, 26)
+        s = chr(65 + r) + s
+    return s
+
+
+def _split_addr(addr: str) -> Tuple[int, int]:
+    """'AB12' -> (12, 28)；無法解析時回傳 (0, 0)"""
+    col = 0
+    i = 0
+    n = len(addr)
+    while i < n and addr[i].isalpha():
+        col = col * 26 + (ord(addr[i].upper()) - 64)
+        i += 1
+    try:
+        row = int(addr[i:])
+    except ValueError:
+        row = 0
+    return row, col
+
+
+def resolve_sheet_parts(z: zipfile.ZipFile) -> List[Tuple[str, str]]:
+    """
+    依 workbook.xml 的順序回傳 [(sheet_name, 'xl/worksheets/sheetN.xml'), ...]
+    - 透過 workbook.xml.rels 解析實際 part 路徑（sheetN 編號不一定等於順序）
+    - 略過 chartsheet / dialogsheet，與 openpyxl 的 wb.worksheets 對齊
+    """
+    names = set(z.namelist())
+    rels = {}
+    try:
+        rroot = ET.fromstring(z.read('xl/_rels/workbook.xml.rels'))
+        for rel in rroot.findall(f'{{{NS_PKG_REL}}}Relationship'):
+            rels[rel.get('Id')] = (rel.get('Type', ''), rel.get('Target', ''))
+    except (KeyError, ET.ParseError):
+        pass
+
+    parts: List[Tuple[str, str]] = []
+    wroot = ET.fromstring(z.read('xl/workbook.xml'))
+    for idx, s in enumerate(wroot.findall(f'.//{{{NS_MAIN}}}sheet'), start=1):
+        name = s.get('name')
+        if not name:
+            continue
+        rtype, target = rels.get(s.get(f'{{{NS_REL}}}id'), ('', ''))
+        if rtype and not rtype.endswith('/worksheet'):
+            continue
+        path = ''
+        if target:
+            if target.startswith('/'):
+                path = target.lstrip('/')
+            else:
+                path = posixpath.normpath(posixpath.join('xl', target))
+        if path not in names:
+            # 退回舊有假設：第 N 張表對應 sheetN.xml
+            path = f'xl/worksheets/sheet{idx}.xml'
+            if path not in names:
+                continue
+        parts.append((name, path))
+    return parts
+
+
+def load_shared_strings(z: zipfile.ZipFile):
+    """
+    返回 shared strings 表（支援 len() / 索引，可當 list 使用）：
+    - 預設為 SharedStringTable：首次只掃描各 si 位移，被引用時才解碼（LRU），
+      記憶體與解析時間只與實際用到的字串相關
+    - 索引表無法建立（例如非 UTF-8 編碼）時回退 _load_shared_strings_eager
+    """
+    if 'xl/sharedStrings.xml' not in z.namelist():
+        return []
+    try:
+        from utils.value_engines.shared_strings import SharedStringTable
+        table = SharedStringTable.from_zip(z)
+        if table is not None:
+            return table
+    except Exception as e:
+        print(f"   [sst] indexed table unavailable, decode all: {e}")
+    return _load_shared_strings_eager(z)
+
+
+def _load_shared_strings_eager(z: zipfile.ZipFile) -> list:
+    """
+    以 iterparse 串流讀取 sharedStrings.xml；每個 si 串接其下所有 t 節點（與 polars_xml 一致）。
+    每處理完一個 si 即清空根節點，記憶體只保留字串本身，不保留元素樹。
+    """
+    sst: list = []
+    if 'xl/sharedStrings.xml' not in z.namelist():
+        return sst
+    try:
+        with z.open('xl/sharedStrings.xml') as fp:
+            root = None
+            for event, el in ET.iterparse(fp, events=('start', 'end')):
+                if event == 'start':
+                    if root is None:
+                        root = el
+                    continue
+                if el.tag == _TAG_SI:
+                    sst.append(''.join((t.text or '') for t in el.iter(_TAG_T)))
+                    root.clear()
+    except ET.ParseError:
+        pass
+    return sst
+
+
+def iter_cell_nodes(source) -> Iterator[Tuple[Optional[str], Optional[str], bool, Optional[str], Optional[str]]]:
+    """
+    有界記憶體逐格走訪 worksheet XML（值引擎共用），產出 (r, t, has_v, v_text, inline_text)：
+    - has_v：是否有 <v> 節點（v_text 可為 None，代表 <v/>）
+    - inline_text：有 <is> 節點時為其第一個 t 的文字（無 t 為 ''），否則 None
+    每列處理完即清空 sheetData，峰值記憶體與單列大小成正比，而非整張工作表
+    """
+    sheet_data = None
+    for event, el in ET.iterparse(source, events=('start', 'end')):
+        tag = el.tag
+        if event == 'start':
+            if tag == _TAG_SHEETDATA:
+                sheet_data = el
+            continue
+        if tag == _TAG_C:
+            v_node = el.find(_TAG_V)
+            inline = None
+            if v_node is None:
+                is_node = el.find(_TAG_IS)
+                if is_node is not None:
+                    tnode = is_node.find(f'.//{_TAG_T}')
+                    inline = (tnode.text if tnode is not None else '') or ''
+            yield (el.get('r'), el.get('t'), v_node is not None,
+                   v_node.text if v_node is not None else None, inline)
+            el.clear()
+        elif tag == _TAG_ROW:
+            el.clear()
+            if sheet_data is not None:
+                sheet_data.clear()
+
+
+def iter_sheet_cells(source,
+                     shared_strings,
+                     formula_fn: Optional[Callable[[str], Tuple[Optional[str], bool]]] = None) -> Iterator[CellTuple]:
+    """
+    串流解析單張 worksheet XML，逐格產出 (address, formula, cached_value, external_ref)。
+    - source：檔案物件（例如 z.open(part)）
+    - formula_fn：raw 公式 -> (顯示用公式, 是否外部參照)；未提供則原樣返回且 external_ref=False
+    - 只產出有公式或有值的儲存格（純格式的空白格略過）
+    """
+    translators = {}
+    cur_row = 0
+    cur_col = 0
+    sheet_data = None
+    for event, el in ET.iterparse(source, events=('start', 'end')):
+        tag = el.tag
+        if event == 'start':
+            if tag == _TAG_SHEETDATA:
+                sheet_data = el
+            elif tag == _TAG_ROW:
+                r = el.get('r')
+                cur_row = int(r) if r else cur_row + 1
+                cur_col = 0
+            continue
+        if tag == _TAG_C:
+            addr = el.get('r')
+            if addr:
+                cur_col = _split_addr(addr)[1]
+            else:
+                cur_col += 1
+                addr = f"{_col_to_letters(cur_col)}{cur_row}"
+            t = el.get('t')
+
+            formula = None
+            f_node = el.find(_TAG_F)
+            if f_node is not None:
+                formula = '=' + (f_node.text or '')
+                if f_node.get('t') == 'shared':
+                    si = f_node.get('si')
+                    if si in translators:
+                        formula = translators[si].translate_formula(addr)
+                    elif formula != '=':
+                        from openpyxl.formula.translate import Translator
+                        translators[si] = Translator(formula, addr)
+
+            value = None
+            v_node = el.find(_TAG_V)
+            if v_node is None:
+                if t == 'inlineStr':
+                    is_node = el.find(_TAG_IS)
+                    if is_node is not None:
+                        tnode = is_node.find(f'.//{_TAG_T}')
+                        value = tnode.text if tnode is not None else ''
+            else:
+                raw = v_node.text
+                if raw is None:
+                    value = None
+                elif t == 's':
+                    try:
+                        idx = int(raw)
+                        value = shared_strings[idx] if 0 <= idx < len(shared_strings) else ''
+                    except (ValueError, IndexError):
+                        value = ''
+                elif t == 'b':
+                    value = raw in ('1', 'true', 'TRUE')
+                else:
+                    value = raw
+            el.clear()
+
+            if formula is None and value is None:
+                continue
+            external_ref = False
+            if formula is not None and formula_fn is not None:
+                formula, external_ref = formula_fn(formula)
+            yield addr, formula, value, bool(external_ref)
+        elif tag == _TAG_ROW:
+            el.clear()
+            # 已處理的列不留在 sheetData 之下，峰值記憶體只與單列大小有關
+            if sheet_data is not None:
+                sheet_data.clear()
+
+
+def _collect_sheet(fp, sst, formula_fn) -> Dict[str, dict]:
+    ws_data: Dict[str, dict] = {}
+    for addr, formula, value, ext in iter_sheet_cells(fp, sst, formula_fn):
+        ws_data[addr] = {
+            "formula": formula,
+            "value": value,
+            "cached_value": value,
+            "external_ref": ext,
+        }
+    return ws_data
+
+
+# ---- 多進程 sheet 解析 ----
+# 每個 worker 只快取最近一本工作簿的 shared strings，避免每張表都重讀一次 sharedStrings.xml
+_worker_sst_cache: Dict[str, object] = {'key': None, 'sst': None}
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def _worker_shared_strings(xlsx_path: str, z: zipfile.ZipFile):
+    try:
+        st = os.stat(xlsx_path)
+        key = (xlsx_path, st.st_mtime_ns, st.st_size)
+    except OSError:
+        key = None
+    if key is not None and _worker_sst_cache['key'] == key:
+        return _worker_sst_cache['sst']
+    sst = load_shared_strings(z)
+    _worker_sst_cache['key'] = key
+    _worker_sst_cache['sst'] = sst
+    return sst
+
+
+def _parse_sheet_part(xlsx_path: str, part: str, formula_fn) -> Dict[str, dict]:
+    """worker 入口：只解析一個 worksheet part，返回該表的 {addr: cell}"""
+    with zipfile.ZipFile(xlsx_path, 'r') as z:
+        sst = _worker_shared_strings(xlsx_path, z)
+        with z.open(part) as fp:
+            return _collect_sheet(fp, sst, formula_fn)
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = ProcessPoolExecutor(max_workers=workers)
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_sheet_pool(terminate: bool = False) -> None:
+    """
+    關閉共用的 sheet 解析進程池（停止監控或進程池損壞時呼叫）
+    - terminate：同時終止仍在執行的 worker（逾時卡住的 worker 不會因 shutdown 而結束）
+    """
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is not None:
+            procs = list((getattr(_pool, '_processes', None) or {}).values()) if terminate else []
+            try:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            except Exception:
+                pass
+            for proc in procs:
+                try:
+                    proc.terminate()
+                except Exception:
+                    pass
+        _pool = None
+        _pool_workers = 0
+
+
+def read_cells_from_xlsx_via_stream(xlsx_path,
+                                    formula_fn: Optional[Callable[[str], Tuple[Optional[str], bool]]] = None,
+                                    sheets: Optional[set] = None,
+                                    max_workers: int = 1,
+                                    timeout: Optional[float] = None) -> Dict[str, Dict[str, dict]]:
+    """
+    單次串流讀取整本工作簿，返回與 dump_excel_cells_with_timeout 相同的結構：
+      { sheet_name: { 'A1': {formula, value, cached_value, external_ref}, ... }, ... }
+    - sheets：只讀取指定名稱的工作表（None 表示全部）
+    - max_workers > 1 且多於一張表時，以進程池每個 worker 負責一個 worksheet part，
+      最後依 workbook 順序合併（formula_fn 須可 pickle，例如 functools.partial）；
+      進程池失敗會自動改回單進程
+    - timeout：等待進程池結果的總秒數上限（None 表示不限）；逾時或進程池損壞時
+      終止 worker、重設進程池並改回單進程解析
+    - 沒有任何資料的工作表不會出現在結果中（與 openpyxl 路徑一致）
+    """
+    result: Dict[str, Dict[str, dict]] = {}
+    with zipfile.ZipFile(xlsx_path, 'r') as z:
+        parts = [(name, part) for name, part in resolve_sheet_parts(z)
+                 if sheets is None or name in sheets]
+        workers = min(int(max_workers or 1), len(parts))
+        if workers > 1 and isinstance(xlsx_path, str):
+            try:
+                # 進程池以設定的上限建立並重用，不因每本檔案的工作表數目而重建
+                deadline = time.monotonic() + timeout if timeout is not None else None
+                pool = _get_pool(int(max_workers))
+                futures = [(name, pool.submit(_parse_sheet_part, xlsx_path, part, formula_fn))
+                           for name, part in parts]
+                for name, fut in futures:
+                    remaining = max(0.0, deadline - time.monotonic()) if deadline is not None else None
+                    ws_data = fut.result(timeout=remaining)
+                    if ws_data:
+                        result[name] = ws_data
+                return result
+            except (FutureTimeoutError, BrokenProcessPool) as e:
+                reason = 'timed out' if isinstance(e, FutureTimeoutError) else f'pool broken: {e}'
+                print(f"   [sheet-pool] parallel parse {reason}, reset pool and fallback to single process")
+                shutdown_sheet_pool(terminate=True)
+                result = {}
+            except Exception as e:
+                print(f"   [sheet-pool] parallel parse failed, fallback to single process: {e}")
+                shutdown_sheet_pool()
+                result = {}
+        sst = load_shared_strings(z)
+        for name, part in parts:
+            with z.open(part) as fp:
+                ws_data = _collect_sheet(fp, sst, formula_fn)
+            if ws_data:
+                result[name] = ws_data
+    return result
@@ -0,0 +1,111 @@
+"""
+xlsx2csv 轉換（polars / pandas 值引擎共用）
+- 進程內模式：以 xlsx2csv.Xlsx2csv 開啟工作簿一次（單一 zip session，sharedStrings / styles 只解析一次），
+  依 workbook 順序逐張轉成 CSV bytes；工作表名稱取自 workbook.xml，毋須 --list-sheets
+- 子進程模式：舊有流程（python -m xlsx2csv，每張表一個子進程），進程內模式失敗時自動回退
+- 兩種模式輸出相同的 { sheet_name: csv_bytes }，CSV 選項與 xlsx2csv CLI 預設一致
+"""
+import io
+import sys
+import time
+import subprocess
+from typing import Dict, Optional
+
+
+def xlsx_to_csv_bytes_inproc(xlsx_path: str, tag: str = 'xlsx2csv', sheets: Optional[set] = None) -> Dict[str, bytes]:
+    """單一 zip session 轉換所有（或 sheets 指定的）工作表；失敗時拋出例外，由呼叫方決定是否回退"""
+    from xlsx2csv import Xlsx2csv
+
+    from utils import mem_cache
+    out: Dict[str, bytes] = {}
+    with Xlsx2csv(mem_cache.local_source(xlsx_path), outputencoding='utf-8') as conv:
+        for s in conv.workbook.sheets:
+            name = s.get('name')
+            idx = s.get('index')
+            if not name or not idx:
+                continue
+            if sheets is not None and name not in sheets:
+                continue
+            buf = io.StringIO(newline='')
+            try:
+                conv.convert(buf, sheetid=idx)
+            except Exception as e:
+                # chartsheet 等無法轉換的工作表：略過（與子進程模式 rc!=0 時一致）
+                print(f"   [{tag}] inproc sheet#{idx} name='{name}' err={str(e)[:200]}")
+                continue
+            out[name] = buf.getvalue().encode('utf-8')
+    return out
+
+
+def xlsx_to_csv_bytes_subprocess(xlsx_path: str, sheet_count: Optional[int] = None, tag: str = 'xlsx2csv',
+                                 only: Optional[set] = None) -> Dict[str, bytes]:
+    """
+    舊有子進程流程：先 --list-sheets，再每張表執行一次 python -m xlsx2csv -s i。
+    only：只轉換指定名稱的工作表（None 表示全部；名稱不明的 brute-force 回退不受限）
+    Prints diagnostic info (rc/stdout/stderr) for troubleshooting.
+    """
+    sheets: Dict[str, bytes] = {}
+    try:
+        # 子進程只能讀實體檔案：記憶體副本先落地
+        from utils import mem_cache
+        xlsx_path = mem_cache.materialize(xlsx_path)
+        cmd_list = [sys.executable, '-m', 'xlsx2csv', '--list-sheets', xlsx_path]
+        proc = subprocess.run(cmd_list, capture_output=True, text=True)
+        rc = proc.returncode
+        out = proc.stdout or ''
+        err = proc.stderr or ''
+        names = [ln.strip() for ln in out.splitlines() if ln.strip()]
+        print(f"   [{tag}] list rc={rc} names={names} err={(err.strip()[:200] if err else '')}")
+        if rc != 0 or not names:
+            # Fallback: brute-force by index if sheet_count provided
+            if sheet_count:
+                print(f"   [{tag}] fallback brute-force by index 1..{sheet_count}")
+                for i in range(1, sheet_count+1):
+                    cmd_fetch = [sys.executable, '-m', 'xlsx2csv', '-s', str(i), xlsx_path]
+                    proc2 = subprocess.run(cmd_fetch, capture_output=True, text=False)
+                    if proc2.returncode != 0:
+                        e2 = (proc2.stderr.decode('utf-8', 'ignore') if proc2.stderr else '')
+                        print(f"   [{tag}] fetch sheet#{i} rc={proc2.returncode} err={e2[:200]}")
+                        continue
+                    sheets[f"sheet{i}"] = proc2.stdout
+                return sheets
+            return {}
+        for i, name in enumerate(names, start=1):
+            if only is not None and name not in only:
+                continue
+            cmd_fetch = [sys.executable, '-m', 'xlsx2csv', '-s', str(i), xlsx_path]
+            proc2 = subprocess.run(cmd_fetch, capture_output=True, text=False)
+            if proc2.returncode != 0:
+                e2 = (proc2.stderr.decode('utf-8', 'ignore') if proc2.stderr else '')
+                print(f"   [{tag}] fetch sheet#{i} rc={proc2.returncode} name='{name}' err={e2[:200]}")
+                continue
+            sheets[name] = proc2.stdout
+    except Exception as e:
+        print(f"   [{tag}] exception: {e}")
+    return sheets
+
+
+def xlsx_to_csv_bytes(xlsx_path: str, sheet_count: Optional[int] = None, tag: str = 'xlsx2csv',
+                      sheets: Optional[set] = None) -> Dict[str, bytes]:
+    """
+    Convert each worksheet to CSV bytes via xlsx2csv.
+    Returns: { sheet_name: csv_bytes }
+    - sheets：只轉換指定名稱的工作表（None 表示全部）
+    - settings.XLSX2CSV_INPROCESS=True（預設）時先走進程內模式；例外或無結果時回退子進程模式
+    """
+    try:
+        import config.settings as settings
+        inproc = bool(getattr(settings, 'XLSX2CSV_INPROCESS', True))
+    except Exception:
+        inproc = True
+    if inproc:
+        t0 = time.perf_counter()
+        try:
+            out = xlsx_to_csv_bytes_inproc(xlsx_path, tag=tag, sheets=sheets)
+            print(f"   [{tag}] inproc sheets={len(out)} time={time.perf_counter() - t0:.3f}s")
+            if out:
+                return out
+        except Exception as e:
+            print(f"   [{tag}] inproc failed, fallback to subprocess: {e}")
+    return xlsx_to_csv_bytes_subprocess(xlsx_path, sheet_count=sheet_count, tag=tag, only=sheets)
+
@@ -2,13 +2,39 @@ import zipfile
 import xml.etree.ElementTree as ET
 from typing import Dict, Optional
 
+from utils.value_engines.stream_reader import load_shared_strings, iter_cell_nodes
+
 # Minimal XML reader that maps sheet name -> { address: value }
 # Fast path for cached values (v) and formulas (f) if needed later.
 
-def read_values_from_xlsx_via_xml(xlsx_path: str) -> Dict[str, Dict[str, Optional[str]]]:
+def _streaming_enabled() -> bool:
+    try:
+        import config.settings as settings
+        return bool(getattr(settings, 'XML_VALUE_STREAMING', True))
+    except Exception:
+        return True
+
+
+def _convert(t, raw, shared_strings):
+    if raw is None:
+        return None
+    if t == 's':
+        try:
+            idx = int(raw)
+            return shared_strings[idx] if 0 <= idx < len(shared_strings) else ''
+        except Exception:
+            return ''
+    if t == 'b':
+        return 'TRUE' if raw in ('1', 'true', 'TRUE') else 'FALSE'
+    # number or general
+    return raw
+
+
+def read_values_from_xlsx_via_xml(xlsx_path: str, sheets: Optional[set] = None) -> Dict[str, Dict[str, Optional[str]]]:
     """
     Read display values (cached values) for all sheets using raw XML parsing.
     Returns: { sheet_name: { 'A1': value, ... }, ... }
+    sheets: only read the named sheets (None = all).
     Note: sharedStrings and basic types handled; dates kept as raw numbers for speed.
     """
     # 安全性修正：確保使用快取副本而非直接讀取原始檔案
@@ -17,11 +43,15 @@ def read_values_from_xlsx_via_xml(xlsx_path: str) -> Dict[str, Dict[str, Optiona
     if not local_path:
         return {}
     
-    with zipfile.ZipFile(local_path, 'r') as z:
+    from utils import mem_cache
+    with zipfile.ZipFile(mem_cache.local_source(local_path), 'r') as z:
+        streaming = _streaming_enabled()
         # Build shared strings (if any)
         shared_strings = []
         try:
-            if 'xl/sharedStrings.xml' in z.namelist():
+            if streaming:
+                shared_strings = load_shared_strings(z)
+            elif 'xl/sharedStrings.xml' in z.namelist():
                 ss_xml = z.read('xl/sharedStrings.xml')
                 root = ET.fromstring(ss_xml)
                 ns = {'a': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
@@ -47,10 +77,22 @@ def read_values_from_xlsx_via_xml(xlsx_path: str) -> Dict[str, Dict[str, Optiona
 
         result: Dict[str, Dict[str, Optional[str]]] = {}
         for idx, name in enumerate(sheet_names, start=1):
+            if sheets is not None and name not in sheets:
+                continue
             path = f'xl/worksheets/sheet{idx}.xml'
             if path not in z.namelist():
                 continue
             try:
+                if streaming:
+                    # iterparse 逐列處理並清除，不保留整張表的 bytes 與元素樹
+                    values: Dict[str, Optional[str]] = {}
+                    with z.open(path) as fp:
+                        for addr, t, has_v, raw, _inline in iter_cell_nodes(fp):
+                            if not addr or not has_v:
+                                continue
+                            values[addr] = _convert(t, raw, shared_strings)
+                    result[name] = values
+                    continue
                 xml = z.read(path)
                 root = ET.fromstring(xml)
                 ns = {'a': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
@@ -63,21 +105,7 @@ def read_values_from_xlsx_via_xml(xlsx_path: str) -> Dict[str, Dict[str, Optiona
                     v_node = c.find('a:v', ns)
                     if v_node is None:
                         continue
-                    raw = v_node.text
-                    if raw is None:
-                        val = None
-                    elif t == 's':
-                        try:
-                            idx = int(raw)
-                            val = shared_strings[idx] if 0 <= idx < len(shared_strings) else ''
-                        except Exception:
-                            val = ''
-                    elif t == 'b':
-                        val = 'TRUE' if raw in ('1', 'true', 'TRUE') else 'FALSE'
-                    else:
-                        # number or general
-                        val = raw
-                    values[addr] = val
+                    values[addr] = _convert(t, v_node.text, shared_strings)
                 result[name] = values
             except Exception:
                 continue